@@ -0,0 +1,69 @@
+# app/config.py — config/default.yaml (+ optional user override) merged over built-in defaults
+#
+# PyYAML is optional (nothing declares it): without it the built-in DEFAULTS,
+# which mirror config/default.yaml, are used. A user config.yaml that exists
+# but cannot be applied (no PyYAML, bad YAML, not a mapping) is never dropped
+# silently: each case logs a warning naming the file.
+
+import os, copy
+from .platform_paths import APP_DATA_DIR
+from .logging_conf import get_logger
+log = get_logger("config")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "default.yaml")
+USER_PATH    = os.path.join(APP_DATA_DIR, "config.yaml")
+
+DEFAULTS = {
+    "modes": {"quick": True, "full_depth": True},
+    "scan": {"exclude_dir": [".git", "node_modules", "dist", "build", "__pycache__",
+                             "/proc", "/sys", "/dev", "/Volumes",
+                             "C:\\Windows", "C:\\Program Files", "C:\\ProgramData"],
+             "max_read_bytes_per_file": 200_000},
+    "search": {"top_k": 500},
+    "resources": {"auto": True, "target_fraction": 0.5, "min_free_gb": 1.0,
+                  "io_mb_per_s": 0, "search_backoff_sec": 10},
+    "safety": {"require_flag_for_full_fs": True},
+}
+
+_cache: dict | None = None
+
+
+def _merge(base: dict, over: dict) -> dict:
+    for k, v in (over or {}).items():
+        if isinstance(v, dict) and isinstance(base.get(k), dict):
+            _merge(base[k], v)
+        else:
+            base[k] = v
+    return base
+
+def _read(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        import yaml   # optional dependency
+    except ImportError:
+        if os.path.abspath(path) != DEFAULT_PATH:    # DEFAULTS already say what default.yaml does
+            log.warning("PyYAML is not installed (pip install PyYAML); ignoring %s", path)
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError):
+        log.warning("could not read config %s; using the other settings", path, exc_info=True)
+        return {}
+    if not isinstance(data, dict):
+        log.warning("config %s is not a mapping (got %s); ignoring it", path, type(data).__name__)
+        return {}
+    return data
+
+def load(path: str | None = None, *, reload: bool = False) -> dict:
+    """Defaults <- config/default.yaml <- user config.yaml (or just `path` when given)."""
+    global _cache
+    if path is None and _cache is not None and not reload:
+        return _cache
+    cfg = copy.deepcopy(DEFAULTS)
+    for p in ([path] if path else [DEFAULT_PATH, USER_PATH]):
+        _merge(cfg, _read(p))
+    if path is None:
+        _cache = cfg
+    return cfg
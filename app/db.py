@@ -1,4 +1,6 @@
-import sqlite3, pathlib, os, json
+import sqlite3, pathlib, os, json, queue, threading, time, contextlib
+from .logging_conf import get_logger
+log = get_logger("db")
 
 PRAGMAS = [
  "PRAGMA journal_mode=WAL;",
@@ -28,13 +30,50 @@ CREATE INDEX IF NOT EXISTS idx_chunks_file ON chunks(file_id);
 """
 
 
+class Connection(sqlite3.Connection):
+    """sqlite3 connection that can carry a per-connection settings cache."""
+    settings_cache: dict | None = None
+    settings_version: int | None = None     # PRAGMA data_version the cache was loaded at
+
+
 def connect(db_path: str, *, check_same_thread: bool = True, timeout: float = 30.0) -> sqlite3.Connection:
     pathlib.Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-    con = sqlite3.connect(db_path, check_same_thread=check_same_thread, timeout=timeout)
+    con = sqlite3.connect(db_path, check_same_thread=check_same_thread, timeout=timeout, factory=Connection)
     for p in PRAGMAS: con.execute(p)
     return con
 
+# —— path keys ——
+# files.path is stored as the indexer walks it: abspath of the root plus entry
+# names, case preserved. Every prefix comparison (scopes, roots, prune, shard
+# routing) goes through these so it agrees with that spelling. No normcase:
+# on Windows a lower-cased key would never match a stored path.
+def path_key(path: str) -> str:
+    """Canonical spelling of a directory: abspath (no trailing separator except on a bare root)."""
+    return os.path.abspath(path)
+
+def path_prefix(path: str) -> str:
+    """path_key plus one separator: every stored path under `path` starts with it."""
+    p = path_key(path)
+    return p if p.endswith(os.sep) else p + os.sep
+
+def path_range(path: str) -> tuple[str, str]:
+    """[lo, hi) covering every stored path under `path`; a range on the path index, unlike LIKE."""
+    p = path_prefix(path)
+    return p, p[:-1] + chr(ord(p[-1]) + 1)
+
+# Schema versioning: PRAGMA user_version holds the last applied migration, so
+# an up-to-date database costs one PRAGMA read at startup instead of a round
+# of table_info / CREATE INDEX IF NOT EXISTS / MAX() scans.
+
+def schema_version(con) -> int:
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
 def init(con: sqlite3.Connection) -> None:
+    if schema_version(con) >= SCHEMA_VERSION:
+        return
+    if not con.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+        # only settable before the first table exists (otherwise needs a VACUUM)
+        con.execute("PRAGMA auto_vacuum=INCREMENTAL")
     con.executescript(SCHEMA)
     con.commit()
     
@@ -45,16 +84,137 @@ def _ensure_column(con, table, col, decl):
     if not have:
         con.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
 
-def migrate(con):
+def _m1_baseline(con):
+    # everything the unversioned migrate() used to re-run on every launch
     _ensure_column(con, "files", "blake3", "TEXT")
     _ensure_column(con, "files", "hash_checked_at", "INTEGER")
     _ensure_column(con, "files", "last_indexed_at", "INTEGER")
-    _ensure_column(con, "files", "created_at", "INTEGER")  # NEW
+    _ensure_column(con, "files", "created_at", "INTEGER")
 
     con.execute("CREATE INDEX IF NOT EXISTS idx_files_mtime ON files(mtime)")
     con.execute("CREATE INDEX IF NOT EXISTS idx_files_created_at ON files(created_at)")
-    con.commit()
+    con.execute("CREATE TABLE IF NOT EXISTS settings(k TEXT PRIMARY KEY, v TEXT)")
+    normalize_time_units(con)
+
+def _m2_failures(con):
+    from . import failures
+    con.executescript(failures.SCHEMA)
+
+def _m3_recent(con):
+    # ctime_eff = COALESCE(created_at, mtime), kept by triggers so every writer
+    # (indexer, imports, manual fixes) maintains it; the (time, path, size)
+    # indexes make recent-files browsing a covering backward index scan.
+    _ensure_column(con, "files", "ctime_eff", "INTEGER")
+    con.execute("UPDATE files SET ctime_eff = COALESCE(created_at, mtime) WHERE ctime_eff IS NOT COALESCE(created_at, mtime)")
+    con.executescript("""
+    CREATE TRIGGER IF NOT EXISTS trg_files_ctime_eff_ins AFTER INSERT ON files BEGIN
+      UPDATE files SET ctime_eff = COALESCE(NEW.created_at, NEW.mtime) WHERE id = NEW.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_files_ctime_eff_upd AFTER UPDATE OF mtime, created_at ON files BEGIN
+      UPDATE files SET ctime_eff = COALESCE(NEW.created_at, NEW.mtime) WHERE id = NEW.id;
+    END;
+    CREATE INDEX IF NOT EXISTS idx_files_recent_mtime ON files(mtime, path, size);
+    CREATE INDEX IF NOT EXISTS idx_files_recent_ctime ON files(ctime_eff, path, size);
+    DROP INDEX IF EXISTS idx_files_mtime;
+    DROP INDEX IF EXISTS idx_files_created_at;
+    """)
+
+def _m4_similar(con):
+    from . import similar
+    con.executescript(similar.SCHEMA)
+
+def _m5_auto_vacuum(con):
+    from . import maintenance
+    maintenance.enable_incremental(con)
+
+def _m6_roots(con):
+    from . import scheduler
+    con.executescript(scheduler.SCHEMA)
+
+def _m7_facets(con):
+    from . import facets
+    _ensure_column(con, "files", "ext", "TEXT")
+    _ensure_column(con, "files", "size_bucket", "INTEGER")
+    con.executescript(facets.SCHEMA)
+    facets.backfill(con)
 
+def _m8_dirs(con):
+    from . import dirtree
+    _ensure_column(con, "files", "dir_id", "INTEGER")
+    con.executescript(dirtree.SCHEMA)
+    dirtree.rebuild(con)
+
+def _m9_dirs_mtime(con):
+    from . import dirtree
+    con.executescript(dirtree.SCHEMA)      # adds idx_files_dir_mtime
+
+def _m10_byte_offsets(con):
+    # chunks written before extract tracked source bytes hold character offsets in
+    # bytes_from/bytes_to. Only flag their files: preview re-extracts one when it is
+    # opened (indexer.refresh_offsets) and the usual reindex_days pass rewrites the rest
+    _ensure_column(con, "files", "char_offsets", "INTEGER")
+    n = con.execute("UPDATE files SET char_offsets=1 WHERE id IN (SELECT DISTINCT file_id FROM chunks)").rowcount
+    if n: log.info("%d files have chunks with character offsets; each is re-extracted when previewed or re-indexed", n)
+
+# (version, step) — append only; each step must be idempotent
+MIGRATIONS = [
+    (1, _m1_baseline),
+    (2, _m2_failures),
+    (3, _m3_recent),
+    (4, _m4_similar),
+    (5, _m5_auto_vacuum),
+    (6, _m6_roots),
+    (7, _m7_facets),
+    (8, _m8_dirs),
+    (9, _m9_dirs_mtime),
+    (10, _m10_byte_offsets),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+BYTE_OFFSETS_VERSION = 10       # from here on chunks.bytes_from/bytes_to are source byte offsets
+
+def migrate(con):
+    v = schema_version(con)
+    if v >= SCHEMA_VERSION:
+        return
+    for target, step in MIGRATIONS:
+        if target <= v: continue
+        step(con)
+        con.execute(f"PRAGMA user_version={int(target)}")
+        con.commit()
+
+
+
+def delete_chunks(cur, fid: int) -> int:
+    """Remove a file's chunks together with their fts postings and fts_map rows.
+
+    fts is contentless, so a posting can only be removed by replaying the
+    original text through the 'delete' command.
+    """
+    return delete_chunks_many(cur, [fid])
+
+def delete_chunks_many(cur, fids: list[int]) -> int:
+    """delete_chunks() for a batch of files (callers keep batches to a few hundred ids)."""
+    if not fids: return 0
+    ph = ",".join("?" * len(fids))
+    old = cur.execute(f"""SELECT m.rowid, c.text FROM chunks c JOIN fts_map m ON m.chunk_id = c.id
+                          WHERE c.file_id IN ({ph})""", fids).fetchall()
+    if old:
+        cur.executemany("INSERT INTO fts(fts, rowid, text) VALUES('delete', ?, ?)", old)
+        cur.executemany("DELETE FROM fts_map WHERE rowid = ?", [(rid,) for rid, _t in old])
+    return cur.execute(f"DELETE FROM chunks WHERE file_id IN ({ph})", fids).rowcount
+
+
+def insert_chunks(cur, fid: int, chunks) -> int:
+    """Insert (ord, text, bytes_from, bytes_to) rows plus their fts postings; returns the count."""
+    n = 0
+    for ord_, seg, b0, b1 in chunks:
+        cur.execute("INSERT INTO chunks(file_id,ord,text,bytes_from,bytes_to) VALUES(?,?,?,?,?)",
+                    (fid, ord_, seg, b0, b1))
+        cid = cur.lastrowid
+        cur.execute("INSERT INTO fts(rowid,text) VALUES(NULL,?)", (seg,))
+        cur.execute("INSERT OR REPLACE INTO fts_map(rowid,chunk_id) VALUES(?,?)", (cur.lastrowid, cid))
+        n += 1
+    return n
 
 
 def counts_for_root(con, root: str) -> dict:
@@ -83,34 +243,89 @@ def counts_for_root(con, root: str) -> dict:
     return {"files_total": files_total, "files_text": files_text,
             "chunks": chunks, "last_indexed_at": last_idx}
 
+def totals(con) -> dict:
+    cur = con.cursor()
+    files_total, last_idx = cur.execute("SELECT COUNT(*), MAX(last_indexed_at) FROM files").fetchone()
+    files_text = cur.execute("SELECT COUNT(DISTINCT file_id) FROM chunks").fetchone()[0]
+    chunks = cur.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    return {"files_total": files_total, "files_text": files_text,
+            "chunks": chunks, "last_indexed_at": last_idx}
+
 # settings helpers
 
 def ensure_settings(con):
     con.execute("CREATE TABLE IF NOT EXISTS settings(k TEXT PRIMARY KEY, v TEXT)")
     con.commit()
 
+def _settings(con) -> dict | None:
+    # whole table cached per connection, reloaded when another connection has
+    # committed since (data_version moves); None for plain sqlite3 connections
+    if not isinstance(con, Connection):
+        return None
+    ver = con.execute("PRAGMA data_version").fetchone()[0]
+    if con.settings_cache is None or con.settings_version != ver:
+        try:
+            rows = con.execute("SELECT k, v FROM settings").fetchall()
+        except sqlite3.OperationalError:
+            rows = []   # table not created yet (unmigrated DB)
+        con.settings_cache = {k: v for k, v in rows}
+        con.settings_version = ver
+    return con.settings_cache
+
 def get_setting(con, k, default=None):
+    cache = _settings(con)
+    if cache is not None:
+        raw = cache.get(k)
+        return json.loads(raw) if raw is not None else default
     ensure_settings(con)
     row = con.execute("SELECT v FROM settings WHERE k=?", (k,)).fetchone()
     return json.loads(row[0]) if row else default
 
 def set_setting(con, k, value):
-    ensure_settings(con)
+    raw = json.dumps(value)
+    cache = _settings(con)
+    if cache is not None and cache.get(k) == raw:
+        return
+    if cache is None or schema_version(con) < 1:
+        ensure_settings(con)
     con.execute(
         "INSERT INTO settings(k,v) VALUES(?,?) ON CONFLICT(k) DO UPDATE SET v=excluded.v",
-        (k, json.dumps(value)),
+        (k, raw),
     )
     con.commit()
+    if cache is not None:
+        cache[k] = raw
+
+def update_setting(con, k, fn, default=None):
+    """Read-modify-write of one setting under a write lock: stores and returns fn(current).
+
+    Reads the table, not the cache, so a value another connection committed
+    since is never written over.
+    """
+    ensure_settings(con)
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        row = con.execute("SELECT v FROM settings WHERE k=?", (k,)).fetchone()
+        value = fn(json.loads(row[0]) if row else default)
+        raw = json.dumps(value)
+        con.execute("INSERT INTO settings(k,v) VALUES(?,?) ON CONFLICT(k) DO UPDATE SET v=excluded.v", (k, raw))
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    cache = _settings(con)
+    if cache is not None:
+        cache[k] = raw
+    return value
 
 def normalize_time_units(con):
-    import sqlite3 as _sq
     for col in ("mtime","created_at","last_indexed_at","hash_checked_at"):
         try:
             v = con.execute(f"SELECT MAX({col}) FROM files").fetchone()[0]
             if v and v > 10**11:  # looks like milliseconds
-                con.execute(f"UPDATE files SET {col} = CAST({col}/1000 AS INTEGER) WHERE {col} > 10**11")
+                con.execute(f"UPDATE files SET {col} = CAST({col}/1000 AS INTEGER) WHERE {col} > 100000000000")
                 con.commit()
-        except _sq.Error:
+        except sqlite3.Error:
             pass
 
 
@@ -129,3 +344,77 @@ def file_meta(con, path: str):
         "last_indexed_at": r[3], "hash_checked_at": r[4],
         "blake3": r[5], "sha1": r[6],
     }
+
+
+# read-only connection pool (concurrent readers alongside the WAL writer)
+
+RO_PRAGMAS = [
+ "PRAGMA query_only=ON;",
+ "PRAGMA temp_store=MEMORY;",
+ "PRAGMA cache_size=-20000;",
+ "PRAGMA busy_timeout=5000;"
+]
+
+def connect_ro(db_path: str, *, timeout: float = 30.0) -> sqlite3.Connection:
+    uri = pathlib.Path(os.path.abspath(db_path)).as_uri() + "?mode=ro"
+    con = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=timeout, factory=Connection)
+    for p in RO_PRAGMAS: con.execute(p)
+    return con
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ReadPool:
+    """Fixed-size pool of read-only connections, created lazily.
+
+    `connection(deadline=...)` aborts any statement still running at the
+    monotonic `deadline` (sqlite3.OperationalError "interrupted").
+    """
+
+    def __init__(self, db_path: str, size: int = 4, *, wait: float = 10.0):
+        self.db_path = db_path
+        self.size = max(1, int(size))
+        self.wait = wait
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _acquire(self, timeout: float) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                con = connect_ro(self.db_path)
+                self._all.append(con)
+                return con
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"no free connection for {self.db_path}") from None
+
+    @contextlib.contextmanager
+    def connection(self, deadline: float | None = None):
+        wait = self.wait if deadline is None else max(0.0, deadline - time.monotonic())
+        con = self._acquire(wait)
+        if deadline is not None:
+            con.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 1000)
+        try:
+            yield con
+        finally:
+            if deadline is not None:
+                con.set_progress_handler(None, 0)
+            try: con.rollback()
+            except sqlite3.Error: pass
+            self._idle.put(con)
+
+    def close(self) -> None:
+        with self._lock:
+            for con in self._all:
+                try: con.close()
+                except sqlite3.Error: pass
+            self._all = []
+        self._idle = queue.LifoQueue()
@@ -0,0 +1,216 @@
+# app/dirtree.py — per-directory rollups for browsing the indexed tree
+#
+# dirs holds one row per directory that (recursively) contains indexed files,
+# with the recursive size, file count and newest mtime of its subtree — a
+# cached `du`. files.dir_id points at the direct parent, so a directory
+# listing is an index range on (dir_id, ...) no matter how large the subtree.
+#
+# index_root keeps the rollups current through a Rollup: deltas per
+# directory are summed in memory and folded into every ancestor at commit
+# time. Removals can lower `newest`, which is not invertible, so those
+# directories are re-derived bottom-up from their direct files and children.
+
+import os, sqlite3
+from .logging_conf import get_logger
+log = get_logger("dirtree")
+
+SORTS = ("name", "size", "mtime")
+PAGE_DEFAULT = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs(
+  id INTEGER PRIMARY KEY,
+  path TEXT NOT NULL UNIQUE,
+  parent_id INTEGER,
+  size INTEGER NOT NULL DEFAULT 0,      -- recursive
+  files INTEGER NOT NULL DEFAULT 0,     -- recursive
+  newest INTEGER                        -- newest mtime in the subtree
+);
+CREATE INDEX IF NOT EXISTS idx_dirs_parent ON dirs(parent_id, size);
+CREATE INDEX IF NOT EXISTS idx_files_dir_name ON files(dir_id, path, size, mtime);
+CREATE INDEX IF NOT EXISTS idx_files_dir_size ON files(dir_id, size, path, mtime);
+CREATE INDEX IF NOT EXISTS idx_files_dir_mtime ON files(dir_id, mtime, path, size);
+"""
+
+
+def _parent(path: str) -> str | None:
+    up = os.path.dirname(path)
+    return up if up != path else None
+
+def norm(path: str) -> str:
+    # same spelling the indexer stores (abspath of the walked directory)
+    return os.path.abspath(path)
+
+
+class Rollup:
+    """Pending rollup deltas for one writer; flush() before committing."""
+
+    def __init__(self, cur: sqlite3.Cursor):
+        self.cur = cur
+        self._ids: dict[str, int] = {}
+        self._parents: dict[int, int | None] = {}
+        self._delta: dict[int, list] = {}     # dir_id -> [size, files, newest]
+        self._stale: set[int] = set()         # newest may have gone down
+
+    def dir_id(self, path: str) -> int:
+        """Id of directory `path`, creating it (and missing ancestors) on first use."""
+        did = self._ids.get(path)
+        if did is not None:
+            return did
+        row = self.cur.execute("SELECT id, parent_id FROM dirs WHERE path=?", (path,)).fetchone()
+        if row:
+            did, pid = row
+        else:
+            up = _parent(path)
+            pid = self.dir_id(up) if up is not None else None
+            did = self.cur.execute("INSERT INTO dirs(path, parent_id) VALUES(?,?)", (path, pid)).lastrowid
+        self._ids[path] = did; self._parents[did] = pid
+        return did
+
+    def _parent_of(self, did: int) -> int | None:
+        if did not in self._parents:
+            row = self.cur.execute("SELECT parent_id FROM dirs WHERE id=?", (did,)).fetchone()
+            self._parents[did] = row[0] if row else None
+        return self._parents[did]
+
+    def _add(self, did: int | None, size, files: int, mtime) -> None:
+        if did is None: return
+        d = self._delta.setdefault(did, [0, 0, None])
+        d[0] += size or 0; d[1] += files
+        if mtime is not None and (d[2] is None or mtime > d[2]): d[2] = mtime
+
+    def change(self, old_dir, old_size, old_mtime, new_dir: int, new_size, new_mtime) -> None:
+        """A file was inserted (old_dir None) or its metadata replaced."""
+        if old_dir is not None:
+            self._add(old_dir, -(old_size or 0), -1, None)
+            if old_dir != new_dir or (old_mtime or 0) > (new_mtime or 0):
+                self._stale.add(old_dir)          # its newest may have gone down
+        self._add(new_dir, new_size, 1, new_mtime)
+
+    def remove(self, did, size, mtime) -> None:
+        if did is None: return
+        self._add(did, -(size or 0), -1, None)
+        self._stale.add(did)
+
+    def flush(self) -> None:
+        if not self._delta: return
+        agg: dict[int, list] = {}
+        for did, (ds, dn, nw) in self._delta.items():
+            d = did
+            while d is not None:
+                a = agg.setdefault(d, [0, 0, None])
+                a[0] += ds; a[1] += dn
+                if nw is not None and (a[2] is None or nw > a[2]): a[2] = nw
+                d = self._parent_of(d)
+        self.cur.executemany(
+            "UPDATE dirs SET size=size+?, files=files+?, newest=COALESCE(MAX(newest, ?), newest, ?) WHERE id=?",
+            [(ds, dn, nw, nw, d) for d, (ds, dn, nw) in agg.items() if ds or dn or nw is not None])
+        if self._stale:
+            self._renew(self._stale)
+            gone = [d for d, (_s, dn, _n) in agg.items() if dn < 0]
+            for i in range(0, len(gone), 500):
+                part = gone[i:i + 500]
+                self.cur.execute(f"DELETE FROM dirs WHERE files <= 0 AND id IN ({','.join('?' * len(part))})", part)
+            for path, did in list(self._ids.items()):
+                if did in agg and agg[did][1] < 0: self._ids.pop(path, None)
+        self._delta.clear(); self._stale.clear()
+
+    def _renew(self, stale: set[int]) -> None:
+        # deepest first, so a child's corrected value feeds its parent
+        todo = {}
+        for did in stale:
+            row = self.cur.execute("SELECT path FROM dirs WHERE id=?", (did,)).fetchone()
+            if row: todo[did] = row[0]
+        while todo:
+            did = max(todo, key=lambda k: len(todo[k]))
+            todo.pop(did)
+            (own,) = self.cur.execute("SELECT MAX(mtime) FROM files WHERE dir_id=?", (did,)).fetchone()
+            (sub,) = self.cur.execute("SELECT MAX(newest) FROM dirs WHERE parent_id=?", (did,)).fetchone()
+            newest = max((v for v in (own, sub) if v is not None), default=None)
+            if self.cur.execute("UPDATE dirs SET newest=? WHERE id=? AND newest IS NOT ?",
+                                (newest, did, newest)).rowcount:
+                pid = self._parent_of(did)
+                if pid is not None and pid not in todo:
+                    row = self.cur.execute("SELECT path FROM dirs WHERE id=?", (pid,)).fetchone()
+                    if row: todo[pid] = row[0]
+
+
+def rebuild(con: sqlite3.Connection, batch: int = 5000) -> int:
+    """Recompute dirs and files.dir_id from scratch (migration, snapshot import, repair)."""
+    cur = con.cursor()
+    cur.execute("DELETE FROM dirs")
+    cur.execute("UPDATE files SET dir_id=NULL WHERE dir_id IS NOT NULL")
+    tree = Rollup(cur)
+    last, n = "", 0
+    while True:
+        rows = cur.execute("""SELECT id, path, size, mtime FROM files
+                              WHERE path > ? AND size IS NOT NULL ORDER BY path LIMIT ?""", (last, batch)).fetchall()
+        if not rows: break
+        last = rows[-1][1]
+        upd = []
+        for fid, path, size, mtime in rows:
+            did = tree.dir_id(os.path.dirname(path))
+            upd.append((did, fid)); tree.change(None, None, None, did, size, mtime)
+        cur.executemany("UPDATE files SET dir_id=? WHERE id=?", upd)
+        tree.flush(); n += len(rows)
+    con.commit()
+    log.debug("dirtree rebuilt files=%d dirs=%d", n, cur.execute("SELECT COUNT(*) FROM dirs").fetchone()[0])
+    return n
+
+
+# —— browsing ——
+def info(con: sqlite3.Connection, path: str) -> tuple | None:
+    """(id, path, size, files, newest) for one directory."""
+    return con.execute("SELECT id, path, size, files, newest FROM dirs WHERE path=?", (norm(path),)).fetchone()
+
+def tops(con: sqlite3.Connection) -> list[tuple]:
+    """Directories without a parent (filesystem roots / drives)."""
+    return con.execute("SELECT path, size, files, newest FROM dirs WHERE parent_id IS NULL").fetchall()
+
+def subdirs(con: sqlite3.Connection, path: str) -> list[tuple]:
+    """[(path, size, files, newest)] for the direct subdirectories of `path`."""
+    return con.execute("""SELECT c.path, c.size, c.files, c.newest FROM dirs d
+                          JOIN dirs c ON c.parent_id = d.id WHERE d.path=?""", (norm(path),)).fetchall()
+
+def files(con: sqlite3.Connection, path: str, *, sort: str = "name", limit: int = PAGE_DEFAULT,
+          after: tuple | None = None) -> tuple[list[tuple], tuple | None]:
+    """One keyset page of the files directly in `path`: ([(path, size, mtime)], next cursor).
+
+    name ascending, size and mtime descending walk idx_files_dir_name / _size /
+    _mtime, so page N of a 100k-entry directory costs the same as page 1.
+    Rows without a size/mtime (error rows) come last in those sorts; their
+    cursor carries None as the value.
+    """
+    if sort not in SORTS: raise ValueError(f"unknown sort: {sort}")
+    row = info(con, path)
+    if row is None:
+        return [], None
+    did = row[0]
+    if sort == "name":
+        params = [did] + ([after[0]] if after else []) + [limit]
+        rows = con.execute(f"""SELECT path, size, mtime FROM files INDEXED BY idx_files_dir_name
+                               WHERE dir_id = ? {"AND path > ?" if after else ""}
+                               ORDER BY path LIMIT ?""", params).fetchall()
+    else:
+        col = "size" if sort == "size" else "mtime"
+        sql = f"""SELECT path, size, mtime FROM files INDEXED BY idx_files_dir_{col}
+                  WHERE dir_id = ? AND {col} IS {{}} NULL {{}} ORDER BY {col} DESC, path DESC LIMIT ?"""
+        rows = []
+        if not after or after[0] is not None:
+            cond = f"AND ({col}, path) < (?, ?)" if after else ""
+            rows = con.execute(sql.format("NOT", cond), [did, *(after or ()), limit]).fetchall()
+        if len(rows) < limit:
+            tail = after is not None and after[0] is None
+            rows += con.execute(sql.format("", "AND path < ?" if tail else ""),
+                                [did, *([after[1]] if tail else []), limit - len(rows)]).fetchall()
+    nxt = None
+    if len(rows) == limit:
+        last = rows[-1]
+        nxt = (last[0],) if sort == "name" else ((last[1] if sort == "size" else last[2]), last[0])
+    return rows, nxt
+
+def merge_key(sort: str):
+    """(key, reverse) for merging pages from several shards in files()' order."""
+    if sort == "name": return (lambda r: r[0]), False
+    col = 1 if sort == "size" else 2
+    return (lambda r: (r[col] is not None, r[col] or 0, r[0])), True    # NULLs last, as in files()
@@ -1,4 +1,5 @@
-import os, re, chardet
+import os, re, bisect, codecs
+from array import array
 
 TEXT_EXT = {".txt",".md",".py",".js",".ts",".json",".yaml",".yml",".html",".htm",
             ".css",".sql",".ini",".cfg",".log",".csv",".tsv",".toml"}
@@ -6,23 +7,74 @@ TEXT_EXT = {".txt",".md",".py",".js",".ts",".json",".yaml",".yml",".html",".htm"
 def is_textable(path: str) -> bool:
     return os.path.splitext(path.lower())[1] in TEXT_EXT
 
-def read_text(path: str, max_bytes: int = 200_000) -> str | None:
+def _decode(raw: bytes) -> tuple[str, str]:
+    import chardet   # deferred: only needed once indexing starts
+    enc = chardet.detect(raw).get("encoding") or "utf-8"
+    try: return raw.decode(enc, errors="ignore"), enc
+    except Exception: return raw.decode("utf-8", errors="ignore"), "utf-8"
+
+_SEP      = re.compile(r"\s+")
+_SEP_HTML = re.compile(r"(?:<[^>]+>|\s)+")   # a run of tags/whitespace collapses to one space
+
+def _normalize(s: str, html: bool):
+    """Lower-cased, tag-stripped, whitespace-collapsed text plus token marks:
+    marks_n[i] / marks_s[i] = where token i starts in the output / in `s`."""
+    out, marks_n, marks_s = [], array("l"), array("l")
+    n = pos = 0
+    for m in (_SEP_HTML if html else _SEP).finditer(s):
+        if m.start() > pos:
+            if n: out.append(" "); n += 1
+            tok = s[pos:m.start()].lower()
+            marks_n.append(n); marks_s.append(pos)
+            out.append(tok); n += len(tok)
+        pos = m.end()
+    if pos < len(s):
+        if n: out.append(" "); n += 1
+        tok = s[pos:].lower()
+        marks_n.append(n); marks_s.append(pos)
+        out.append(tok); n += len(tok)
+    return "".join(out), marks_n, marks_s
+
+def read_text_spans(path: str, max_bytes: int = 200_000):
+    """(normalized text, byte_at) where byte_at(i) is the offset in the source
+    file of normalized character i. Calls must use non-decreasing i."""
     try:
         with open(path, "rb") as f: raw = f.read(max_bytes)
     except Exception:
-        return None
-    enc = chardet.detect(raw).get("encoding") or "utf-8"
-    try: s = raw.decode(enc, errors="ignore")
-    except Exception: s = raw.decode("utf-8", errors="ignore")
-    if path.lower().endswith((".html",".htm")):
-        s = re.sub(r"<[^>]+>", " ", s)
-    s = re.sub(r"\s+", " ", s).strip().lower()
-    return s
-
-def chunk(text: str, target: int = 4096):
+        return None, None
+    return text_spans(path, raw)
+
+def text_spans(path: str, raw: bytes):
+    """read_text_spans() over bytes already read from the start of `path`."""
+    s, enc = _decode(raw)
+    text, marks_n, marks_s = _normalize(s, path.lower().endswith((".html",".htm")))
+    try: encoder = codecs.getincrementalencoder(enc)(errors="ignore")
+    except LookupError: encoder = codecs.getincrementalencoder("utf-8")(errors="ignore")
+    state = {"src": 0, "byte": 0}
+
+    def byte_at(i: int) -> int:
+        if i >= len(text) or not marks_n:
+            src = len(s)
+        else:
+            k = max(0, bisect.bisect_right(marks_n, i) - 1)
+            tok_end = marks_s[k + 1] if k + 1 < len(marks_s) else len(s)
+            src = min(marks_s[k] + max(0, i - marks_n[k]), tok_end)
+        if src > state["src"]:
+            state["byte"] += len(encoder.encode(s[state["src"]:src]))
+            state["src"] = src
+        return min(state["byte"], len(raw))
+    return text, byte_at
+
+def read_text(path: str, max_bytes: int = 200_000) -> str | None:
+    return read_text_spans(path, max_bytes)[0]
+
+def chunk(text: str, target: int = 4096, byte_at=None):
+    """(ord, text, from, to) per chunk; from/to are source byte offsets when
+    `byte_at` is given, else character offsets into `text`."""
     out=[]; i=0; ord_=0
+    pos = byte_at or (lambda j: j)
     while i < len(text):
-        out.append((ord_, text[i:i+target], i, min(len(text), i+target)))
+        end = min(len(text), i+target)
+        out.append((ord_, text[i:end], pos(i), pos(end)))
         i += target; ord_ += 1
     return out
-
@@ -0,0 +1,225 @@
+# app/facets.py — file type / extension / size facets
+#
+# ext and size_bucket are derived from path and size by triggers (pure SQL, so
+# every writer keeps them right, like ctime_eff); mime is sniffed by the
+# indexer: a guess from the extension when only stat data is known, refined
+# from the first block the checksum lane reads anyway.
+#
+# idx_files_facets(ext, mime, size_bucket, mtime, path) covers the facet
+# columns plus the scope/time predicates, so counts are one GROUP BY over
+# the index, never the table.
+
+import mimetypes
+from .logging_conf import get_logger
+log = get_logger("facets")
+
+FIELDS = ("ext", "mime", "size_bucket")
+SIZE_EDGES  = (16 << 10, 1 << 20, 16 << 20, 256 << 20)
+SIZE_LABELS = ("< 16 KB", "16 KB – 1 MB", "1 – 16 MB", "16 – 256 MB", "> 256 MB")
+SNIFF_BYTES = 4096
+
+_EXTRA_TYPES = {".md": "text/markdown", ".yaml": "application/yaml", ".yml": "application/yaml",
+                ".ts": "text/x-typescript", ".log": "text/plain", ".toml": "application/toml",
+                ".heic": "image/heic", ".webp": "image/webp", ".flac": "audio/flac"}
+
+# (offset, magic, mime); checked in order
+_MAGIC = (
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"), (0, b"GIF89a", "image/gif"),
+    (0, b"II*\x00", "image/tiff"), (0, b"MM\x00*", "image/tiff"),
+    (0, b"SQLite format 3\x00", "application/vnd.sqlite3"),
+    (0, b"\x1f\x8b", "application/gzip"),
+    (0, b"BZh", "application/x-bzip2"),
+    (0, b"\xfd7zXZ\x00", "application/x-xz"),
+    (0, b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (0, b"Rar!\x1a\x07", "application/vnd.rar"),
+    (0, b"\x7fELF", "application/x-executable"),
+    (0, b"MZ", "application/x-msdownload"),
+    (0, b"\x00asm", "application/wasm"),
+    (0, b"OggS", "audio/ogg"),
+    (0, b"fLaC", "audio/flac"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"{\\rtf", "application/rtf"),
+    (0, b"%!PS", "application/postscript"),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"),   # legacy Office
+    (4, b"ftypqt", "video/quicktime"),
+    (4, b"ftypheic", "image/heic"),
+    (4, b"ftyp", "video/mp4"),
+)
+_RIFF = {b"WEBP": "image/webp", b"WAVE": "audio/wav", b"AVI ": "video/x-msvideo"}
+_ZIP_BASED = {".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".epub", ".jar", ".apk", ".whl"}
+_TEXTY = {"application/json", "application/xml", "application/javascript", "application/yaml",
+          "application/toml", "application/x-sh", "image/svg+xml"}
+_BOMS = (b"\xef\xbb\xbf", b"\xff\xfe", b"\xfe\xff")
+
+_types = None
+
+
+def _guesser():
+    global _types
+    if _types is None:
+        _types = mimetypes.MimeTypes()          # built-in table only: same answer on every machine
+        for ext, t in _EXTRA_TYPES.items(): _types.add_type(t, ext)
+    return _types
+
+def ext_of(path: str) -> str:
+    """Lower-case extension without the dot ('' for none or dot-files); mirrors _ext_sql."""
+    name = path.replace("\\", "/").rsplit("/", 1)[-1]
+    i = name.rfind(".")
+    return name[i + 1:].lower() if i > 0 else ""
+
+def size_bucket(size: int | None) -> int | None:
+    if size is None: return None
+    for i, e in enumerate(SIZE_EDGES):
+        if size < e: return i
+    return len(SIZE_EDGES)
+
+def guess(path: str, size: int | None = None) -> str | None:
+    """MIME from stat data alone (extension, empty file)."""
+    if size == 0:
+        return "application/x-empty"
+    return _guesser().guess_type(path, strict=False)[0]
+
+def sniff(path: str, size: int | None, head: bytes) -> str | None:
+    """MIME from the first block of the file, falling back to the extension."""
+    if size == 0 or not head:
+        return guess(path, size)
+    for off, magic, mime in _MAGIC:
+        if head.startswith(magic, off):
+            return mime
+    if head.startswith(b"RIFF") and head[8:12] in _RIFF:
+        return _RIFF[head[8:12]]
+    if head.startswith(b"PK\x03\x04"):
+        ext = "." + ext_of(path)
+        return guess(path) if ext in _ZIP_BASED else "application/zip"
+    g = guess(path)
+    if head.startswith(_BOMS):
+        return g if g and (g.startswith("text/") or g in _TEXTY) else "text/plain"
+    if b"\x00" in head[:SNIFF_BYTES]:
+        return g if g and not g.startswith("text/") else "application/octet-stream"
+    try:
+        head[:SNIFF_BYTES].decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(head[:SNIFF_BYTES]) - 4:     # not just a character cut at the block edge
+            return g or "application/octet-stream"
+    return g if g and (g.startswith("text/") or g in _TEXTY) else "text/plain"
+
+
+# —— SQL side ——
+def _ext_sql(col: str) -> str:
+    # basename = text after the last '/', ext = text after its last '.' (not a leading one);
+    # rtrim(s, <every char of s except X>) cuts s back to its last X
+    p = f"replace({col}, '\\', '/')"
+    name = f"substr({p}, length(rtrim({p}, replace({p}, '/', ''))) + 1)"
+    dot = f"length(rtrim({name}, replace({name}, '.', '')))"
+    return f"CASE WHEN {dot} > 1 THEN lower(substr({name}, {dot} + 1)) ELSE '' END"
+
+def _bucket_sql(col: str) -> str:
+    whens = " ".join(f"WHEN {col} < {e} THEN {i}" for i, e in enumerate(SIZE_EDGES))
+    return f"CASE WHEN {col} IS NULL THEN NULL {whens} ELSE {len(SIZE_EDGES)} END"
+
+SCHEMA = f"""
+CREATE TRIGGER IF NOT EXISTS trg_files_facets_ins AFTER INSERT ON files BEGIN
+  UPDATE files SET ext = {_ext_sql('NEW.path')}, size_bucket = {_bucket_sql('NEW.size')} WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_files_facets_upd AFTER UPDATE OF path, size ON files BEGIN
+  UPDATE files SET ext = {_ext_sql('NEW.path')}, size_bucket = {_bucket_sql('NEW.size')} WHERE id = NEW.id;
+END;
+CREATE INDEX IF NOT EXISTS idx_files_facets ON files(ext, mime, size_bucket, mtime, path);
+"""
+
+def backfill(con, batch: int = 2000) -> int:
+    """Fill ext/size_bucket for existing rows and an extension-based mime where none is known."""
+    con.execute(f"UPDATE files SET ext = {_ext_sql('path')}, size_bucket = {_bucket_sql('size')}")
+    n = 0
+    last = 0
+    while True:
+        rows = con.execute("SELECT id, path, size FROM files WHERE mime IS NULL AND id > ? ORDER BY id LIMIT ?",
+                           (last, batch)).fetchall()
+        if not rows: break
+        last = rows[-1][0]
+        upd = [(m, fid) for fid, path, size in rows if (m := guess(path, size))]
+        con.executemany("UPDATE files SET mime=? WHERE id=?", upd)
+        n += len(upd)
+    return n
+
+
+# —— counting ——
+def label(field: str, value) -> str:
+    if field == "size_bucket":
+        return SIZE_LABELS[value] if value is not None and 0 <= value < len(SIZE_LABELS) else "unknown"
+    if field == "ext":
+        return value or "(none)"
+    return value or "unknown"
+
+def normalize(filters: dict | None) -> dict:
+    """{'ext': ['.PDF'], 'mime': 'image/', 'size_bucket': ['2']} -> clean lists per field, empties dropped."""
+    out = {}
+    for f in FIELDS:
+        vals = (filters or {}).get(f)
+        if vals is None or vals == []: continue
+        if not isinstance(vals, (list, tuple, set)): vals = [vals]
+        if f == "ext":
+            vals = [str(v).lower().lstrip(".") for v in vals]
+        elif f == "size_bucket":
+            vals = [int(v) for v in vals]
+        else:
+            vals = [str(v).lower() for v in vals]
+        out[f] = vals
+    return out
+
+def where(filters: dict, alias: str = "", skip: str | None = None) -> tuple[str, list]:
+    """SQL predicate for the facet filters (one field optionally left out) and its params.
+
+    A mime value ending in '/' selects the whole major type ('image/').
+    """
+    a = f"{alias}." if alias else ""
+    parts, params = [], []
+    for f, vals in filters.items():
+        if f == skip: continue
+        if f == "mime":
+            ors = []
+            for v in vals:
+                if v.endswith("/"):
+                    ors.append(f"({a}mime >= ? AND {a}mime < ?)"); params += [v, v[:-1] + "0"]
+                else:
+                    ors.append(f"{a}mime = ?"); params.append(v)
+            parts.append("(" + " OR ".join(ors) + ")")
+        else:
+            parts.append(f"{a}{f} IN ({','.join('?' * len(vals))})"); params += vals
+    return " AND ".join(parts), params
+
+def _matches(field: str, value, vals: list) -> bool:
+    if field == "mime":
+        v = value or ""
+        return any(v.startswith(x) if x.endswith("/") else v == x for x in vals)
+    return value in vals
+
+def marginals(cube, filters: dict | None = None, limit: int = 20) -> dict:
+    """Per-field counts from (ext, mime, size_bucket, n) rows.
+
+    Each field is counted under every *other* field's filter, so the values
+    you could switch to stay visible once one is selected.
+    """
+    filters = normalize(filters)
+    out = {}
+    for i, f in enumerate(FIELDS):
+        tally: dict = {}
+        for row in cube:
+            if all(_matches(g, row[j], filters[g]) for j, g in enumerate(FIELDS) if g != f and g in filters):
+                tally[row[i]] = tally.get(row[i], 0) + row[3]
+        if f == "size_bucket":     # natural order, all buckets
+            order = sorted(tally.items(), key=lambda kv: (kv[0] is None, kv[0] or 0))
+        else:
+            order = sorted(tally.items(), key=lambda kv: (-kv[1], kv[0] or ""))[:limit]
+        out[f] = [(v, n, label(f, v)) for v, n in order]
+    return out
+
+def merge_cubes(cubes) -> list[tuple]:
+    acc: dict = {}
+    for cube in cubes:
+        for ext, mime, sb, n in cube or ():
+            acc[(ext, mime, sb)] = acc.get((ext, mime, sb), 0) + n
+    return [k + (n,) for k, n in acc.items()]
@@ -0,0 +1,91 @@
+# app/failures.py — negative cache for paths that keep failing to index
+#
+# Each failure bumps `attempts` and pushes `next_retry_at` out exponentially
+# (1h, 2h, 4h, … capped at 30 days). index_root skips files — and whole
+# subtrees for directory failures — until their retry time has passed.
+
+import os, time, sqlite3
+from . import db
+from .logging_conf import get_logger
+log = get_logger("failures")
+
+BACKOFF_BASE_SEC = 3600
+BACKOFF_MAX_SEC  = 30 * 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS index_failures(
+  path TEXT PRIMARY KEY,
+  is_dir INTEGER NOT NULL DEFAULT 0,
+  err_class TEXT, err_msg TEXT,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  first_failed_at INTEGER, last_failed_at INTEGER,
+  next_retry_at INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_failures_retry ON index_failures(next_retry_at);
+"""
+
+
+def backoff(attempts: int) -> int:
+    return min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * (1 << max(0, min(attempts - 1, 30))))
+
+
+def record(cur: sqlite3.Cursor, path: str, exc: BaseException, *, is_dir: bool = False,
+           now: int | None = None) -> None:
+    now = int(time.time()) if now is None else now
+    row = cur.execute("SELECT attempts FROM index_failures WHERE path=?", (path,)).fetchone()
+    attempts = (row[0] if row else 0) + 1
+    cur.execute(
+        """
+        INSERT INTO index_failures(path,is_dir,err_class,err_msg,attempts,first_failed_at,last_failed_at,next_retry_at)
+        VALUES(?,?,?,?,?,?,?,?)
+        ON CONFLICT(path) DO UPDATE SET
+            is_dir=excluded.is_dir, err_class=excluded.err_class, err_msg=excluded.err_msg,
+            attempts=excluded.attempts, last_failed_at=excluded.last_failed_at,
+            next_retry_at=excluded.next_retry_at
+        """,
+        (path, int(is_dir), type(exc).__name__, str(exc)[:500], attempts, now, now, now + backoff(attempts)),
+    )
+
+def clear(cur: sqlite3.Cursor, path: str) -> None:
+    cur.execute("DELETE FROM index_failures WHERE path=?", (path,))
+
+def for_root(cur: sqlite3.Cursor, root: str, now: int | None = None):
+    """Failures under `root`: (files still backing off, dirs still backing off, every known path)."""
+    now = int(time.time()) if now is None else now
+    lo, hi = db.path_range(root)
+    base = os.path.abspath(root)
+    skip_files, skip_dirs, known = set(), set(), set()
+    for path, is_dir, nxt in cur.execute(
+            "SELECT path, is_dir, next_retry_at FROM index_failures WHERE (path >= ? AND path < ?) OR path = ?",
+            (lo, hi, base)):
+        known.add(path)
+        if nxt > now:
+            (skip_dirs if is_dir else skip_files).add(path)
+    return skip_files, skip_dirs, known
+
+
+def list_failures(con: sqlite3.Connection, root: str | None = None, *, due_only: bool = False) -> list[dict]:
+    where, params = [], []
+    if root:
+        lo, hi = db.path_range(root)
+        where.append("((path >= ? AND path < ?) OR path = ?)"); params += [lo, hi, os.path.abspath(root)]
+    if due_only:
+        where.append("next_retry_at <= ?"); params.append(int(time.time()))
+    sql = ("SELECT path,is_dir,err_class,err_msg,attempts,first_failed_at,last_failed_at,next_retry_at "
+           "FROM index_failures" + (" WHERE " + " AND ".join(where) if where else "") +
+           " ORDER BY is_dir DESC, attempts DESC, path")
+    cols = ("path", "is_dir", "err_class", "err_msg", "attempts", "first_failed_at", "last_failed_at", "next_retry_at")
+    return [dict(zip(cols, r)) for r in con.execute(sql, params)]
+
+def force_retry(con: sqlite3.Connection, path: str | None = None) -> int:
+    """Make failures retry on the next run: all of them, one path, or everything under a directory."""
+    if path is None:
+        n = con.execute("UPDATE index_failures SET next_retry_at=0").rowcount
+    else:
+        lo, hi = db.path_range(path)
+        ap = os.path.abspath(path)
+        n = con.execute("UPDATE index_failures SET next_retry_at=0 WHERE path=? OR (path >= ? AND path < ?)",
+                        (ap, lo, hi)).rowcount
+    con.commit()
+    log.debug("force_retry path=%s rows=%d", path, n)
+    return n
@@ -0,0 +1,110 @@
+# app/fileio.py — one read per file, shared by the checksum lane and extraction
+#
+# Blocks are read with readinto() into buffers from a small pool, so hashing a
+# file allocates nothing per block; the hasher sees memoryviews of the pooled
+# buffer. The first `keep` bytes are copied out once and handed to the caller
+# (mime sniffing, text extraction), so a file is opened and read exactly once.
+#
+# Full hashes of files above THREADS_MIN_MB go through mmap instead: one
+# update() per MMAP_WINDOW of the mapping, which blake3 splits across cores.
+# The bytes fed to the hasher are the same in every mode, so digests do not change.
+
+import mmap, threading
+from contextlib import contextmanager
+from .logging_conf import get_logger
+log = get_logger("fileio")
+
+BLOCK          = 1 << 20
+POOL_MAX       = 8          # idle buffers kept around (one per concurrent reader is plenty)
+THREADS_MIN_MB = 16         # below this, thread start-up costs more than it saves
+MMAP_WINDOW    = 8 << 20    # bytes per threaded update(); bounds the mapped pages we hold
+
+
+class BufferPool:
+    """Reusable bytearrays of `size` bytes; thread-safe."""
+
+    def __init__(self, size: int = BLOCK, keep: int = POOL_MAX):
+        self.size, self.keep = size, keep
+        self._free: list[bytearray] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def buffer(self):
+        with self._lock:
+            buf = self._free.pop() if self._free else None
+        if buf is None:
+            buf = bytearray(self.size)
+        try:
+            yield buf
+        finally:
+            with self._lock:
+                if len(self._free) < self.keep: self._free.append(buf)
+
+_pool = BufferPool()
+
+
+def _hasher(threaded: bool):
+    import blake3 as _b3    # deferred: keeps app startup free of the native module
+    if threaded:
+        try:
+            return _b3.blake3(max_threads=_b3.blake3.AUTO)
+        except (TypeError, AttributeError):     # blake3 < 0.2: no multithreading
+            pass
+    return _b3.blake3()
+
+def _read_range(f, h, mv, pos: int, length: int, head: bytearray, keep: int) -> int:
+    """Feed [pos, pos+length) (or up to EOF when length < 0) to h; returns bytes read."""
+    f.seek(pos)
+    total = 0
+    while length < 0 or total < length:
+        want = len(mv) if length < 0 else min(len(mv), length - total)
+        n = f.readinto(mv[:want])
+        if not n: break
+        h.update(mv[:n])
+        if pos + total < keep:
+            head += mv[:min(n, keep - pos - total)]
+        total += n
+    return total
+
+def hash_file(path: str, size: int, *, sample: bool, large_mb: int, head_mb: int, tail_mb: int,
+              stride: float, keep: int = 0) -> tuple[str, bytes]:
+    """(blake3 hex digest, first min(keep, size) bytes) from a single pass over `path`.
+
+    Files above `large_mb` are sampled when `sample` is set: head, one block
+    every `stride` of the size, tail. The returned head is shorter than `keep`
+    only at EOF or when `keep` runs past a sampled file's head region.
+    """
+    MB = 1024 * 1024
+    full = size <= large_mb * MB or not sample
+    threaded = full and size >= THREADS_MIN_MB * MB
+    h = _hasher(threaded)
+    head = bytearray()
+    with open(path, "rb") as f:
+        if threaded:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    drop = getattr(mmap, "MADV_DONTNEED", None) if hasattr(mm, "madvise") else None
+                    with memoryview(mm) as mv:
+                        head += mv[:keep]
+                        for off in range(0, len(mm), MMAP_WINDOW):
+                            h.update(mv[off:off + MMAP_WINDOW])
+                            if drop is not None:    # hashed pages leave our RSS (they stay in the page cache)
+                                mm.madvise(drop, off, min(MMAP_WINDOW, len(mm) - off))
+                return h.hexdigest(), bytes(head)
+            except (OSError, ValueError) as e:      # special files, 32-bit address space, file shrank to 0
+                log.debug("mmap failed path=%s err=%s; reading blocks", path, e)
+                h = _hasher(False); head.clear()
+        with _pool.buffer() as buf, memoryview(buf) as mv:
+            if full:
+                _read_range(f, h, mv, 0, -1, head, keep)
+            else:
+                start = head_mb * MB
+                end   = max(0, size - tail_mb * MB)
+                step  = max(1, int(size * stride))
+                _read_range(f, h, mv, 0, start, head, keep)
+                pos = start
+                while pos < end:
+                    _read_range(f, h, mv, pos, BLOCK, head, 0)
+                    pos += step
+                _read_range(f, h, mv, end, tail_mb * MB, head, 0)
+    return h.hexdigest(), bytes(head)
@@ -1,9 +1,8 @@
 # app/indexer.py — incremental + checksums + cancel + knobs
 
 import os, time, stat, sqlite3, threading
-from blake3 import blake3
-from . import extract
-from .logging_conf import get_logger
+from . import db, extract, failures, similar, facets, dirtree, fileio
+from .logging_conf import get_logger, ErrorAggregator
 log = get_logger("indexer")
 
 
@@ -27,58 +26,186 @@ def _blake3_file(path, size, sample=True,
                  large_mb=LARGE_MB_DEFAULT,
                  head_mb=SAMPLE_HEAD_MB_DEFAULT,
                  tail_mb=SAMPLE_TAIL_MB_DEFAULT,
-                 stride=SAMPLE_STRIDE_DEFAULT):
-    h = blake3()
-    with open(path, "rb") as f:
-        if (size <= large_mb*1024*1024) or not sample:
-            for buf in iter(lambda: f.read(1<<20), b""): h.update(buf)
-        else:
-            f.seek(0); h.update(f.read(head_mb*1024*1024))
-            start = head_mb*1024*1024
-            end   = max(0, size - tail_mb*1024*1024)
-            step  = max(1, int(size * stride))
-            pos = start
-            while pos < end:
-                f.seek(pos); h.update(f.read(1<<20))
-                pos += step
-            f.seek(max(0, size - tail_mb*1024*1024))
-            h.update(f.read(tail_mb*1024*1024))
-    return h.hexdigest()
+                 stride=SAMPLE_STRIDE_DEFAULT,
+                 keep=0):
+    # keep > 0 also returns the first `keep` bytes (sniffing, extraction) from the same read
+    digest, head = fileio.hash_file(path, size, sample=sample, large_mb=large_mb, head_mb=head_mb,
+                                    tail_mb=tail_mb, stride=stride, keep=keep)
+    return (digest, head) if keep else digest
 
 def _get_row(cur: sqlite3.Cursor, path: str):
-    cur.execute("""SELECT id,size,mtime,inode,blake3,hash_checked_at,last_indexed_at
+    cur.execute("""SELECT id,size,mtime,inode,blake3,hash_checked_at,last_indexed_at,dir_id
                    FROM files WHERE path=?""", (path,))
     return cur.fetchone()
 
 
-def _upsert_meta(cur: sqlite3.Cursor, path: str, st) -> int:
+def _upsert_meta(cur: sqlite3.Cursor, path: str, st, dir_id: int | None = None, seen: int | None = None) -> int:
     # compute created_at in **seconds**
     try:
         created = int(st.st_birthtime)            # macOS
     except AttributeError:
         created = int(st.st_ctime) if os.name == "nt" else None  # Windows or None on Linux
 
-    now = int(time.time())
+    now = seen or int(time.time())
     cur.execute(
         """
-        INSERT INTO files(path,size,mtime,created_at,inode,status,last_seen)
-        VALUES(?,?,?,?,?,?,?)
+        INSERT INTO files(path,size,mtime,created_at,inode,status,last_seen,mime,dir_id)
+        VALUES(?,?,?,?,?,?,?,?,?)
         ON CONFLICT(path) DO UPDATE SET
+            -- keep a sniffed type while the file is unchanged; otherwise the extension guess
+            mime       = CASE WHEN files.size IS excluded.size AND files.mtime IS excluded.mtime
+                              THEN COALESCE(files.mime, excluded.mime) ELSE excluded.mime END,
+            -- new size/mtime means the stored text and hash describe old content: mark
+            -- the row for content indexing until _index_content has actually run
+            last_indexed_at = CASE WHEN files.size IS excluded.size AND files.mtime IS excluded.mtime
+                                   THEN files.last_indexed_at END,
+            hash_checked_at = CASE WHEN files.size IS excluded.size AND files.mtime IS excluded.mtime
+                                   THEN files.hash_checked_at END,
             size       = excluded.size,
             mtime      = excluded.mtime,
             inode      = excluded.inode,
+            dir_id     = excluded.dir_id,
             last_seen  = excluded.last_seen,
             status     = 'ok',
             -- only fill created_at if it was NULL before
             created_at = COALESCE(files.created_at, excluded.created_at)
         """,
-        (path, int(st.st_size), int(st.st_mtime), created, str(st.st_ino), "ok", now),
+        (path, int(st.st_size), int(st.st_mtime), created, str(st.st_ino), "ok", now,
+         facets.guess(path, st.st_size), dir_id),
     )
     fid = cur.execute("SELECT id FROM files WHERE path=?", (path,)).fetchone()[0]
     return fid
 
 
 
+def _write_chunks(cur: sqlite3.Cursor, fid: int, text: str, byte_at=None) -> int:
+    db.delete_chunks(cur, fid)
+    n = db.insert_chunks(cur, fid, extract.chunk(text, byte_at=byte_at))
+    similar.store(cur, fid, similar.signature(text))
+    cur.execute("UPDATE files SET char_offsets=NULL WHERE id=? AND char_offsets IS NOT NULL", (fid,))
+    return n
+
+def refresh_offsets(con: sqlite3.Connection, path: str, max_read_bytes: int = 200_000) -> bool:
+    """Re-extract one file whose chunks still hold character offsets (see db._m10_byte_offsets).
+
+    Called when the file is previewed; True when its chunks were rewritten.
+    """
+    row = con.execute("SELECT id FROM files WHERE path=? AND char_offsets=1", (path,)).fetchone()
+    if not row: return False
+    text, byte_at = extract.read_text_spans(path, max_read_bytes)
+    if not text: return False
+    cur = con.cursor()
+    n = _write_chunks(cur, row[0], text, byte_at)
+    cur.execute("UPDATE files SET last_indexed_at=? WHERE id=?", (int(time.time()), row[0]))
+    con.commit()
+    log.debug("refresh_offsets path=%s chunks=%d", path, n)
+    return True
+
+
+def _index_content(cur: sqlite3.Cursor, fp: str, fid: int, size: int, old_blake3, old_hash_checked,
+                   unchanged_meta: bool, age_ok: bool, *, now: int, verify_sec: int,
+                   max_read_bytes: int, force_full_hash_large: bool, old_indexed: int | None = None) -> int:
+    """Checksum lane + text extraction for one file; returns chunks written.
+
+    `old_indexed` is last_indexed_at as read before _upsert_meta cleared it;
+    a touched file whose hash did not change gets it back.
+    """
+    same_hash = False
+    need_verify = True
+    if old_hash_checked:
+        need_verify = (verify_sec == 0) or ((now - int(old_hash_checked)) >= verify_sec) or (not unchanged_meta)
+
+    textable = extract.is_textable(fp)
+    raw = None      # leading bytes from the checksum read, reused by extraction
+    if need_verify:
+        digest, head = _blake3_file(
+            fp, size,
+            sample=not force_full_hash_large,
+            keep=max(facets.SNIFF_BYTES, max_read_bytes if textable else 0),
+        )
+        if old_blake3 and old_blake3 == digest and age_ok:
+            same_hash = True
+        mime = facets.sniff(fp, size, head[:facets.SNIFF_BYTES])
+        if len(head) >= min(size, max_read_bytes):
+            raw = head[:max_read_bytes]
+        cur.execute("UPDATE files SET blake3=?, hash_checked_at=?, mime=? WHERE path=?", (digest, now, mime, fp))
+    else:
+        if old_blake3 and age_ok:
+            same_hash = True
+
+    chunks_written = 0
+    if same_hash and age_ok:
+        # content verified unchanged: the text on record is still current
+        cur.execute("UPDATE files SET last_indexed_at=COALESCE(last_indexed_at, ?) WHERE path=?", (old_indexed, fp))
+    else:
+        if textable:
+            text, byte_at = (extract.text_spans(fp, raw) if raw is not None
+                             else extract.read_text_spans(fp, max_read_bytes))
+            if text:
+                chunks_written = _write_chunks(cur, fid, text, byte_at)
+        cur.execute("UPDATE files SET last_indexed_at=? WHERE path=?", (now, fp))
+    return chunks_written
+
+
+# —— prune sweep ——
+PRUNE_BATCH = 500
+
+def _sweep(cur: sqlite3.Cursor, root: str, seen: int, tree, commit, stop_event=None,
+           batch: int = PRUNE_BATCH) -> int:
+    """Delete rows under `root` whose last_seen predates this run's mark, `batch` at a time.
+
+    Keyset over the path PK, so memory stays at one batch whatever the root
+    size; chunks, fts postings, fts_map rows and signatures go with each
+    batch and every batch is committed (stopping midway leaves a consistent DB).
+    """
+    lo, hi = db.path_range(root)
+    n = 0
+    while not (stop_event and stop_event.is_set()):
+        rows = cur.execute("""SELECT id, path, dir_id, size, mtime FROM files
+                              WHERE path >= ? AND path < ? AND (last_seen IS NULL OR last_seen < ?)
+                              ORDER BY path LIMIT ?""", (lo, hi, seen, batch)).fetchall()
+        if not rows: break
+        fids = [r[0] for r in rows]
+        db.delete_chunks_many(cur, fids); similar.drop_many(cur, fids)
+        for _fid, _path, did, size, mtime in rows: tree.remove(did, size, mtime)
+        cur.executemany("DELETE FROM files WHERE id=?", [(f,) for f in fids])
+        commit()
+        n += len(rows); lo = rows[-1][1]
+    if n: log.debug("prune root=%s removed=%d", root, n)
+    return n
+
+
+# —— priority mode ——
+# Pass 1 only stats and upserts metadata, queueing files whose content needs
+# (re)indexing; pass 2 drains the queue by priority so the "hot set" (files
+# in the saved search scopes or modified within HOT_AGE_DAYS) is searchable
+# long before a full first index finishes.
+
+HOT_AGE_DAYS = 7
+_AGE_BUCKETS  = (86400, 7*86400, 30*86400, 365*86400)      # <1d, <7d, <30d, <1y, older
+_SIZE_BUCKETS = (64 << 10, 1 << 20, 16 << 20)               # <64K, <1M, <16M, larger
+
+def _bucket(v, edges) -> int:
+    for i, e in enumerate(edges):
+        if v < e: return i
+    return len(edges)
+
+def _priority(fp: str, size: int, mtime: int, now: int, scope_prefixes: list[str]) -> tuple[int, bool]:
+    """Lower sorts first: in-scope, then recent, then small. Returns (prio, hot)."""
+    in_scope = any(fp.startswith(p) for p in scope_prefixes)
+    age = _bucket(max(0, now - mtime), _AGE_BUCKETS)
+    hot = in_scope or (now - mtime) < HOT_AGE_DAYS * 86400
+    return ((0 if in_scope else 1) * 8 + age) * 8 + _bucket(size, _SIZE_BUCKETS), hot
+
+QUEUE_SCHEMA = """
+CREATE TEMP TABLE IF NOT EXISTS index_queue(
+  fid INTEGER PRIMARY KEY, path TEXT, prio INTEGER, hot INTEGER, size INTEGER, mtime INTEGER,
+  unchanged INTEGER, age_ok INTEGER, old_blake3 TEXT, old_hash_checked INTEGER, old_indexed INTEGER
+);
+CREATE INDEX IF NOT EXISTS temp.idx_index_queue_prio ON index_queue(prio, mtime DESC, fid);
+"""
+
+
 def index_root(
     con: sqlite3.Connection,
     root: str,
@@ -92,118 +219,213 @@ def index_root(
     reindex_days: int = 14,
     verify_hash_days: int = 7,
     force_full_hash_large: bool = False,
+    # metadata pass first, then content by priority (see HOT_AGE_DAYS)
+    prioritized: bool = False,
+    priority_scopes: list[str] | None = None,
+    # False = quick refresh: stat + metadata only, no hashing or extraction
+    content: bool = True,
+    # throttle(nbytes, commit) after every file; may commit and sleep (resource budgets, see scheduler)
+    throttle=None,
     # cancel
     stop_event: threading.Event | None = None,
 ):
-    log.debug(f"index_root root={root} prune={prune_missing} reindex_days={reindex_days} verify_days={verify_hash_days} fullhash={force_full_hash_large}")
+    log.debug("index_root root=%s prune=%s reindex_days=%s verify_days=%s fullhash=%s prioritized=%s content=%s",
+              root, prune_missing, reindex_days, verify_hash_days, force_full_hash_large, prioritized, content)
+    prioritized = prioritized and content
 
-    
     cur = con.cursor()
+    errors = ErrorAggregator(log, "index error")
     now = int(time.time())
     reindex_sec = max(0, reindex_days) * 86400
     verify_sec  = max(0, verify_hash_days) * 86400
+    content_kw = dict(now=now, verify_sec=verify_sec, max_read_bytes=max_read_bytes,
+                      force_full_hash_large=force_full_hash_large)
+
+    tree = dirtree.Rollup(cur)   # per-directory size/count/newest deltas
 
-    files_seen=0; files_indexed=0; chunks_written=0; t0=time.time()
+    def commit():
+        tree.flush(); con.commit()
+
+    files_seen=0; files_indexed=0; chunks_written=0; files_skipped=0; t0=time.time()
     cancelled = False
+    hot_total=0; hot_done=0; hot_secs=None; queued=0
+
+    def progress(**extra):
+        if progress_cb:
+            ev = {"files_seen": files_seen, "files_indexed": files_indexed,
+                  "chunks": chunks_written, "secs": round(time.time()-t0,1),
+                  "errors": errors.total}
+            if prioritized:
+                ev.update({"queued": queued, "hot_total": hot_total, "hot_done": hot_done, "hot_secs": hot_secs})
+            ev.update(extra)
+            progress_cb(ev)
 
-    existing_paths = set()
+    if prioritized:
+        cur.executescript(QUEUE_SCHEMA)
+        cur.execute("DELETE FROM temp.index_queue")
+        scope_prefixes = [os.path.join(os.path.abspath(p), "") for p in (priority_scopes or [])]
+
+    # prune = mark and sweep: every path this run accounts for gets last_seen=seen,
+    # afterwards rows under the root with an older mark are gone. `seen` must beat
+    # any earlier mark (two runs can start within the same second).
+    seen = now
     if prune_missing:
-        cur.execute("SELECT path FROM files WHERE path LIKE ? || '%'", (os.path.abspath(root),))
-        existing_paths = {r[0] for r in cur.fetchall()}
+        (prev,) = cur.execute("SELECT MAX(last_seen) FROM files WHERE path >= ? AND path < ?",
+                              db.path_range(root)).fetchone()
+        seen = max(now, (prev or 0) + 1)
+
+    def mark_tree(path: str):
+        # not visited != missing: keep everything below `path`
+        if prune_missing:
+            cur.execute("UPDATE files SET last_seen=? WHERE path >= ? AND path < ?", (seen, *db.path_range(path)))
+
+    # negative cache: paths still inside their retry backoff are not touched at all
+    skip_files, skip_dirs, known_failures = failures.for_root(cur, root, now)
+
+    def walk_error(e: OSError):
+        if e.filename:
+            mark_tree(e.filename)
+            failures.record(cur, os.path.abspath(e.filename), e, is_dir=True, now=now)
+            errors.record(os.path.join(os.path.abspath(e.filename), ""), e)
+
+    walker = os.walk(root, onerror=walk_error)
+    root_skipped = os.path.abspath(root) in skip_dirs
+    if root_skipped:
+        walker = iter(())   # the root itself is backing off
 
-    for r, dirs, fnames in os.walk(root):
+    for r, dirs, fnames in walker:
         if any(x in r for x in exclude_dirs): continue
         if stop_event and stop_event.is_set():
             cancelled = True
             break
         abased = os.path.abspath(r)
+        dir_id = None    # created on the first file that needs it
+        if skip_dirs:
+            backing_off = [d for d in dirs if os.path.join(abased, d) in skip_dirs]
+            if backing_off:
+                dirs[:] = [d for d in dirs if d not in backing_off]
+                for d in backing_off: mark_tree(os.path.join(abased, d))
+        if abased in known_failures and abased not in skip_dirs:
+            failures.clear(cur, abased)   # listable again
         for fn in fnames:
             if stop_event and stop_event.is_set():
                 cancelled = True
                 break
             fp = os.path.join(abased, fn)
+            if fp in skip_files:
+                files_skipped += 1
+                if prune_missing: cur.execute("UPDATE files SET last_seen=? WHERE path=?", (seen, fp))
+                continue
             try:
                 st = os.stat(fp, follow_symlinks=False)
                 if stat.S_ISDIR(st.st_mode): continue
 
                 row = _get_row(cur, fp)
-                unchanged_meta = bool(row and row[1] == st.st_size and row[2] == int(st.st_mtime) and row[3] == f"{st.st_ino}")
+                unchanged_meta = bool(row and row[1] == st.st_size and row[2] == int(st.st_mtime) and row[3] in (None, f"{st.st_ino}"))
                 last_indexed_at = row[6] if row else None
                 age_ok = (last_indexed_at is not None) and (reindex_sec == 0 or (now - last_indexed_at) < reindex_sec)
 
                 if unchanged_meta and age_ok:
-                    cur.execute("UPDATE files SET last_seen=?, status='ok' WHERE path=?", (now, fp))
+                    # inode is NULL for rows installed from a snapshot: adopt this machine's
+                    cur.execute("UPDATE files SET last_seen=?, status='ok', inode=COALESCE(inode,?) WHERE path=?",
+                                (seen, f"{st.st_ino}", fp))
                 else:
-                    fid = _upsert_meta(cur, fp, st)
+                    if dir_id is None: dir_id = tree.dir_id(abased)
+                    fid = _upsert_meta(cur, fp, st, dir_id, seen)
+                    tree.change(row[7] if row else None, row[1] if row else None, row[2] if row else None,
+                                dir_id, st.st_size, int(st.st_mtime))
 
                     ca = _get_created_at(st)
-                if ca is not None:
-                    cur.execute("UPDATE files SET created_at = COALESCE(created_at, ?) WHERE id=?", (ca, fid))
-
-
+                    if ca is not None:
+                        cur.execute("UPDATE files SET created_at = COALESCE(created_at, ?) WHERE id=?", (ca, fid))
 
-                    # checksum lane
-                    same_hash = False
-                    need_verify = True
-                    if row and row[5]:
-                        need_verify = (verify_sec == 0) or ((now - int(row[5])) >= verify_sec) or (not unchanged_meta)
-
-                    if need_verify:
-                        digest = _blake3_file(
-                            fp, st.st_size,
-                            sample=not force_full_hash_large,
-                        )
-                        if row and row[4] and row[4] == digest and age_ok:
-                            same_hash = True
-                        cur.execute("UPDATE files SET blake3=?, hash_checked_at=? WHERE path=?", (digest, now, fp))
+                    if not content:
+                        pass   # quick mode: _upsert_meta cleared last_indexed_at, the next full run extracts
+                    elif prioritized:
+                        prio, hot = _priority(fp, st.st_size, int(st.st_mtime), now, scope_prefixes)
+                        # last_indexed_at stays NULL in files until the content pass writes
+                        # it, so a run that stops before the queue drains leaves these dirty
+                        cur.execute("INSERT OR REPLACE INTO temp.index_queue VALUES(?,?,?,?,?,?,?,?,?,?,?)",
+                                    (fid, fp, prio, int(hot), st.st_size, int(st.st_mtime),
+                                     int(unchanged_meta), int(age_ok),
+                                     row[4] if row else None, row[5] if row else None, last_indexed_at))
+                        queued += 1; hot_total += hot
                     else:
-                        if row and row[4] and age_ok:
-                            same_hash = True
+                        chunks_written += _index_content(
+                            cur, fp, fid, st.st_size, row[4] if row else None, row[5] if row else None,
+                            unchanged_meta, age_ok, old_indexed=last_indexed_at, **content_kw)
+                        files_indexed += 1
+                        if throttle: throttle(st.st_size, commit)
 
-                    if same_hash and age_ok:
-                        pass  # metadata already updated above
-                    else:
-                        if extract.is_textable(fp):
-                            text = extract.read_text(fp, max_read_bytes)
-                            if text:
-                                cur.execute("DELETE FROM chunks WHERE file_id=?", (fid,))
-                                ord_ = -1
-                                for ord_, seg, b0, b1 in extract.chunk(text):
-                                    cur.execute("INSERT INTO chunks(file_id,ord,text,bytes_from,bytes_to) VALUES(?,?,?,?,?)",
-                                                (fid, ord_, seg, b0, b1))
-                                    cur.execute("INSERT INTO fts(rowid,text) VALUES(NULL,?)", (seg,))
-                                    rid = cur.lastrowid
-                                    cur.execute("SELECT id FROM chunks WHERE file_id=? AND ord=?", (fid, ord_))
-                                    cid = cur.fetchone()[0]
-                                    cur.execute("INSERT OR REPLACE INTO fts_map(rowid,chunk_id) VALUES(?,?)", (rid, cid))
-                                chunks_written += (ord_ + 1) if ord_ >= 0 else 0
-                        cur.execute("UPDATE files SET last_indexed_at=? WHERE path=?", (now, fp))
-                    files_indexed += 1
+                if fp in known_failures:
+                    failures.clear(cur, fp)
 
                 files_seen += 1
-                if prune_missing and fp in existing_paths:
-                    existing_paths.remove(fp)
+                if throttle and files_seen % 64 == 0: throttle(0, commit)
 
                 if files_seen % batch == 0:
-                    con.commit()
-                    if progress_cb:
-                        progress_cb({"files_seen": files_seen, "files_indexed": files_indexed,
-                                     "chunks": chunks_written, "secs": round(time.time()-t0,1)})
-            except Exception:
-                cur.execute("INSERT OR IGNORE INTO files(path,status,last_seen) VALUES(?,?,?)", (fp, "error", now))
-                log.debug(f"index error path={fp}", exc_info=True)
+                    commit()
+                    progress(**({"phase": "meta"} if prioritized else {}))
+            except Exception as e:
+                # an unreadable file is still present: mark it so the sweep keeps it
+                cur.execute("""INSERT INTO files(path,status,last_seen) VALUES(?,?,?)
+                               ON CONFLICT(path) DO UPDATE SET last_seen=excluded.last_seen""", (fp, "error", seen))
+                failures.record(cur, fp, e, now=now)
+                errors.record(fp, e)
                 continue
         if cancelled: break
 
-    if prune_missing and existing_paths:
-        ph = ",".join("?"*len(existing_paths))
-        cur.execute(f"DELETE FROM files WHERE path IN ({ph})", tuple(existing_paths))
+    pruned = 0
+    if prune_missing and not cancelled and not root_skipped:
+        # a cancelled walk never sweeps: unvisited is not the same as missing
+        commit()
+        pruned = _sweep(cur, root, seen, tree, commit, stop_event)
+        if pruned: progress(phase="prune", pruned=pruned)
 
-    con.commit()
-    log.debug(f"index_root done files_seen={files_seen} files_indexed={files_indexed} chunks={chunks_written}")
-    if progress_cb:
-        progress_cb({"files_seen": files_seen, "files_indexed": files_indexed,
-                     "chunks": chunks_written, "secs": round(time.time()-t0,1),
-                     "done": True, "cancelled": cancelled})
-    return {"files_seen": files_seen, "files_indexed": files_indexed,
-            "chunks": chunks_written, "cancelled": cancelled}
+    if prioritized and not cancelled:
+        commit()
+        if hot_total == 0: hot_secs = round(time.time()-t0, 1)
+        progress(phase="content")
+        last = (-1, 0, 0)   # keyset over (prio, -mtime, fid)
+        while not cancelled:
+            page = cur.execute(
+                """SELECT prio, mtime, fid, path, hot, unchanged, age_ok, old_blake3, old_hash_checked, old_indexed
+                   FROM temp.index_queue WHERE (prio, -mtime, fid) > (?, ?, ?)
+                   ORDER BY prio, mtime DESC, fid LIMIT ?""", (*last, batch)).fetchall()
+            if not page: break
+            for prio, mtime, fid, fp, hot, unchanged, age_ok, old_b3, old_hc, old_ix in page:
+                last = (prio, -mtime, fid)
+                if stop_event and stop_event.is_set():
+                    cancelled = True
+                    break
+                try:
+                    st = os.stat(fp, follow_symlinks=False)
+                    chunks_written += _index_content(cur, fp, fid, st.st_size, old_b3, old_hc,
+                                                     bool(unchanged), bool(age_ok), old_indexed=old_ix, **content_kw)
+                    files_indexed += 1
+                    if throttle: throttle(st.st_size, commit)
+                except Exception as e:
+                    failures.record(cur, fp, e, now=now)
+                    errors.record(fp, e)
+                if hot:
+                    hot_done += 1
+                    if hot_done == hot_total:
+                        hot_secs = round(time.time()-t0, 1)
+            con.commit()
+            progress(phase="content")
+        cur.execute("DELETE FROM temp.index_queue")
+
+    commit()
+    if not cancelled and content:
+        # files indexed before signatures existed (or by older builds)
+        similar.backfill(con, db.path_range(root), stop_event=stop_event)
+    errors.log_summary()
+    log.debug("index_root done files_seen=%d files_indexed=%d chunks=%d errors=%d skipped=%d hot_secs=%s",
+              files_seen, files_indexed, chunks_written, errors.total, files_skipped, hot_secs)
+    progress(skipped=files_skipped, done=True, cancelled=cancelled)
+    res = {"files_seen": files_seen, "files_indexed": files_indexed,
+           "chunks": chunks_written, "errors": errors.total, "skipped": files_skipped,
+           "pruned": pruned, "cancelled": cancelled}
+    if prioritized:
+        res.update({"queued": queued, "hot_total": hot_total, "hot_secs": hot_secs})
+    return res
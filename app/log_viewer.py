@@ -1,8 +1,48 @@
 # app/log_viewer.py
-import os, re, time, tkinter as tk, tkinter.scrolledtext as sc
+import os, re, collections, tkinter as tk, tkinter.scrolledtext as sc
 from tkinter import messagebox
 from .logging_conf import log_path
 
+TAIL_BYTES   = 256_000      # initial window read from the end of the live log
+TICK_BYTES   = 1_000_000    # max new bytes consumed per follow tick
+MAX_LINES    = 5_000        # ring of raw lines kept in memory / shown in the widget
+PAGE_LINES   = 2_000        # "Load older" page size
+BACKUP_COUNT = 3            # matches RotatingFileHandler(backupCount=3) in logging_conf
+
+
+def _file_id(st):
+    return (st.st_dev, st.st_ino)
+
+def _decode(data: bytes, start: int = 0) -> tuple[list[str], list[int]]:
+    # `data` ends at a newline boundary and begins at file offset `start`;
+    # one str per line plus the offset each line starts at
+    parts = data.split(b"\n")
+    if parts and parts[-1] == b"": parts.pop()
+    offs, pos = [], start
+    for p in parts:
+        offs.append(pos); pos += len(p) + 1
+    return [p.rstrip(b"\r").decode("utf-8", errors="replace") for p in parts], offs
+
+def _read_back(path: str, end: int, max_lines: int, block: int = 64_000,
+               max_bytes: int = 4_000_000) -> tuple[list[str], list[int], int]:
+    """Up to `max_lines` complete lines ending at byte `end`; returns (lines, line offsets, start offset)."""
+    with open(path, "rb") as f:
+        pos, buf = end, b""
+        while pos > 0 and buf.count(b"\n") <= max_lines and len(buf) < max_bytes:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos); buf = f.read(step) + buf
+    if pos > 0:
+        # drop the partial first line; it belongs to the next page
+        cut = buf.find(b"\n") + 1
+        pos += cut; buf = buf[cut:]
+    lines, offs = _decode(buf, pos)
+    if len(lines) > max_lines:
+        lines, offs = lines[-max_lines:], offs[-max_lines:]
+        pos = offs[0]
+    return lines, offs, pos
+
+
 class LogViewer(tk.Toplevel):
     def __init__(self, master):
         super().__init__(master)
@@ -13,7 +53,17 @@ class LogViewer(tk.Toplevel):
         self.case = tk.BooleanVar(value=True)
         self.filter_var = tk.StringVar()
         self.status = tk.StringVar(value=self.path)
-        self._mtime = 0
+        self._lines: collections.deque[str] = collections.deque(maxlen=MAX_LINES)
+        self._pos: collections.deque = collections.deque(maxlen=MAX_LINES)  # (file id, offset) per line, None for markers
+        self._offset = 0            # bytes of the live file already consumed
+        self._fid = None            # (dev, ino) of the live file at _offset
+        self._partial = b""         # trailing bytes without a newline yet
+        self._partial_at = None     # (file id, offset) of the first byte of _partial
+        self._older = None          # (file id, byte offset) where the loaded history starts
+        self._shown = 0             # lines currently in the widget
+        self._match = None
+        self._after = None
+        self._filter_after = None
         self._build()
         self.refresh()
 
@@ -21,11 +71,12 @@ class LogViewer(tk.Toplevel):
         bar = tk.Frame(self); bar.pack(fill="x", padx=8, pady=6)
         tk.Label(bar, text="Filter").pack(side="left")
         ent = tk.Entry(bar, textvariable=self.filter_var, width=40); ent.pack(side="left", padx=(4,8))
-        ent.bind("<Return>", lambda _e: self.refresh())
-        tk.Checkbutton(bar, text="Regex", variable=self.regex).pack(side="left")
-        tk.Checkbutton(bar, text="Ignore case", variable=self.case).pack(side="left", padx=(6,8))
-        tk.Button(bar, text="Apply", command=self.refresh).pack(side="left")
+        ent.bind("<Return>", lambda _e: self.apply_filter())
+        tk.Checkbutton(bar, text="Regex", variable=self.regex, command=self.apply_filter).pack(side="left")
+        tk.Checkbutton(bar, text="Ignore case", variable=self.case, command=self.apply_filter).pack(side="left", padx=(6,8))
+        tk.Button(bar, text="Apply", command=self.apply_filter).pack(side="left")
         tk.Button(bar, text="Refresh", command=self.refresh).pack(side="left", padx=(6,0))
+        tk.Button(bar, text="Load older", command=self.load_older).pack(side="left", padx=(6,0))
         tk.Checkbutton(bar, text="Follow", variable=self.follow, command=self._schedule).pack(side="left", padx=(12,0))
         tk.Button(bar, text="Open file…", command=lambda: messagebox.showinfo("Log file", self.path)).pack(side="right")
 
@@ -34,61 +85,193 @@ class LogViewer(tk.Toplevel):
         self.text.configure(state="disabled")
         tk.Label(self, textvariable=self.status, anchor="w").pack(fill="x", padx=8, pady=(0,6))
 
-        self.filter_var.trace_add("write", lambda *_: self._schedule(delay=0.3))
-
-    def _read(self, max_bytes=2_000_000):
-        try:
-            size = os.path.getsize(self.path)
-            with open(self.path, "rb") as f:
-                if size > max_bytes:
-                    f.seek(-max_bytes, os.SEEK_END)
-                data = f.read()
-            return data.decode("utf-8", errors="replace").splitlines()
-        except Exception as e:
-            return [f"[log open error: {e}]"]
+        self.filter_var.trace_add("write", lambda *_: self._debounce_filter())
 
-    def _filter_lines(self, lines):
+    # —— filtering ——
+    def _matcher(self):
+        """Predicate for the current filter (None = show everything)."""
         pat = self.filter_var.get().strip()
         if not pat:
-            return lines
+            return None
         if self.regex.get():
             flags = re.IGNORECASE if self.case.get() else 0
             try:
-                rx = re.compile(pat, flags)
+                return re.compile(pat, flags).search
             except re.error as e:
                 self.status.set(f"Invalid regex: {e}")
-                return lines
-            return [ln for ln in lines if rx.search(ln)]
-        else:
-            needle = pat.lower() if self.case.get() else pat
-            out = []
-            if self.case.get():
-                for ln in lines:
-                    if needle in ln.lower(): out.append(ln)
-            else:
-                for ln in lines:
-                    if needle in ln: out.append(ln)
-            return out
+                return None
+        if self.case.get():
+            needle = pat.lower()
+            return lambda ln: needle in ln.lower()
+        return lambda ln: pat in ln
 
-    def refresh(self):
-        try: self._mtime = os.path.getmtime(self.path)
-        except Exception: self._mtime = 0
-        lines = self._filter_lines(self._read())
-        text = "\n".join(lines)
-        self.text.configure(state="normal"); self.text.delete("1.0", "end"); self.text.insert("1.0", text)
+    def _filter_lines(self, lines):
+        return list(lines) if self._match is None else [ln for ln in lines if self._match(ln)]
+
+    def _debounce_filter(self):
+        if self._filter_after:
+            self.after_cancel(self._filter_after)
+        self._filter_after = self.after(300, self.apply_filter)
+
+    def apply_filter(self):
+        """Re-filter the bounded in-memory ring (never re-reads the file)."""
+        self._filter_after = None
+        self._match = self._matcher()
+        self._render(self._filter_lines(self._lines))
+
+    # —— widget ——
+    def _render(self, lines):
+        self.text.configure(state="normal"); self.text.delete("1.0", "end")
+        if lines: self.text.insert("1.0", "\n".join(lines))
         self.text.configure(state="disabled"); self.text.see("end")
-        self.status.set(f"{self.path} — {len(lines)} lines shown")
+        self._shown = len(lines)
+        self._status()
+
+    def _append(self, lines):
+        if not lines: return
+        at_end = self.text.yview()[1] >= 0.999
+        self.text.configure(state="normal")
+        self.text.insert("end", ("\n" if self._shown else "") + "\n".join(lines))
+        self._shown += len(lines)
+        excess = self._shown - self._lines.maxlen
+        if excess > 0:
+            self.text.delete("1.0", f"{excess + 1}.0")
+            self._shown -= excess
+        self.text.configure(state="disabled")
+        if at_end: self.text.see("end")
+
+    def _prepend(self, lines):
+        if not lines: return
+        self.text.configure(state="normal")
+        self.text.insert("1.0", "\n".join(lines) + ("\n" if self._shown else ""))
+        self.text.configure(state="disabled")
+        self._shown += len(lines)
+
+    def _status(self, extra=""):
+        self.status.set(f"{self.path} — {self._shown} lines shown ({len(self._lines)} buffered){extra}")
+
+    # —— reading ——
+    def refresh(self):
+        """Reload the tail of the live log and reset the ring."""
+        self._lines = collections.deque(maxlen=MAX_LINES)
+        self._pos = collections.deque(maxlen=MAX_LINES)
+        self._partial = b""
+        try:
+            st = os.stat(self.path)
+            lines, offs, start = _read_back(self.path, st.st_size, MAX_LINES, block=TAIL_BYTES)
+            self._offset, self._fid = st.st_size, _file_id(st)
+            self._lines.extend(lines); self._pos.extend((self._fid, o) for o in offs)
+            self._older = (self._fid, start)
+        except OSError as e:
+            self._lines.append(f"[log open error: {e}]"); self._pos.append(None)
+            self._offset, self._fid, self._older = 0, None, None
+        self.apply_filter()
         self._schedule()
 
+    def _read_new(self) -> list[tuple]:
+        """[(position, line)] appended since the last tick, following RotatingFileHandler rollovers.
+
+        After a rollover the old file (found again by its id among the backups)
+        is drained first, TICK_BYTES per tick, before the new file is started.
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return []
+        chunks, budget, lost = [], TICK_BYTES, False
+        if self._fid is not None and (_file_id(st) != self._fid or st.st_size < self._offset):
+            old = self._locate(self._fid)
+            if old and old != self.path:
+                with open(old, "rb") as f:
+                    f.seek(self._offset); data = f.read(budget)
+                chunks.append((self._fid, self._offset, data))
+                self._offset += len(data); budget -= len(data)
+                if budget <= 0:
+                    return self._split(chunks)    # keep draining the old file next tick
+            elif old is None:
+                lost = True                       # rotated past the last backup before we got to it
+            self._offset = 0
+        self._fid = _file_id(st)
+        if st.st_size > self._offset and budget > 0:
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read(min(budget, st.st_size - self._offset))
+            chunks.append((self._fid, self._offset, data))
+            self._offset += len(data)
+        lines = self._split(chunks)
+        return ([(None, "[log rotated away before it was read to the end; some lines are missing]")] + lines
+                if lost else lines)
+
+    def _split(self, chunks) -> list[tuple]:
+        """[(fid, offset, bytes)] -> [((fid, line offset), line)] for every completed line."""
+        out = []
+        for fid, off, data in chunks:
+            if not data: continue
+            if self._partial and self._partial_at[0] != fid:
+                # rollover happens between records: a leftover from the old file is a line of its own
+                out += zip([self._partial_at], _decode(self._partial + b"\n")[0]); self._partial = b""
+            if not self._partial: self._partial_at = (fid, off)
+            buf = self._partial + data
+            cut = buf.rfind(b"\n") + 1
+            lines, offs = _decode(buf[:cut], self._partial_at[1])
+            out += zip(((fid, o) for o in offs), lines)
+            self._partial = buf[cut:]; self._partial_at = (fid, self._partial_at[1] + cut)
+        return out
+
+    def _locate(self, fid):
+        for p in [self.path] + [f"{self.path}.{i}" for i in range(1, BACKUP_COUNT + 1)]:
+            try:
+                if _file_id(os.stat(p)) == fid: return p
+            except OSError:
+                continue
+        return None
+
+    def load_older(self):
+        """Page PAGE_LINES older lines in from the live file and then the rotated backups."""
+        if not self._older:
+            return
+        fid, end = self._older
+        path = self._locate(fid)
+        if path is None:
+            self._status(" — older history rotated away"); self._older = None; return
+        if end <= 0:
+            # continue in the next older backup (sfm.log -> .1 -> .2 ...)
+            chain = [self.path] + [f"{self.path}.{i}" for i in range(1, BACKUP_COUNT + 1)]
+            i = chain.index(path) + 1 if path in chain else len(chain)
+            if i >= len(chain) or not os.path.exists(chain[i]):
+                self._status(" — no older history"); self._older = None; return
+            path = chain[i]
+            st = os.stat(path); fid, end = _file_id(st), st.st_size
+        lines, offs, start = _read_back(path, end, PAGE_LINES)
+        self._older = (fid, start)
+        # grow the ring so the page we just loaded is not trimmed straight away;
+        # _tick shrinks it back to MAX_LINES once new lines arrive
+        n = self._lines.maxlen + len(lines)
+        self._lines = collections.deque(lines + list(self._lines), maxlen=n)
+        self._pos = collections.deque([(fid, o) for o in offs] + list(self._pos), maxlen=n)
+        self._prepend(self._filter_lines(lines))
+        self._status(f" — loaded {len(lines)} older lines from {os.path.basename(path)}")
+
     def _tick(self):
+        self._after = None
         if not self.follow.get(): return
-        try: m = os.path.getmtime(self.path)
-        except Exception: m = 0
-        if m != self._mtime:
-            self.refresh()
-        else:
-            self._schedule()
+        new = self._read_new()
+        if new:
+            pos, new = zip(*new)
+            if self._lines.maxlen > MAX_LINES:     # drop paged-in history beyond the normal bound
+                self._lines = collections.deque(self._lines, maxlen=MAX_LINES)
+                self._pos = collections.deque(self._pos, maxlen=MAX_LINES)
+            evicted = len(self._lines) + len(new) > self._lines.maxlen
+            self._lines.extend(new); self._pos.extend(pos)
+            if evicted and self._older:
+                # "Load older" continues right before the oldest line still buffered
+                self._older = next((p for p in self._pos if p), self._older)
+            self._append(self._filter_lines(new))
+            self._status()
+        self._schedule()
 
     def _schedule(self, delay=1.0):
+        if self._after:
+            self.after_cancel(self._after); self._after = None
         if self.follow.get():
-            self.after(int(delay*1000), self._tick)
+            self._after = self.after(int(delay*1000), self._tick)
@@ -1,6 +1,6 @@
 # app/logging_conf.py
-import logging, os, pathlib
-from logging.handlers import RotatingFileHandler
+import logging, os, pathlib, queue, atexit, collections, threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 def _data_dir():
     import platform
@@ -15,11 +15,25 @@ def _data_dir():
     return os.path.join(base, "logs", "sfm.log")
 
 
+class _DeferredQueueHandler(QueueHandler):
+    """Enqueue without formatting: message args are merged (cheap) but the
+    traceback text is rendered by the listener thread, not the caller."""
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
 _logger = None
+_listener: QueueListener | None = None
 
 def get_logger(name="SFM", level=logging.WARNING):
-    """Singleton base logger; returns a child logger."""
-    global _logger
+    """Singleton base logger; returns a child logger.
+
+    Records go through a queue; file/stream I/O happens on a listener thread.
+    """
+    global _logger, _listener
     if _logger is None:
         log_path = _data_dir()
         fmt = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
@@ -29,12 +43,64 @@ def get_logger(name="SFM", level=logging.WARNING):
         fh.setFormatter(fmt); fh.setLevel(level)
         sh = logging.StreamHandler()
         sh.setFormatter(fmt); sh.setLevel(level)
-        root.addHandler(fh); root.addHandler(sh)
+        q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        root.addHandler(_DeferredQueueHandler(q))
+        _listener = QueueListener(q, fh, sh, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown)
         _logger = root
     # update levels on toggle
     _logger.setLevel(level)
-    for h in _logger.handlers: h.setLevel(level)
+    for h in (_listener.handlers if _listener else _logger.handlers): h.setLevel(level)
     return _logger.getChild(name)
 
+def shutdown():
+    """Flush queued records and stop the listener thread (registered atexit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 def log_path():
     return _data_dir()
+
+
+class ErrorAggregator:
+    """Per-run error accounting for hot loops.
+
+    Counts failures per exception type and per directory, logs a traceback
+    only for the first `samples` failures of each type and emits one summary
+    line at the end instead of one traceback per file.
+    """
+
+    def __init__(self, log: logging.Logger, what: str = "error", samples: int = 3, top: int = 5):
+        self.log = log
+        self.what = what
+        self.samples = samples
+        self.top = top
+        self.total = 0
+        self.by_type: collections.Counter = collections.Counter()
+        self.by_dir: collections.Counter = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, path: str, exc: BaseException) -> None:
+        kind = type(exc).__name__
+        with self._lock:
+            self.total += 1
+            self.by_type[kind] += 1
+            self.by_dir[os.path.dirname(path)] += 1
+            n = self.by_type[kind]
+        if n <= self.samples and self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("%s path=%s (%s sample %d/%d)", self.what, path, kind, n, self.samples,
+                           exc_info=(type(exc), exc, exc.__traceback__))
+
+    def summary(self) -> dict:
+        return {"total": self.total,
+                "by_type": dict(self.by_type.most_common(self.top)),
+                "by_dir": dict(self.by_dir.most_common(self.top))}
+
+    def log_summary(self, level: int = logging.WARNING) -> None:
+        if not self.total: return
+        s = self.summary()
+        self.log.log(level, "%s summary: %d total; by type %s; top dirs %s",
+                     self.what, s["total"], s["by_type"], s["by_dir"])
@@ -4,44 +4,41 @@ from tkinter import filedialog, messagebox
 import logging
 from .logging_conf import get_logger, log_path
 import re, time
-from . import db, indexer, searcher
+from . import db, indexer, searcher, shards, platform_paths, failures, preview, maintenance, scheduler, config, snapshot, facets, dirtree
 from .log_viewer import LogViewer
 import platform
 
-def _get_app_data_path():
-    """Get platform-appropriate application data directory."""
-    system = platform.system()
-    if system == "Darwin":
-        return os.path.expanduser("~/Library/Application Support/SuperFileManager")
-    elif system == "Windows":
-        appdata = os.environ.get('LOCALAPPDATA') or os.environ.get('APPDATA')
-        return os.path.join(appdata, "SuperFileManager")
-    else:  # Linux/Unix
-        return os.path.expanduser("~/.local/share/SuperFileManager")
-
 # Module constants
 IS_MAC = platform.system() == "Darwin"
 IS_WINDOWS = platform.system() == "Windows"
 CREATED_SUPPORTED = IS_MAC or IS_WINDOWS
-APP_DATA_DIR = _get_app_data_path()
-DB_PATH = os.path.join(APP_DATA_DIR, "state.sqlite")
+APP_DATA_DIR = platform_paths.APP_DATA_DIR
+DB_PATH = platform_paths.DB_PATH
+
+def excludes() -> list[str]:
+    # one list for manual runs, the scheduler and scripts: config scan.exclude_dir
+    return config.load()["scan"]["exclude_dir"]
 
-EXCLUDES = [".git","node_modules","dist","build","__pycache__",
-            "/proc","/sys","/dev","/Volumes",
-            "C:\\Windows","C:\\Program Files","C:\\ProgramData"]
+MAINT_TICK_MS  = 5 * 60 * 1000   # how often to check whether maintenance is due
+MAINT_IDLE_SEC = 120             # ...and only after this long without a search
 
 class App(tk.Tk):
     def __init__(self):
+        self._t0 = time.perf_counter()
+        self.startup_timings: dict[str, float] = {}
         super().__init__()
         self.title("SuperFileManager"); self.geometry("1100x680")
+        self._mark("tk")
         self.db_path = DB_PATH
         self.con: sqlite3.Connection = db.connect(self.db_path); db.init(self.con)
+        self.migrate_error: Exception | None = None
         try:
-            db.migrate(self.con)
-            if hasattr(db, "normalize_time_units"):
-                db.normalize_time_units(self.con)
-        except Exception:
-            pass
+            db.migrate(self.con)   # no-op unless user_version is behind
+        except Exception as e:
+            # keep going on the partly upgraded DB (each step commits), but say so
+            self.migrate_error = e; self.con.rollback()
+            get_logger("GUI").error("database upgrade failed at schema v%d", db.schema_version(self.con), exc_info=True)
+        self._mark("db")
 
 
         self.work_q: "queue.Queue[tuple[str,dict]]" = queue.Queue()
@@ -51,15 +48,47 @@ class App(tk.Tk):
         # load search scopes from settings
         self.scopes = db.get_setting(self.con, "search_scopes", [])
 
+        # index shards (single main DB unless configured otherwise)
+        self.shards = shards.ShardSet.from_settings(self.con, self.db_path)
+        try: self.shards.init_all()
+        except Exception: pass
+        self._mark("settings+shards")
+
         # debug logging setting
         self.debug_var = tk.BooleanVar(value=db.get_setting(self.con, "debug_logging", False))
         self.log = get_logger("GUI", level=(logging.DEBUG if self.debug_var.get() else logging.WARNING))
 
 
         self._build()
+        self._mark("build")
         self.after(150, self._poll)
-        self.after(0, self.update_stats)  # run after widgets exist
-
+        self.after_idle(self._first_paint)
+        self._last_activity = time.monotonic()
+        self._maint_running = False
+        self.after(MAINT_TICK_MS, self._maint_tick)
+
+        # background indexing of registered roots (config resources.auto)
+        self.scheduler = scheduler.Scheduler(
+            self.db_path, on_event=lambda ev: self.work_q.put(("sched", ev)),
+            busy=lambda: bool(self.worker and self.worker.is_alive()) or self._maint_running)
+        if config.load()["resources"].get("auto", True):
+            self.scheduler.start()
+
+    def _mark(self, name: str):
+        self.startup_timings[name] = round(time.perf_counter() - self._t0, 4)
+
+    def _first_paint(self):
+        self.update_idletasks()
+        self._mark("first_paint")
+        steps = ", ".join(f"{k}={v*1000:.0f}ms" for k, v in self.startup_timings.items())
+        self.log.info("startup %s", steps)
+        self.status.config(text=f"Ready (started in {self.startup_timings['first_paint']:.2f}s)")
+        if self.migrate_error is not None:
+            self.status.config(text=f"Database upgrade failed: {self.migrate_error} (see log)")
+            messagebox.showerror("Database upgrade failed",
+                                 f"{type(self.migrate_error).__name__}: {self.migrate_error}\n\n"
+                                 f"Some features may not work until it succeeds. Details are in\n{log_path()}")
+        self.update_stats()   # counts run off the Tk thread, see _poll("stats")
 
     def _toggle_logging(self):
         import logging as _lg
@@ -67,6 +96,20 @@ class App(tk.Tk):
         level = _lg.DEBUG if self.debug_var.get() else _lg.WARNING
         self.log = get_logger("GUI", level=level)
 
+    def _set_shard_mode(self, mode):
+        # rows are not migrated between layouts, and paths() of the new layout would
+        # not include the old files: only an empty index may change its layout
+        if mode == self.shards.mode: return
+        if self.shards.has_files():
+            self.shard_mode_var.set(self.shards.mode)
+            messagebox.showwarning("Shard mode", f"The index already holds files in '{self.shards.mode}' layout.\n"
+                                   "Files are not moved between layouts, so switching needs an empty index.")
+            return
+        db.set_setting(self.con, "shard_mode", mode)
+        self.shards.close()
+        self.shards = shards.ShardSet.from_settings(self.con, self.db_path)
+        self.update_stats()
+
     def open_log_viewer(self):
         from .log_viewer import LogViewer
         LogViewer(self)
@@ -97,8 +140,16 @@ class App(tk.Tk):
         tk.Checkbutton(knobs, text="Prune missing", variable=self.prune_var).pack(side="left", padx=6)
         self.fullhash_var = tk.BooleanVar(value=False)
         tk.Checkbutton(knobs, text="Full-hash large files", variable=self.fullhash_var).pack(side="left", padx=6)
+        self.prioritized_var = tk.BooleanVar(value=db.get_setting(self.con, "index_prioritized", True))
+        tk.Checkbutton(knobs, text="Recent/in-scope first", variable=self.prioritized_var,
+                       command=lambda: db.set_setting(self.con, "index_prioritized", bool(self.prioritized_var.get()))
+                       ).pack(side="left", padx=6)
 
         tk.Checkbutton(knobs, text="Debug logging", variable=self.debug_var, command=self._toggle_logging).pack(side="left", padx=6) 
+
+        tk.Label(knobs, text="Shards").pack(side="left", padx=(12,2))
+        self.shard_mode_var = tk.StringVar(value=self.shards.mode)
+        tk.OptionMenu(knobs, self.shard_mode_var, *shards.MODES, command=self._set_shard_mode).pack(side="left")
  
   
         # search row + regex builder
@@ -108,6 +159,10 @@ class App(tk.Tk):
         e.bind("<Return>", lambda _e: self.search())
         tk.Button(mid, text="Search", command=self.search).pack(side="left")
         tk.Button(mid, text="Clear", command=self.clear_results).pack(side="left", padx=(6,0))
+        self.more_btn = tk.Button(mid, text="More…", command=self.load_more_recent, state="disabled")
+        self.more_btn.pack(side="left", padx=(6,0))
+        self._recent_args = None; self._recent_cursor = None
+        self.results: list[tuple] = []   # (path, chunk ord or None) per listbox row
         self.auto_clear_var = tk.BooleanVar(value=db.get_setting(self.con, "auto_clear", True))
         tk.Checkbutton(mid, text="Auto-clear", variable=self.auto_clear_var).pack(side="left", padx=(8,0))
         self.auto_clear_var.trace_add(
@@ -115,10 +170,20 @@ class App(tk.Tk):
         )
         self.regex_var = tk.BooleanVar()
         tk.Checkbutton(mid, text="Regex", variable=self.regex_var).pack(side="left", padx=(8,0))
+        self.collapse_var = tk.BooleanVar(value=db.get_setting(self.con, "collapse_dups", False))
+        tk.Checkbutton(mid, text="Collapse near-dups", variable=self.collapse_var).pack(side="left", padx=(8,0))
+        self.collapse_var.trace_add(
+            "write", lambda *_: db.set_setting(self.con, "collapse_dups", bool(self.collapse_var.get()))
+        )
         tk.Button(mid, text="Regex Builder…", command=self.open_regex_builder).pack(side="left", padx=6)
 
         # log viewer
         tk.Button(mid, text="Log Viewer…", command=self.open_log_viewer).pack(side="left", padx=(6,0))
+        tk.Button(mid, text="Failures…", command=self.open_failures).pack(side="left", padx=(6,0))
+        tk.Button(mid, text="Maintenance…", command=self.open_maintenance).pack(side="left", padx=(6,0))
+        tk.Button(mid, text="Roots…", command=self.open_roots).pack(side="left", padx=(6,0))
+        tk.Button(mid, text="Snapshot…", command=self.open_snapshot).pack(side="left", padx=(6,0))
+        tk.Button(mid, text="Browse…", command=self.open_browser).pack(side="left", padx=(6,0))
 
         # time filter row
         trow = tk.Frame(self); trow.pack(fill="x", padx=8, pady=(4,0))
@@ -144,6 +209,16 @@ class App(tk.Tk):
         self.fallback_var = tk.StringVar(value="")
         tk.Label(trow, textvariable=self.fallback_var, fg="orange").pack(side="left", padx=12)
 
+        # facet filters; menus are refilled with counts after every search
+        frow = tk.Frame(self); frow.pack(fill="x", padx=8, pady=(4,0))
+        self.facet_sel: dict = {f: None for f in facets.FIELDS}
+        self.facet_titles = dict(zip(facets.FIELDS, ("Type", "MIME", "Size")))
+        self.facet_vars, self.facet_menus = {}, {}
+        for f, title in self.facet_titles.items():
+            v = self.facet_vars[f] = tk.StringVar(value=f"{title}: All")
+            self.facet_menus[f] = tk.OptionMenu(frow, v, "")
+            self.facet_menus[f].pack(side="left", padx=(0,6))
+
         # scope selector
         scope = tk.Frame(self); scope.pack(fill="x", padx=8, pady=(8,4))
         tk.Label(scope, text="Search scope (directories, recursive):").pack(side="left")
@@ -163,16 +238,31 @@ class App(tk.Tk):
 
         # results + preview
         self.status = tk.Label(self, text="Ready"); self.status.pack(fill="x", padx=8)
+        self.sched_var = tk.StringVar(value="")
+        tk.Label(self, textvariable=self.sched_var, anchor="w", fg="#555").pack(fill="x", padx=8)
         self.split = tk.PanedWindow(self, orient="horizontal"); self.split.pack(fill="both", expand=True, padx=8, pady=6)
         self.listbox = tk.Listbox(self.split, width=60); self.listbox.bind("<<ListboxSelect>>", self.show_preview)
-        self.preview = sc.ScrolledText(self.split, wrap="word")
-        self.split.add(self.listbox); self.split.add(self.preview)
+        right = tk.Frame(self.split)
+        nav = tk.Frame(right); nav.pack(fill="x")
+        tk.Button(nav, text="◀ Prev", command=lambda: self._step_match(-1)).pack(side="left")
+        tk.Button(nav, text="Next ▶", command=lambda: self._step_match(1)).pack(side="left", padx=(4,0))
+        self.source_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(nav, text="Source", variable=self.source_var, command=self._render_preview).pack(side="left", padx=(8,0))
+        tk.Button(nav, text="Find similar", command=self.find_similar).pack(side="left", padx=(8,0))
+        self.match_var = tk.StringVar(value="")
+        tk.Label(nav, textvariable=self.match_var, anchor="w").pack(side="left", padx=(8,0))
+        self.preview = sc.ScrolledText(right, wrap="word"); self.preview.pack(fill="both", expand=True)
+        self.preview.tag_configure("hit", background="#ffe066")
+        self.preview.tag_configure("cur", background="#ff9f1c")
+        self._pv = None; self._pv_head = ""
+        self.split.add(self.listbox); self.split.add(right)
 
         self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def clear_results(self):
         self.q_var.set("")
-        self.listbox.delete(0, tk.END)
+        self.listbox.delete(0, tk.END); self.results = []
+        self._recent_cursor = None; self.more_btn.config(state="disabled")
         self.preview.delete("1.0", tk.END)
         if hasattr(self, "fallback_var"): self.fallback_var.set("")
         self.status.config(text="Ready")
@@ -230,6 +320,10 @@ class App(tk.Tk):
     def index_threaded(self):
         if self.worker and self.worker.is_alive():
             messagebox.showinfo("Index", "Index already running"); return
+        if self.scheduler.current or self._maint_running:
+            # a scheduled run or maintenance may be writing the same shard
+            busy = f"Scheduled index running on {self.scheduler.current[0]}" if self.scheduler.current else "Maintenance running"
+            messagebox.showinfo("Index", f"{busy}; try again when it finishes"); return
         root = self.root_var.get().strip()
         if not root or not os.path.isdir(root):
             messagebox.showerror("Error", "Invalid directory"); return
@@ -237,28 +331,32 @@ class App(tk.Tk):
         self._lock_ui(True)
         self.status.config(text=f"Indexing {root} …")
         self.stop_evt = threading.Event()
+        shard_path = self.shards.register_root(self.con, root)
+        prioritized, scopes = bool(self.prioritized_var.get()), list(self.scopes)
 
         def progress(ev: dict): self.work_q.put(("progress", ev))
 
         def job():
             try:
-                wcon = db.connect(self.db_path, check_same_thread=False); db.init(wcon)
-                try: db.migrate(wcon)
-                except Exception: pass
+                wcon = self.shards.connect(shard_path, check_same_thread=False)
                 indexer.index_root(
-                    wcon, root, EXCLUDES,
+                    wcon, root, excludes(),
                     progress_cb=progress, batch=200,
                     prune_missing=self.prune_var.get(),
                     reindex_days=int(self.reindex_days.get()),
                     verify_hash_days=int(self.verify_days.get()),
                     force_full_hash_large=bool(self.fullhash_var.get()),
+                    prioritized=prioritized, priority_scopes=scopes,
                     stop_event=self.stop_evt
                 )
                 wcon.close()
             finally:
                 self.work_q.put(("done", {}))
 
-        self.log.debug(f"INDEX start root={root} prune={self.prune_var.get()} reindex_days={int(self.reindex_days.get())} verify_days={int(self.verify_days.get())} fullhash={bool(self.fullhash_var.get())}")
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("INDEX start root=%s prune=%s reindex_days=%d verify_days=%d fullhash=%s",
+                           root, self.prune_var.get(), int(self.reindex_days.get()),
+                           int(self.verify_days.get()), bool(self.fullhash_var.get()))
         self.worker = threading.Thread(target=job, daemon=True)
         self.worker.start()
         self.btn_cancel.config(state="normal")
@@ -281,8 +379,25 @@ class App(tk.Tk):
                     f_idx  = data.get("files_indexed", 0)
                     chunks = data.get("chunks", 0)
                     secs   = data.get("secs", 0)
-                    self.status.config(text=f"Indexing… seen={f_seen} indexed={f_idx} chunks={chunks} t={secs}s")
-                    self.log.debug(f"PROG seen={f_seen} idx={f_idx} chunks={chunks} t={secs}s")
+                    errs   = data.get("errors", 0)
+                    hot = ""
+                    if data.get("hot_total"):
+                        hot = (f"  hot set searchable after {data['hot_secs']}s" if data.get("hot_secs") is not None
+                               else f"  hot={data.get('hot_done', 0)}/{data['hot_total']}")
+                    phase = {"meta": "metadata", "content": "content", "prune": "prune"}.get(data.get("phase"), "")
+                    self.status.config(text=f"Indexing{' ' + phase if phase else ''}… seen={f_seen} indexed={f_idx} "
+                                            f"chunks={chunks} t={secs}s" + (f" errors={errs}" if errs else "") + hot)
+                    self.log.debug("PROG seen=%s idx=%s chunks=%s t=%ss", f_seen, f_idx, chunks, secs)
+
+                elif what == "sched":
+                    self._show_sched(data)
+
+                elif what == "call":      # worker results for Tk-side callbacks
+                    data["fn"]()
+
+                elif what == "stats":
+                    if data.get("root") == self.root_var.get().strip():
+                        self._show_stats(data)
 
                 elif what == "done":
                     self.status.config(text="Index complete" + (" (cancelled)" if data.get("cancelled") else ""))
@@ -298,10 +413,13 @@ class App(tk.Tk):
 
     def search(self):
         self.log.debug("SEARCH click")
+        self._last_activity = time.monotonic()
+        self.scheduler.note_activity()
         if getattr(self, "auto_clear_var", None) and self.auto_clear_var.get():
-            self.listbox.delete(0, tk.END)
+            self.listbox.delete(0, tk.END); self.results = []
             self.preview.delete("1.0", tk.END)
             if hasattr(self, "fallback_var"): self.fallback_var.set("")
+        self._recent_cursor = None; self.more_btn.config(state="disabled")
 
         q = self.q_var.get().strip()
         if not q:
@@ -310,7 +428,9 @@ class App(tk.Tk):
 
         # compute time lower bound and chosen field
         min_ts, field = self._compute_min_ts()
-        self.log.debug(f"SEARCH start q={q} min_ts={min_ts} field={field} scopes={self.scopes} regex={self.regex_var.get()}")
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("SEARCH start q=%s min_ts=%s field=%s scopes=%s regex=%s",
+                           q, min_ts, field, self.scopes, self.regex_var.get())
 
         # created→modified fallback notice
         used_field = field
@@ -319,23 +439,72 @@ class App(tk.Tk):
             used_field = "modified"
             self.fallback_var.set("Created time unsupported on this OS. Using modified.")
 
-        # run search with scopes + time filter
-        rows = searcher.fts(
-            self.con, q, top_k=200,
+        if all(ch in "*%?" for ch in q) and not self.regex_var.get():
+            # wildcard-only: browse every file newest first, paged with a keyset cursor
+            self._recent_args = dict(path_prefixes=self.scopes, min_ts=min_ts, time_field=used_field,
+                                     filters=self._facet_filters())
+            self.listbox.delete(0, tk.END); self.results = []
+            self.preview.delete("1.0", tk.END)
+            self.load_more_recent()
+            self._refresh_facets("", min_ts, used_field)
+            return
+
+        # run search with scopes + time + facet filters
+        rows = self.shards.fts(
+            q, top_k=200,
             path_prefixes=self.scopes,
             min_ts=min_ts,
             time_field=used_field,
+            filters=self._facet_filters(),
         )
+        self._refresh_facets(q if not self.regex_var.get() else "", min_ts, used_field)
 
         if self.regex_var.get():
             rows = searcher.regex_filter(rows, q)
+        dups = {}
+        if self.collapse_var.get():
+            rows, dups = self.shards.collapse(rows)
 
-        self.listbox.delete(0, tk.END)
+        self.listbox.delete(0, tk.END); self.results = []
         self.preview.delete("1.0", tk.END)
         for cid, ord_, text, path in rows[:300]:
-            self.listbox.insert(tk.END, f"{path}  [chunk {ord_}]  {text[:120]}…")
+            more = f"  (+{len(dups[path])} similar)" if path in dups else ""
+            self.listbox.insert(tk.END, f"{path}  [chunk {ord_}]{more}  {text[:120]}…")
+            self.results.append((path, ord_))
         self.status.config(text=f"{min(300, len(rows))} results")
-        self.log.debug(f"SEARCH query={q} results={len(rows)}")
+        self.log.debug("SEARCH query=%s results=%d", q, len(rows))
+
+    def _facet_filters(self) -> dict:
+        return {f: [v] for f, v in self.facet_sel.items() if v is not None}
+
+    def _refresh_facets(self, q: str, min_ts, field: str):
+        try:
+            counts = self.shards.facet_counts(q, path_prefixes=self.scopes, min_ts=min_ts, time_field=field,
+                                              filters=self._facet_filters())
+        except sqlite3.Error:
+            self.log.debug("facet counts failed q=%s", q, exc_info=True); return
+        for f, om in self.facet_menus.items():
+            menu = om["menu"]; menu.delete(0, tk.END)
+            menu.add_command(label="All", command=lambda f=f: self._pick_facet(f, None, "All"))
+            for v, n, lbl in counts.get(f, ()):
+                menu.add_command(label=f"{lbl} ({n:,})", command=lambda f=f, v=v, lbl=lbl: self._pick_facet(f, v, lbl))
+
+    def _pick_facet(self, field: str, value, label: str):
+        self.facet_sel[field] = value
+        self.facet_vars[field].set(f"{self.facet_titles[field]}: {label}")
+        if self.q_var.get().strip(): self.search()
+
+    def load_more_recent(self):
+        if self._recent_args is None: return
+        t0 = time.perf_counter()
+        rows, self._recent_cursor = self.shards.recent(200, after=self._recent_cursor, **self._recent_args)
+        for _fid, path, size, ts in rows:
+            self.listbox.insert(tk.END, f"{self._fmt_ts(ts)}  {size or 0:>12,}  {path}")
+            self.results.append((path, None))
+        self.more_btn.config(state="normal" if self._recent_cursor else "disabled")
+        self.status.config(text=f"{len(self.results)} recent files ({(time.perf_counter()-t0)*1000:.0f} ms)"
+                                + ("" if self._recent_cursor else " — end"))
+        self.log.debug("RECENT page=%d total=%d", len(rows), len(self.results))
 
     def _fmt_ts(self, ts) -> str:
         if not ts: return "—"
@@ -348,9 +517,9 @@ class App(tk.Tk):
         sel = self.listbox.curselection()
         if not sel: return
         line = self.listbox.get(sel[0])
-        path = line.split("  [chunk", 1)[0]
+        path, ord_ = self.results[sel[0]] if sel[0] < len(self.results) else (line.split("  [chunk", 1)[0], 0)
 
-        meta = db.file_meta(self.con, path)
+        meta = self.shards.file_meta(path)
         out = [path]
         if meta:
             out.append(f"Modified:     {self._fmt_ts(meta.get('mtime'))}")
@@ -361,11 +530,187 @@ class App(tk.Tk):
                 out.append(f"Size:         {meta['size']} bytes")
         else:
             out.append("No metadata found in DB.")
+        self._pv_head = "\n".join(out) + "\n\n"
 
-        out += ["", "Snippet:", line]
-        self.preview.delete("1.0", tk.END)
-        self.preview.insert("1.0", "\n".join(out))
+        # chunks from before byte offsets were stored would open the wrong source window
+        try: self.shards.on_file(path, lambda con: indexer.refresh_offsets(con, path))
+        except Exception: self.log.warning("re-extract failed path=%s", path, exc_info=True)
 
+        # match cursor over this file's chunks; text is fetched per chunk as it moves
+        self._pv = preview.Preview(lambda fn: self.shards.on_file(path, fn), path,
+                                   self.q_var.get().strip(), start_ord=ord_ or 0)
+        self._pv.next()
+        self._render_preview()
+
+    def find_similar(self):
+        sel = self.listbox.curselection()
+        if not sel or sel[0] >= len(self.results): return
+        path = self.results[sel[0]][0]
+        rows = self.shards.similar_to(path)
+        self.listbox.delete(0, tk.END); self.results = [(path, 0)]
+        self.listbox.insert(tk.END, f"{path}  [selected]")
+        for p, sim in rows:
+            self.listbox.insert(tk.END, f"{p}  [{sim:.0%} similar]")
+            self.results.append((p, 0))
+        self._recent_cursor = None; self.more_btn.config(state="disabled")
+        self.status.config(text=f"{len(rows)} files similar to {os.path.basename(path)}"
+                                if rows else "No similar files (or file has no signature yet)")
+        self.log.debug("SIMILAR path=%s results=%d", path, len(rows))
+
+    def _step_match(self, d: int):
+        if not self._pv: return
+        if not (self._pv.next() if d > 0 else self._pv.prev()):
+            self.bell(); return
+        self._render_preview()
+
+    def _render_preview(self):
+        pv = self._pv
+        self.preview.delete("1.0", tk.END)
+        self.preview.insert("1.0", self._pv_head)
+        if pv is None: return
+        cur = pv.current()
+        if not pv.chunks:
+            self.match_var.set("no text indexed"); return
+        self.match_var.set(f"match {cur['hit']}/{cur['hits']} in chunk {cur['ord']}" if cur["hits"]
+                           else f"no matches in chunk {cur['ord']}")
+        if self.source_var.get():
+            src = pv.source()
+            if src.get("error"):
+                body, hl, focus = f"[source unavailable: {src['error']}]", [], None
+            else:
+                body, hl = src["text"], src["spans"]
+                focus = hl[0] if hl else None
+                self.match_var.set(self.match_var.get() + f" — source bytes {src['lo']:,}–{src['hi']:,}")
+        else:
+            body, hl = cur["text"], cur["spans"]
+            focus = cur["focus"]
+        base = f"1.0 + {len(self._pv_head)} chars"
+        self.preview.insert(tk.END, body)
+        for a, b in hl:
+            self.preview.tag_add("cur" if (a, b) == focus else "hit", f"{base} + {a} chars", f"{base} + {b} chars")
+        if focus:
+            self.preview.see(f"{base} + {focus[0]} chars")
+
+
+    # —— index failures (negative cache) ——
+    # —— directory browser (index only, no disk access) ——
+    def open_browser(self):
+        w = tk.Toplevel(self); w.title("Browse index"); w.geometry("1000x600")
+        top = tk.Frame(w); top.pack(fill="x", padx=8, pady=(8,0))
+        path_var = tk.StringVar(); sort_var = tk.StringVar(value="size")
+        tk.Button(top, text="▲ Up", command=lambda: go(up())).pack(side="left")
+        e = tk.Entry(top, textvariable=path_var); e.pack(side="left", fill="x", expand=True, padx=6)
+        e.bind("<Return>", lambda _e: go(path_var.get().strip() or None))
+        tk.Label(top, text="Sort").pack(side="left")
+        tk.OptionMenu(top, sort_var, *dirtree.SORTS, command=lambda _v: go(cur["path"])).pack(side="left", padx=(2,0))
+        lb = tk.Listbox(w, font=("TkFixedFont",)); lb.pack(fill="both", expand=True, padx=8, pady=6)
+        status = tk.Label(w, text="", anchor="w"); status.pack(fill="x", padx=8)
+        bar = tk.Frame(w); bar.pack(fill="x", padx=8, pady=(0,8))
+        cur = {"path": None, "next": None}
+        entries: list[tuple[str, bool]] = []      # (path, is_dir) per listbox row
+
+        def human(n) -> str:
+            n = float(n or 0)
+            for unit in ("B", "KB", "MB", "GB", "TB"):
+                if n < 1024 or unit == "TB": return f"{n:,.0f} {unit}" if unit == "B" else f"{n:,.1f} {unit}"
+                n /= 1024
+
+        def up():
+            p = cur["path"]
+            if p is None: return None
+            parent = os.path.dirname(p)
+            return parent if parent != p else None
+
+        def add_files(rows):
+            for path, size, mtime in rows:
+                lb.insert(tk.END, f"{human(size):>12} {'':>10}  {self._fmt_ts(mtime)}  {os.path.basename(path)}")
+                entries.append((path, False))
+
+        def go(path):
+            t0 = time.perf_counter()
+            sort = sort_var.get()
+            res = self.shards.browse(path, sort=sort)
+            if path is not None and res["dir"] is None and not res["dirs"]:
+                status.config(text=f"Not in the index: {path}"); return
+            cur["path"], cur["next"] = path, res["next"]
+            path_var.set(path or "")
+            lb.delete(0, tk.END); entries.clear()
+            keys = {"name": lambda d: d[0], "size": lambda d: -d[1], "mtime": lambda d: -(d[3] or 0)}
+            for p, size, n, newest in sorted(res["dirs"], key=keys[sort]):
+                lb.insert(tk.END, f"{human(size):>12} {n:>10,}  {self._fmt_ts(newest)}  {os.path.basename(p) or p}{os.sep if os.path.basename(p) else ''}")
+                entries.append((p, True))
+            add_files(res["files"])
+            more_btn.config(state="normal" if cur["next"] else "disabled")
+            tot = res["dir"]
+            head = f"{human(tot[0])} in {tot[1]:,} files, newest {self._fmt_ts(tot[2])}" if tot else f"{len(res['dirs'])} top-level"
+            status.config(text=f"{head}  ({(time.perf_counter()-t0)*1000:.0f} ms)")
+
+        def more():
+            if not cur["next"]: return
+            res = self.shards.browse(cur["path"], sort=sort_var.get(), after=cur["next"])
+            cur["next"] = res["next"]; add_files(res["files"])
+            more_btn.config(state="normal" if cur["next"] else "disabled")
+
+        def open_sel(_evt=None):
+            sel = lb.curselection()
+            if not sel: return
+            path, is_dir = entries[sel[0]]
+            if is_dir: go(path)
+            else: status.config(text=path)
+
+        def rebuild():
+            if self._maint_running or (self.worker and self.worker.is_alive()) or self.scheduler.current:
+                status.config(text="Busy (indexing or maintenance running)"); return
+            self._maint_running = True
+            status.config(text="Rebuilding directory rollups…")
+            def job():
+                con = db.connect(self.db_path)
+                try:
+                    n = shards.ShardSet.from_settings(con, self.db_path).rebuild_dirs()
+                    msg = f"Rebuilt rollups for {n:,} files"
+                except sqlite3.Error as e:
+                    msg = f"Rebuild failed: {e}"
+                finally:
+                    con.close(); self._maint_running = False
+                self.work_q.put(("call", {"fn": lambda: (go(cur["path"]), status.config(text=msg)) if w.winfo_exists() else None}))
+            threading.Thread(target=job, daemon=True).start()
+
+        lb.bind("<Double-Button-1>", open_sel); lb.bind("<Return>", open_sel)
+        more_btn = tk.Button(bar, text="More files…", command=more, state="disabled"); more_btn.pack(side="left")
+        tk.Button(bar, text="Rebuild rollups", command=rebuild).pack(side="right")
+        root = self.root_var.get().strip()
+        go(os.path.abspath(root) if root and self.shards.browse(os.path.abspath(root), limit=1)["dir"] else None)
+
+    def open_failures(self):
+        w = tk.Toplevel(self); w.title("Index failures"); w.geometry("900x400")
+        lb = tk.Listbox(w, selectmode="extended"); lb.pack(fill="both", expand=True, padx=8, pady=8)
+        status = tk.Label(w, text="", anchor="w"); status.pack(fill="x", padx=8)
+        paths: list[str] = []
+
+        def load():
+            lb.delete(0, tk.END); paths.clear()
+            now = int(time.time())
+            for rows in self.shards.each(failures.list_failures):
+                for f in rows or ():
+                    wait = max(0, f["next_retry_at"] - now)
+                    kind = "DIR " if f["is_dir"] else "FILE"
+                    lb.insert(tk.END, f"{kind} {f['path']}  {f['err_class']} x{f['attempts']}  "
+                                      f"retry in {wait//3600}h{wait%3600//60:02d}m  {f['err_msg']}")
+                    paths.append(f["path"])
+            status.config(text=f"{len(paths)} path(s) backing off")
+
+        def retry(selected: bool):
+            targets = [paths[i] for i in lb.curselection()] if selected else [None]
+            n = 0
+            for t in targets:
+                n += sum(k or 0 for k in self.shards.each(lambda con, t=t: failures.force_retry(con, t)))
+            load(); status.config(text=f"{n} path(s) will be retried on the next index run")
+
+        row = tk.Frame(w); row.pack(fill="x", padx=8, pady=6)
+        tk.Button(row, text="Refresh", command=load).pack(side="left")
+        tk.Button(row, text="Retry selected", command=lambda: retry(True)).pack(side="left", padx=6)
+        tk.Button(row, text="Retry all", command=lambda: retry(False)).pack(side="left")
+        load()
 
     # —— regex builder ——
     def open_regex_builder(self):
@@ -423,6 +768,219 @@ class App(tk.Tk):
         tk.Button(btnrow, text="Preview", command=preview).pack(side="left")
         tk.Button(btnrow, text="Use in Search", command=insert_into_search).pack(side="right")
 
+    # —— scheduled roots ——
+    def _show_sched(self, ev: dict):
+        name = f"{ev['mode']} {ev['root']}"
+        kind = ev.get("kind")
+        if kind == "start":
+            self.sched_var.set(f"Background: {name} …")
+        elif kind == "state":
+            self.sched_var.set(f"Background: {name} — {ev['state']}" if ev.get("state") else f"Background: {name} …")
+        elif kind == "progress" and not ev.get("done"):
+            self.sched_var.set(f"Background: {name} seen={ev.get('files_seen', 0)} indexed={ev.get('files_indexed', 0)}")
+        elif kind == "done":
+            self.sched_var.set(f"Background: {name} {ev.get('status')} in {ev.get('secs', 0)}s"
+                               + (f" (throttled {ev['throttled_secs']}s)" if ev.get("throttled_secs") else ""))
+
+    def open_roots(self):
+        w = tk.Toplevel(self); w.title("Scheduled roots"); w.geometry("980x380")
+        lb = tk.Listbox(w, selectmode="browse", font=("TkFixedFont",)); lb.pack(fill="both", expand=True, padx=8, pady=8)
+        status = tk.Label(w, text="", anchor="w"); status.pack(fill="x", padx=8)
+        form = tk.Frame(w); form.pack(fill="x", padx=8)
+        quick = tk.IntVar(value=60); full = tk.IntVar(value=1440); prune = tk.BooleanVar(value=False)
+        tk.Label(form, text="Quick every (min)").pack(side="left"); tk.Entry(form, textvariable=quick, width=6).pack(side="left", padx=(2,8))
+        tk.Label(form, text="Full every (min)").pack(side="left"); tk.Entry(form, textvariable=full, width=6).pack(side="left", padx=(2,8))
+        tk.Checkbutton(form, text="Prune missing", variable=prune).pack(side="left")
+        bar = tk.Frame(w); bar.pack(fill="x", padx=8, pady=(4,8))
+        roots: list[dict] = []
+        ts = lambda t: time.strftime("%m-%d %H:%M", time.localtime(t)) if t else "never"
+
+        def load():
+            lb.delete(0, tk.END); roots.clear()
+            roots.extend(scheduler.list_roots(self.con))
+            for r in roots:
+                lb.insert(tk.END, f"{'on ' if r['enabled'] else 'off'}  {r['path']}   quick/{r['quick_every_min']}m "
+                                  f"[{ts(r['last_quick_at'])}]  full/{r['full_every_min']}m [{ts(r['last_full_at'])}]  "
+                                  f"{r['last_status'] or ''}")
+            status.config(text=f"{len(roots)} root(s)" + ("" if self.scheduler.is_alive() else " — scheduler off (resources.auto)"))
+
+        def selected():
+            sel = lb.curselection()
+            return roots[sel[0]] if sel else None
+
+        def add():
+            path = self.root_var.get().strip()
+            if not path or not os.path.isdir(path):
+                messagebox.showerror("Roots", "Choose a valid directory first", parent=w); return
+            full_fs = scheduler.is_full_fs(path)
+            if full_fs and not messagebox.askyesno(
+                    "Roots", f"{path} is a filesystem root. Index the whole volume on a schedule?", parent=w):
+                return
+            try:
+                scheduler.add_root(self.con, path, quick_every_min=quick.get(), full_every_min=full.get(),
+                                   prune_missing=int(prune.get()), full_fs=int(full_fs))
+            except (ValueError, tk.TclError) as e:
+                messagebox.showerror("Roots", str(e), parent=w); return
+            self.scheduler.kick(); load()
+
+        def remove():
+            r = selected()
+            if r: scheduler.remove_root(self.con, r["path"]); load()
+
+        def toggle():
+            r = selected()
+            if r: scheduler.update_root(self.con, r["path"], enabled=0 if r["enabled"] else 1); self.scheduler.kick(); load()
+
+        def run(mode):
+            r = selected()
+            if not r: return
+            if not self.scheduler.is_alive():
+                status.config(text="Scheduler is off (resources.auto: false)"); return
+            self.scheduler.run_now(r["path"], mode)
+            status.config(text=f"Queued {mode} run for {r['path']}")
+
+        tk.Button(bar, text="Add current root", command=add).pack(side="left")
+        tk.Button(bar, text="Remove", command=remove).pack(side="left", padx=(6,0))
+        tk.Button(bar, text="Enable/Disable", command=toggle).pack(side="left", padx=(6,0))
+        tk.Button(bar, text="Run quick now", command=lambda: run("quick")).pack(side="left", padx=(12,0))
+        tk.Button(bar, text="Run full now", command=lambda: run("full")).pack(side="left", padx=(6,0))
+        tk.Button(bar, text="Refresh", command=load).pack(side="right")
+        load()
+
+    # —— database maintenance ——
+    def _db_paths(self) -> list[str]:
+        return [self.db_path] + [p for p in self.shards._existing(self.shards.paths()) if p != self.db_path]
+
+    def _maint_tick(self):
+        # only when idle: no index job and no search for a while
+        self.after(MAINT_TICK_MS, self._maint_tick)
+        busy = (self.worker and self.worker.is_alive()) or self._maint_running or self.scheduler.current
+        if busy or time.monotonic() - self._last_activity < MAINT_IDLE_SEC:
+            return
+        self._maint_running = True
+        paths = self._db_paths()
+
+        def job():
+            try:
+                for p in paths:
+                    con = db.connect(p)
+                    try: maintenance.auto(con)
+                    finally: con.close()
+            except Exception:
+                self.log.warning("scheduled maintenance failed", exc_info=True)
+            finally:
+                self._maint_running = False
+        threading.Thread(target=job, daemon=True).start()
+
+    def open_maintenance(self):
+        w = tk.Toplevel(self); w.title("Database maintenance"); w.geometry("900x500")
+        txt = sc.ScrolledText(w, wrap="none"); txt.pack(fill="both", expand=True, padx=8, pady=8)
+        status = tk.Label(w, text="", anchor="w"); status.pack(fill="x", padx=8)
+        bar = tk.Frame(w); bar.pack(fill="x", padx=8, pady=(0,8))
+        buttons = []
+
+        def run(label, fn):
+            if self._maint_running or (self.worker and self.worker.is_alive()):
+                status.config(text="Busy (indexing or maintenance running)"); return
+            self._maint_running = True
+            for b in buttons: b.config(state="disabled")
+            status.config(text=f"{label}…")
+            paths = self._db_paths()
+
+            def job():
+                out = []
+                try:
+                    for p in paths:
+                        con = db.connect(p)
+                        try: out.append(fn(con))
+                        finally: con.close()
+                except Exception as e:
+                    out.append(f"error: {e}")
+                finally:
+                    self._maint_running = False
+                self.work_q.put(("call", {"fn": lambda: show(label, out)}))
+            threading.Thread(target=job, daemon=True).start()
+
+        def show(label, out):
+            if not w.winfo_exists(): return
+            for b in buttons: b.config(state="normal")
+            txt.delete("1.0", tk.END)
+            txt.insert("1.0", "\n\n".join(o if isinstance(o, str) else str(o) for o in out))
+            status.config(text=f"{label} done")
+
+        report = lambda: run("Report", lambda con: maintenance.format_report(maintenance.health(con)))
+        for label, fn in (("Report", None),
+                          ("Optimize", lambda con: maintenance.optimize(con)),
+                          ("Checkpoint", lambda con: maintenance.checkpoint(con, "TRUNCATE")),
+                          ("Vacuum (10s)", lambda con: maintenance.incremental_vacuum(con, 10.0)),
+                          ("Full vacuum", lambda con: maintenance.full_vacuum(con))):
+            b = tk.Button(bar, text=label, command=report if fn is None else (lambda l=label, f=fn: run(l, f)))
+            b.pack(side="left", padx=(0,6)); buttons.append(b)
+        report()
+
+    # —— portable snapshots ——
+    def open_snapshot(self):
+        w = tk.Toplevel(self); w.title("Index snapshot"); w.geometry("760x220")
+        only_root = tk.BooleanVar(value=False); remap = tk.StringVar()
+        r1 = tk.Frame(w); r1.pack(fill="x", padx=8, pady=(8,0))
+        tk.Checkbutton(r1, text="Export only the current root", variable=only_root).pack(side="left")
+        r2 = tk.Frame(w); r2.pack(fill="x", padx=8, pady=(6,0))
+        tk.Label(r2, text="Import path map (OLD=NEW; …)").pack(side="left")
+        tk.Entry(r2, textvariable=remap).pack(side="left", fill="x", expand=True, padx=(4,0))
+        status = tk.Label(w, text="", anchor="w", justify="left", wraplength=740); status.pack(fill="x", padx=8, pady=6)
+        bar = tk.Frame(w); bar.pack(fill="x", padx=8, pady=(0,8))
+        stop = threading.Event()
+
+        def set_status(text):
+            if w.winfo_exists(): status.config(text=text)
+
+        def run(label, fn):
+            if self._maint_running or (self.worker and self.worker.is_alive()) or self.scheduler.current:
+                set_status("Busy (indexing or maintenance running)"); return
+            self._maint_running = True; stop.clear()
+
+            def prog(phase, done, total):
+                self.work_q.put(("call", {"fn": lambda: set_status(f"{label}: {phase} {done}/{total}")}))
+
+            def job():
+                con = db.connect(self.db_path); sset = shards.ShardSet.from_settings(con, self.db_path)
+                try:
+                    msg = f"{label} done: {fn(con, sset, prog)}"
+                except (snapshot.Cancelled, ValueError, OSError, sqlite3.Error) as e:
+                    msg = f"{label} failed: {e}"
+                finally:
+                    sset.close(); con.close(); self._maint_running = False
+                self.work_q.put(("call", {"fn": lambda: finish(msg)}))
+            threading.Thread(target=job, daemon=True).start()
+
+        def finish(msg):
+            # the import may have registered roots: reload shard routing
+            self.shards.close(); self.shards = shards.ShardSet.from_settings(self.con, self.db_path)
+            set_status(msg); self.update_stats()
+
+        def do_export():
+            dest = filedialog.asksaveasfilename(parent=w, defaultextension=".sqlite", initialfile="index-snapshot.sqlite")
+            if not dest: return
+            root = self.root_var.get().strip()
+            roots = [root] if only_root.get() and os.path.isdir(root) else None
+            run("Export", lambda con, sset, prog: snapshot.export(con, sset, dest, roots=roots, sleep=0.01,
+                                                                  progress=prog, stop_event=stop))
+
+        def do_import():
+            src = filedialog.askopenfilename(parent=w, filetypes=[("Snapshot", "*.sqlite"), ("All", "*")])
+            if not src: return
+            try:
+                pairs = snapshot.parse_map([m.strip() for m in remap.get().split(";") if m.strip()])
+            except ValueError as e:
+                set_status(str(e)); return
+            run("Import", lambda con, sset, prog: snapshot.install(con, sset, src, remap=pairs,
+                                                                   progress=prog, stop_event=stop))
+
+        tk.Button(bar, text="Export…", command=do_export).pack(side="left")
+        tk.Button(bar, text="Import…", command=do_import).pack(side="left", padx=(6,0))
+        tk.Button(bar, text="Cancel", command=stop.set).pack(side="left", padx=(6,0))
+        set_status("Import merges by blake3/mtime; run an index afterwards to pick up local changes.")
+
     # —— stats + close ——
     def update_stats(self):
         # ensure the StringVar exists even if called before _build() finishes
@@ -433,15 +991,27 @@ class App(tk.Tk):
         if not root or not os.path.isdir(root):
             self.stats_var.set("Stats: invalid directory")
             return
-        d = db.counts_for_root(self.con, root)
+        self.stats_var.set(f"Stats for {root}: counting…")
+
+        def job():
+            try:
+                self.work_q.put(("stats", {"root": root, **self.shards.counts_for_root(root)}))
+            except Exception:
+                self.log.debug("stats failed root=%s", root, exc_info=True)
+        threading.Thread(target=job, daemon=True).start()
+
+    def _show_stats(self, d: dict):
         from time import localtime, strftime
         ts = "—" if not d.get("last_indexed_at") else strftime("%Y-%m-%d %H:%M", localtime(d["last_indexed_at"]))
         self.stats_var.set(
-            f"Stats for {root}: files={d['files_total']}  text_files={d['files_text']}  chunks={d['chunks']}  last_indexed={ts}"
+            f"Stats for {d['root']}: files={d['files_total']}  text_files={d['files_text']}  chunks={d['chunks']}  last_indexed={ts}"
         )
 
     def on_close(self):
         self.cancel_index()
+        self.scheduler.stop(timeout=2.0)
+        maintenance.on_close(self.con)
+        self.shards.close()
         self.destroy()
 
 def main(): App().mainloop()
@@ -0,0 +1,175 @@
+# app/maintenance.py — ANALYZE/optimize, WAL checkpoints, incremental vacuum, health report
+#
+# Every database (main + shards) keeps its own maint_* timestamps in its
+# settings table; auto() runs whatever is due and is cheap to call often.
+#
+#   optimize     PRAGMA optimize (bounded ANALYZE) + a bounded FTS5 merge
+#   checkpoint   fold the WAL back into the database and truncate the -wal file
+#   vacuum       PRAGMA incremental_vacuum in steps until the freelist is empty
+#                or the time budget runs out (needs auto_vacuum=INCREMENTAL)
+
+import os, time, sqlite3
+from . import db
+from .logging_conf import get_logger
+log = get_logger("maintenance")
+
+OPTIMIZE_EVERY_SEC   = 6 * 3600
+CHECKPOINT_EVERY_SEC = 15 * 60
+VACUUM_EVERY_SEC     = 24 * 3600
+WAL_MAX_BYTES        = 64 << 20       # checkpoint early once the -wal file is this big
+FREE_MAX_RATIO       = 0.10           # vacuum early once this share of pages is free
+VACUUM_BUDGET_SEC    = 2.0
+VACUUM_STEP_PAGES    = 256
+CONVERT_MAX_BYTES    = 256 << 20      # idle maintenance converts smaller DBs with a full VACUUM
+
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+def db_file(con: sqlite3.Connection) -> str:
+    for _seq, name, path in con.execute("PRAGMA database_list"):
+        if name == "main": return path or ""
+    return ""
+
+def _size(path: str) -> int:
+    try: return os.path.getsize(path)
+    except OSError: return 0
+
+def _pragma(con, name: str) -> int:
+    return con.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+# —— auto_vacuum ——
+def enable_incremental(con: sqlite3.Connection) -> bool:
+    """Ask for auto_vacuum=INCREMENTAL. A database that already has tables
+    only changes mode through a full VACUUM, which never runs here (this is
+    called from a migration, at startup): it is flagged maint_vacuum_pending
+    for auto() or the maintenance dialog / maintain.py vacuum --full."""
+    if _pragma(con, "auto_vacuum") == 2:
+        return True
+    con.commit()
+    con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    if _pragma(con, "auto_vacuum") == 2:
+        return True
+    db.set_setting(con, "maint_vacuum_pending", True)
+    log.info("auto_vacuum=INCREMENTAL pending a full VACUUM for %s", db_file(con))
+    return False
+
+def full_vacuum(con: sqlite3.Connection) -> dict:
+    """Rebuild the whole file (also applies a pending auto_vacuum change). Blocks writers."""
+    t0 = time.monotonic(); before = _size(db_file(con))
+    con.commit()
+    con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    con.execute("VACUUM")
+    checkpoint(con, "TRUNCATE")
+    db.set_setting(con, "maint_vacuum_pending", False)
+    db.set_setting(con, "maint_vacuum_at", int(time.time()))
+    out = {"secs": round(time.monotonic() - t0, 2), "bytes_before": before, "bytes_after": _size(db_file(con))}
+    log.info("full vacuum %s %s", db_file(con), out)
+    return out
+
+
+# —— tasks ——
+def optimize(con: sqlite3.Connection, fts_merge_pages: int = 500) -> dict:
+    t0 = time.monotonic()
+    con.execute("PRAGMA analysis_limit=400")   # bounded ANALYZE sample per index
+    con.execute("PRAGMA optimize")
+    try:
+        # incremental b-tree merge; 'optimize' would rewrite the whole index at once
+        con.execute("INSERT INTO fts(fts, rank) VALUES('merge', ?)", (int(fts_merge_pages),))
+    except sqlite3.OperationalError:
+        pass
+    con.commit()
+    db.set_setting(con, "maint_optimize_at", int(time.time()))
+    return {"secs": round(time.monotonic() - t0, 3)}
+
+def checkpoint(con: sqlite3.Connection, mode: str = "TRUNCATE") -> dict:
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"): raise ValueError(mode)
+    con.commit()
+    wal = db_file(con) + "-wal"
+    before = _size(wal)
+    busy, frames, done = con.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    db.set_setting(con, "maint_checkpoint_at", int(time.time()))
+    return {"busy": bool(busy), "wal_frames": frames, "checkpointed": done,
+            "wal_bytes_before": before, "wal_bytes_after": _size(wal)}
+
+def incremental_vacuum(con: sqlite3.Connection, budget_sec: float = VACUUM_BUDGET_SEC,
+                       step_pages: int = VACUUM_STEP_PAGES) -> dict:
+    """Release free pages to the OS in small steps until done or out of time."""
+    if _pragma(con, "auto_vacuum") != 2:
+        return {"freed_pages": 0, "remaining": _pragma(con, "freelist_count"), "skipped": "auto_vacuum is not incremental"}
+    deadline = time.monotonic() + max(0.0, budget_sec)
+    start = _pragma(con, "freelist_count"); left = start
+    while left and time.monotonic() < deadline:
+        con.execute(f"PRAGMA incremental_vacuum({int(step_pages)})").fetchall()
+        con.commit()
+        left = _pragma(con, "freelist_count")
+    db.set_setting(con, "maint_vacuum_at", int(time.time()))
+    return {"freed_pages": start - left, "remaining": left}
+
+
+def auto(con: sqlite3.Connection, *, now: int | None = None, budget_sec: float = VACUUM_BUDGET_SEC,
+         force: bool = False) -> dict:
+    """Run whichever tasks are due for this database; returns {task: result}."""
+    now = int(time.time()) if now is None else now
+    done = {}
+    def due(key, every): return force or now - int(db.get_setting(con, key, 0) or 0) >= every
+
+    if db.get_setting(con, "maint_vacuum_pending", False) and _size(db_file(con)) <= CONVERT_MAX_BYTES:
+        # migration 5 only flagged it; larger files wait for the dialog / maintain.py vacuum --full
+        done["full_vacuum"] = full_vacuum(con)
+    pages = _pragma(con, "page_count") or 1
+    if force or due("maint_vacuum_at", VACUUM_EVERY_SEC) or _pragma(con, "freelist_count") / pages > FREE_MAX_RATIO:
+        done["vacuum"] = incremental_vacuum(con, budget_sec)
+    if due("maint_optimize_at", OPTIMIZE_EVERY_SEC):
+        done["optimize"] = optimize(con)
+    if done or due("maint_checkpoint_at", CHECKPOINT_EVERY_SEC) or _size(db_file(con) + "-wal") > WAL_MAX_BYTES:
+        done["checkpoint"] = checkpoint(con, "TRUNCATE")
+    if done: log.debug("maintenance %s %s", db_file(con), done)
+    return done
+
+def on_close(con: sqlite3.Connection) -> None:
+    # what the SQLite docs recommend for short-lived and long-lived connections alike
+    try: con.execute("PRAGMA optimize")
+    except sqlite3.Error: pass
+
+
+# —— report ——
+def health(con: sqlite3.Connection, *, objects: bool = True) -> dict:
+    """Sizes and space accounting for one database file."""
+    path = db_file(con)
+    page_size, pages, free = _pragma(con, "page_size"), _pragma(con, "page_count"), _pragma(con, "freelist_count")
+    out = {
+        "path": path, "file_bytes": _size(path), "wal_bytes": _size(path + "-wal"),
+        "page_size": page_size, "page_count": pages, "freelist_pages": free,
+        "free_pct": round(100.0 * free / pages, 2) if pages else 0.0,
+        "auto_vacuum": AUTO_VACUUM_MODES.get(_pragma(con, "auto_vacuum"), "?"),
+        "vacuum_pending": bool(db.get_setting(con, "maint_vacuum_pending", False)),
+        "last": {k: db.get_setting(con, f"maint_{k}_at") for k in ("optimize", "checkpoint", "vacuum")},
+    }
+    if objects:
+        try:
+            rows = con.execute("""SELECT name, COUNT(*), SUM(pgsize), SUM(unused)
+                                  FROM dbstat GROUP BY name ORDER BY SUM(pgsize) DESC""").fetchall()
+        except sqlite3.OperationalError:
+            rows = None   # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+        if rows is not None:
+            kinds = dict(con.execute("SELECT name, type FROM sqlite_master"))
+            out["objects"] = [{"name": n, "type": kinds.get(n, "internal"), "pages": c, "bytes": b,
+                               "unused_pct": round(100.0 * u / b, 1) if b else 0.0} for n, c, b, u in rows]
+            used = sum(b for _n, _c, b, _u in rows) or 1
+            # share of allocated b-tree bytes that hold no data (half-empty pages after deletes)
+            out["fragmentation_pct"] = round(100.0 * sum(u for *_x, u in rows) / used, 1)
+    return out
+
+def format_report(h: dict) -> str:
+    mb = lambda n: f"{(n or 0) / 1e6:,.1f} MB"
+    ts = lambda t: time.strftime("%Y-%m-%d %H:%M", time.localtime(t)) if t else "never"
+    lines = [h["path"],
+             f"  file {mb(h['file_bytes'])}  wal {mb(h['wal_bytes'])}  pages {h['page_count']:,} × {h['page_size']}",
+             f"  free pages {h['freelist_pages']:,} ({h['free_pct']}%)  auto_vacuum={h['auto_vacuum']}"
+             + ("  [full VACUUM pending]" if h["vacuum_pending"] else "")
+             + (f"  fragmentation {h['fragmentation_pct']}%" if "fragmentation_pct" in h else ""),
+             "  last " + "  ".join(f"{k}={ts(v)}" for k, v in h["last"].items())]
+    for o in h.get("objects", [])[:20]:
+        lines.append(f"    {o['name']:<32} {o['type']:<9} {mb(o['bytes']):>12}  unused {o['unused_pct']}%")
+    return "\n".join(lines)
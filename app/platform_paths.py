@@ -0,0 +1,16 @@
+# app/platform_paths.py — per-OS locations (no tkinter import, safe for headless use)
+import os, platform
+
+def app_data_dir() -> str:
+    """Get platform-appropriate application data directory."""
+    system = platform.system()
+    if system == "Darwin":
+        return os.path.expanduser("~/Library/Application Support/SuperFileManager")
+    elif system == "Windows":
+        appdata = os.environ.get('LOCALAPPDATA') or os.environ.get('APPDATA')
+        return os.path.join(appdata, "SuperFileManager")
+    else:  # Linux/Unix
+        return os.path.expanduser("~/.local/share/SuperFileManager")
+
+APP_DATA_DIR = app_data_dir()
+DB_PATH = os.path.join(APP_DATA_DIR, "state.sqlite")
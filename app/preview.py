@@ -0,0 +1,185 @@
+# app/preview.py — match highlighting and lazy source windows for the preview pane
+#
+# The fts table is contentless, so FTS5 snippet()/highlight() are unavailable.
+# Match positions are recomputed here from the stored chunk text with a regex
+# built from the query, and surrounding source text is read on demand from the
+# file through a bounded mmap window at the chunk's byte offsets.
+
+import os, re, mmap, sqlite3
+from typing import Optional
+from .logging_conf import get_logger
+log = get_logger("preview")
+
+WINDOW_BYTES = 64 * 1024        # source bytes shown around a chunk
+MAX_WINDOW   = 1024 * 1024      # widget never holds more than this
+CONTEXT      = 160              # chars of chunk text on each side of a match
+
+_OPS = {"AND", "OR", "NOT", "NEAR"}
+_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+_SUFFIXES = ("ations", "ation", "ments", "ment", "ness", "ings", "ing", "ies", "ied", "ed", "es", "ly", "er", "s")
+
+
+def _stem(w: str) -> str:
+    # crude stand-in for the porter tokenizer: good enough to find the hit again
+    for suf in _SUFFIXES:
+        if w.endswith(suf) and len(w) - len(suf) >= 3:
+            return w[:-len(suf)]
+    return w
+
+def _word_rx(w: str) -> Optional[str]:
+    # every word may carry a suffix: stems and prefix queries ("foo*") both need it
+    words = re.findall(r"\w+", w)
+    if not words: return None
+    return r"\b" + r"\W+".join(re.escape(_stem(x.lower())) + r"\w*" for x in words)
+
+def query_regex(q: str) -> Optional[re.Pattern]:
+    """Regex matching what an FTS query would hit (terms, phrases, prefixes); None for show-all."""
+    if not q or all(ch in "*%?" for ch in q.strip()):
+        return None
+    alts, skip = [], False
+    for m in _TOKEN.finditer(q.replace("(", " ").replace(")", " ")):
+        phrase, word = m.group(1), m.group(2)
+        if word and word.upper() in _OPS:
+            skip = word.upper() == "NOT"; continue
+        if skip:
+            skip = False; continue
+        rx = _word_rx(phrase if phrase is not None else word)
+        if rx: alts.append(rx)
+    if not alts:
+        return None
+    return re.compile("|".join(f"(?:{a})" for a in alts), re.IGNORECASE)
+
+def spans(text: str, rx: Optional[re.Pattern]) -> list[tuple[int, int]]:
+    return [] if rx is None else [m.span() for m in rx.finditer(text) if m.end() > m.start()]
+
+
+def chunk_index(con: sqlite3.Connection, path: str) -> list[tuple]:
+    """[(chunk_id, ord, bytes_from, bytes_to), ...] for one file, in order."""
+    return con.execute("""SELECT c.id, c.ord, c.bytes_from, c.bytes_to
+                          FROM chunks c JOIN files f ON f.id = c.file_id
+                          WHERE f.path = ? ORDER BY c.ord""", (path,)).fetchall()
+
+def chunk_text(con: sqlite3.Connection, chunk_id: int) -> str:
+    row = con.execute("SELECT text FROM chunks WHERE id=?", (chunk_id,)).fetchone()
+    return row[0] if row else ""
+
+
+def _utf8_trim(data: bytes, at_start: bool, at_end: bool) -> bytes:
+    # drop partial UTF-8 sequences cut by the window edges
+    if not at_start:
+        i = 0
+        while i < min(3, len(data)) and (data[i] & 0xC0) == 0x80: i += 1
+        data = data[i:]
+    if not at_end:
+        for back in range(1, min(4, len(data)) + 1):
+            b = data[-back]
+            if b < 0x80: break                      # ASCII: nothing cut
+            if b >= 0xC0:                           # lead byte of the last sequence
+                need = 4 if b >= 0xF0 else 3 if b >= 0xE0 else 2
+                if back < need: data = data[:-back]
+                break
+    return data
+
+def read_window(path: str, lo: int, hi: int) -> tuple[str, int, int]:
+    """Decoded source bytes [lo, hi) (clamped to the file and MAX_WINDOW) via mmap.
+
+    Only the pages inside the window are touched, so a multi-GB file costs
+    the same as a small one. Returns (text, lo, hi) actually read.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        lo = max(0, min(lo, size)); hi = max(lo, min(hi, size, lo + MAX_WINDOW))
+        if hi == lo:
+            return "", lo, hi
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = mm[lo:hi]
+    data = _utf8_trim(data, lo == 0, hi == size)
+    try:
+        return data.decode("utf-8"), lo, hi
+    except UnicodeDecodeError:
+        import chardet
+        enc = chardet.detect(data[:65536]).get("encoding") or "latin-1"
+        try: return data.decode(enc, errors="replace"), lo, hi
+        except LookupError: return data.decode("latin-1"), lo, hi
+
+
+class Preview:
+    """Match cursor over one file's chunks.
+
+    `run(fn)` executes fn(con) against the database (or shard) holding the
+    file; chunk text is fetched one chunk at a time as the cursor moves.
+    """
+
+    def __init__(self, run, path: str, query: str, start_ord: int | None = 0):
+        self.run, self.path = run, path
+        self.rx = query_regex(query)
+        self.chunks = run(lambda con: chunk_index(con, path)) or []
+        self._text: dict[int, str] = {}
+        self._spans: dict[int, list] = {}
+        self.pos = 0                                    # index into self.chunks
+        for i, c in enumerate(self.chunks):
+            if c[1] == start_ord: self.pos = i; break
+        self.hit = -1                                   # index into spans of current chunk
+
+    def text(self, i: int) -> str:
+        if i not in self._text:
+            cid = self.chunks[i][0]
+            self._text[i] = self.run(lambda con: chunk_text(con, cid)) or ""
+        return self._text[i]
+
+    def hits(self, i: int) -> list[tuple[int, int]]:
+        if i not in self._spans:
+            self._spans[i] = spans(self.text(i), self.rx)
+        return self._spans[i]
+
+    def _step(self, d: int) -> bool:
+        if not self.chunks: return False
+        i, h = self.pos, self.hit + d
+        while 0 <= i < len(self.chunks):
+            n = len(self.hits(i))
+            if 0 <= h < n:
+                self.pos, self.hit = i, h
+                return True
+            i += d
+            if 0 <= i < len(self.chunks):
+                h = 0 if d > 0 else len(self.hits(i)) - 1
+        return False
+
+    def next(self) -> bool:
+        return self._step(1)
+
+    def prev(self) -> bool:
+        return self._step(-1)
+
+    def current(self) -> dict:
+        """Snippet around the current match: text, highlight spans (relative to text), position info."""
+        if not self.chunks:
+            return {"text": "", "spans": [], "focus": None, "ord": None, "hit": 0, "hits": 0}
+        t = self.text(self.pos); hs = self.hits(self.pos)
+        focus = None
+        if self.hit < 0 or not hs:
+            a, b = 0, min(len(t), 2 * CONTEXT)
+        else:
+            s, e = hs[self.hit]
+            a, b = max(0, s - CONTEXT), min(len(t), e + CONTEXT)
+            focus = (s - a, e - a)
+        rel = [(max(s, a) - a, min(e, b) - a) for s, e in hs if e > a and s < b]
+        return {"text": t[a:b], "spans": rel, "focus": focus, "ord": self.chunks[self.pos][1],
+                "hit": self.hit + 1, "hits": len(hs)}
+
+    def source_range(self, pad: int = WINDOW_BYTES // 2) -> tuple[int, int]:
+        """Byte range of the current chunk in the source, padded on both sides."""
+        _cid, _o, b0, b1 = self.chunks[self.pos]
+        b0, b1 = b0 or 0, b1 or 0
+        return max(0, b0 - pad), max(b1, b0) + pad
+
+    def source(self, lo: int | None = None, hi: int | None = None) -> dict:
+        """Lazily read the source around the current chunk with matches highlighted."""
+        if lo is None or hi is None:
+            lo, hi = self.source_range()
+        try:
+            text, lo, hi = read_window(self.path, lo, hi)
+        except (OSError, ValueError) as e:
+            log.debug("source window failed path=%s err=%s", self.path, e)
+            return {"text": "", "spans": [], "lo": lo, "hi": lo, "error": str(e)}
+        return {"text": text, "spans": spans(text, self.rx), "lo": lo, "hi": hi}
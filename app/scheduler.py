@@ -0,0 +1,323 @@
+# app/scheduler.py — registry of indexed roots + background index scheduler
+#
+# Each root in the `roots` table has its own quick/full intervals and indexer
+# knobs. A quick run refreshes metadata only (stat + upsert); a full run also
+# hashes and extracts content. The Scheduler thread runs whichever root is
+# most overdue, under the resource guards from config/default.yaml:
+#
+#   resources.target_fraction   CPU share of one core the indexer may use
+#   resources.io_mb_per_s       read budget (0 = unlimited)
+#   resources.min_free_gb       pause while the DB volume has less free space
+#   resources.search_backoff_sec  pause while the user is searching
+#   safety.require_flag_for_full_fs  a filesystem/volume root needs full_fs=1
+
+import os, time, shutil, threading, sqlite3
+from . import db, indexer, shards, config
+from .logging_conf import get_logger
+log = get_logger("scheduler")
+
+MODES = ("quick", "full")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots(
+  path TEXT PRIMARY KEY,
+  enabled INTEGER NOT NULL DEFAULT 1,
+  quick_every_min INTEGER NOT NULL DEFAULT 60,      -- 0 = never
+  full_every_min INTEGER NOT NULL DEFAULT 1440,     -- 0 = never
+  prune_missing INTEGER NOT NULL DEFAULT 0,
+  reindex_days INTEGER NOT NULL DEFAULT 14,
+  verify_hash_days INTEGER NOT NULL DEFAULT 7,
+  full_fs INTEGER NOT NULL DEFAULT 0,               -- explicit opt-in for a volume root
+  last_quick_at INTEGER, last_full_at INTEGER,
+  last_status TEXT, last_secs REAL
+);
+"""
+_KNOBS = ("enabled", "quick_every_min", "full_every_min", "prune_missing",
+          "reindex_days", "verify_hash_days", "full_fs")
+_COLS = ("path",) + _KNOBS + ("last_quick_at", "last_full_at", "last_status", "last_secs")
+
+
+# —— registry ——
+def is_full_fs(path: str) -> bool:
+    """A filesystem / volume root ("/", "C:\\", a mount point)."""
+    p = os.path.abspath(path)
+    return os.path.dirname(p) == p or os.path.ismount(p)
+
+def _check_safety(path: str, full_fs: bool, cfg: dict) -> None:
+    if cfg["safety"].get("require_flag_for_full_fs", True) and is_full_fs(path) and not full_fs:
+        raise ValueError(f"{path} is a filesystem root; pass full_fs=True to index it")
+
+def add_root(con: sqlite3.Connection, path: str, *, cfg: dict | None = None, **knobs) -> dict:
+    cfg = cfg or config.load()
+    path = db.path_key(path)
+    bad = set(knobs) - set(_KNOBS)
+    if bad: raise ValueError(f"unknown root option(s): {', '.join(sorted(bad))}")
+    _check_safety(path, bool(knobs.get("full_fs")), cfg)
+    con.execute("INSERT OR IGNORE INTO roots(path) VALUES(?)", (path,))
+    if knobs:
+        con.execute(f"UPDATE roots SET {', '.join(k + '=?' for k in knobs)} WHERE path=?",
+                    [int(v) for v in knobs.values()] + [path])
+    con.commit()
+    return get_root(con, path)
+
+def update_root(con: sqlite3.Connection, path: str, **knobs) -> dict | None:
+    return add_root(con, path, **knobs) if get_root(con, path) else None
+
+def remove_root(con: sqlite3.Connection, path: str) -> bool:
+    """Forget the schedule; indexed data stays until pruned."""
+    n = con.execute("DELETE FROM roots WHERE path=?", (db.path_key(path),)).rowcount
+    con.commit()
+    return bool(n)
+
+def get_root(con: sqlite3.Connection, path: str) -> dict | None:
+    row = con.execute(f"SELECT {','.join(_COLS)} FROM roots WHERE path=?", (db.path_key(path),)).fetchone()
+    return dict(zip(_COLS, row)) if row else None
+
+def list_roots(con: sqlite3.Connection) -> list[dict]:
+    return [dict(zip(_COLS, r)) for r in con.execute(f"SELECT {','.join(_COLS)} FROM roots ORDER BY path")]
+
+def due(con: sqlite3.Connection, now: int | None = None, cfg: dict | None = None) -> list[tuple[dict, str, int]]:
+    """[(root, mode, seconds overdue)] most overdue first; full wins over quick for the same root."""
+    now = int(time.time()) if now is None else now
+    modes = (cfg or config.load())["modes"]
+    out = []
+    for r in list_roots(con):
+        if not r["enabled"]: continue
+        for mode, every, last, on in (("full", r["full_every_min"], r["last_full_at"], modes.get("full_depth", True)),
+                                      ("quick", r["quick_every_min"], r["last_quick_at"], modes.get("quick", True))):
+            if not on or not every: continue
+            late = now - (last or 0) - every * 60
+            if mode == "quick" and r["last_full_at"]:
+                late = min(late, now - r["last_full_at"] - every * 60)   # a full run refreshes metadata too
+            if late >= 0:
+                out.append((r, mode, late)); break
+    out.sort(key=lambda x: -x[2])
+    return out
+
+def next_due_in(con: sqlite3.Connection, now: int | None = None, cfg: dict | None = None) -> float | None:
+    now = int(time.time()) if now is None else now
+    modes = (cfg or config.load())["modes"]
+    best = None
+    for r in list_roots(con):
+        if not r["enabled"]: continue
+        for every, last, on in ((r["full_every_min"], r["last_full_at"], modes.get("full_depth", True)),
+                                (r["quick_every_min"], max(r["last_quick_at"] or 0, r["last_full_at"] or 0),
+                                 modes.get("quick", True))):
+            if on and every:
+                wait = (last or 0) + every * 60 - now
+                best = wait if best is None else min(best, wait)
+    return None if best is None else max(0, best)
+
+def record_run(con: sqlite3.Connection, path: str, mode: str, status: str, secs: float, now: int | None = None) -> None:
+    now = int(time.time()) if now is None else now
+    col = "last_full_at" if mode == "full" else "last_quick_at"
+    con.execute(f"UPDATE roots SET {col}=?, last_status=?, last_secs=? WHERE path=?",
+                (now, status, round(secs, 1), path))
+    con.commit()
+
+
+# —— resource guards ——
+class Throttle:
+    """Called by index_root after each file: throttle(nbytes, commit).
+
+    Sleeps to keep CPU (process time: blake3 hashes on its own threads) under
+    `target_fraction` of wall time and
+    reads under `io_mb_per_s`, and blocks while free space on `free_path` is
+    below `min_free_gb` or the user searched within `backoff_sec`. The open
+    write transaction is committed before any sleep so other writers are
+    never blocked by a paused indexer.
+    """
+
+    WINDOW_SEC = 10.0     # budgets are measured over a sliding window, not since start
+    DISK_CHECK_SEC = 5.0
+
+    def __init__(self, *, target_fraction: float = 0.5, io_mb_per_s: float = 0, min_free_gb: float = 0,
+                 free_path: str = ".", backoff_sec: float = 0, last_activity=None,
+                 stop_event: threading.Event | None = None, on_state=None):
+        self.fraction = min(1.0, max(0.05, float(target_fraction or 1.0)))
+        self.io_bps = float(io_mb_per_s or 0) * 1e6
+        self.min_free = float(min_free_gb or 0) * 1e9
+        self.free_path = free_path
+        self.backoff = float(backoff_sec or 0)
+        self.last_activity = last_activity or (lambda: None)
+        self.stop_event = stop_event or threading.Event()
+        self.on_state = on_state or (lambda s: None)
+        self.slept = 0.0
+        self._disk_checked = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._wall0, self._cpu0, self._bytes = time.monotonic(), time.process_time(), 0
+
+    def _sleep(self, secs: float, flush) -> None:
+        if secs <= 0 or self.stop_event.is_set(): return
+        if flush: flush()
+        t = time.monotonic()
+        self.stop_event.wait(secs)
+        self.slept += time.monotonic() - t
+
+    def _low_disk(self) -> float | None:
+        if not self.min_free: return None
+        try: free = shutil.disk_usage(self.free_path).free
+        except OSError: return None
+        return free if free < self.min_free else None
+
+    def __call__(self, nbytes: int = 0, flush=None) -> None:
+        if self._pauses(flush):
+            self._reset()    # time spent paused is not budget credit
+            return
+        self._bytes += nbytes
+        wall = time.monotonic() - self._wall0
+        cpu = time.process_time() - self._cpu0
+        need = cpu / self.fraction - wall
+        if self.io_bps:
+            need = max(need, self._bytes / self.io_bps - wall)
+        if need > 0.01:
+            self._sleep(need, flush)
+        if wall > self.WINDOW_SEC:
+            self._reset()
+
+    def _pauses(self, flush) -> bool:
+        """Block while disk space is low or the user is searching; True if it waited."""
+        waited = False
+        if time.monotonic() - self._disk_checked >= self.DISK_CHECK_SEC:
+            self._disk_checked = time.monotonic()
+            free = self._low_disk()
+            while free is not None and not self.stop_event.is_set():
+                self.on_state(f"paused: {free / 1e9:.1f} GB free (< {self.min_free / 1e9:g} GB)")
+                self._sleep(self.DISK_CHECK_SEC, None if waited else flush); waited = True
+                free = self._low_disk()
+        if self.backoff:
+            last = self.last_activity()
+            while last is not None and time.monotonic() - last < self.backoff and not self.stop_event.is_set():
+                self.on_state("backing off: search in progress")
+                self._sleep(min(1.0, self.backoff), None if waited else flush); waited = True
+                last = self.last_activity()
+        if waited: self.on_state(None)
+        return waited
+
+    @classmethod
+    def from_config(cls, cfg: dict, free_path: str, **kw) -> "Throttle":
+        res = cfg["resources"]
+        return cls(target_fraction=res.get("target_fraction", 0.5), io_mb_per_s=res.get("io_mb_per_s", 0),
+                   min_free_gb=res.get("min_free_gb", 0), backoff_sec=res.get("search_backoff_sec", 0),
+                   free_path=free_path, **kw)
+
+
+# —— scheduler ——
+class Scheduler(threading.Thread):
+    """Background thread that runs due roots one at a time.
+
+    on_event(dict) receives {"kind": "start"|"progress"|"state"|"done", ...};
+    busy() returning True (e.g. a manual index in the GUI) defers runs.
+    """
+
+    IDLE_POLL_SEC = 60
+
+    def __init__(self, db_path: str, excludes: list[str] | None = None, *, cfg: dict | None = None,
+                 on_event=None, busy=None):
+        super().__init__(name="index-scheduler", daemon=True)
+        self.db_path = db_path
+        self.cfg = cfg or config.load()
+        self.excludes = list(excludes if excludes is not None else self.cfg["scan"]["exclude_dir"])
+        self.on_event = on_event or (lambda ev: None)
+        self.busy = busy or (lambda: False)
+        self._halt = threading.Event()
+        self._wake = threading.Event()
+        self._activity: float | None = None
+        self._forced: list[tuple[str, str]] = []
+        self._lock = threading.Lock()
+        self.current: tuple[str, str] | None = None
+
+    # called from other threads
+    def note_activity(self) -> None:
+        self._activity = time.monotonic()
+
+    def run_now(self, path: str, mode: str = "quick") -> None:
+        if mode not in MODES: raise ValueError(mode)
+        with self._lock: self._forced.append((db.path_key(path), mode))
+        self._wake.set()
+
+    def kick(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        self._halt.set(); self._wake.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    # thread body
+    def run(self):
+        con = db.connect(self.db_path); db.init(con); db.migrate(con)
+        try:
+            while not self._halt.is_set():
+                self._wake.clear()
+                if self.busy():
+                    self._wake.wait(self.IDLE_POLL_SEC); continue
+                job = self._next(con)
+                if job is None:
+                    wait = next_due_in(con, cfg=self.cfg)
+                    self._wake.wait(self.IDLE_POLL_SEC if wait is None else min(self.IDLE_POLL_SEC, max(1, wait)))
+                    continue
+                self._run_one(con, *job)
+        except Exception:
+            log.warning("scheduler stopped on error", exc_info=True)
+        finally:
+            con.close()
+
+    def _next(self, con):
+        with self._lock:
+            while self._forced:
+                path, mode = self._forced.pop(0)
+                root = get_root(con, path)
+                if root: return root, mode
+        d = due(con, cfg=self.cfg)
+        return (d[0][0], d[0][1]) if d else None
+
+    def _run_one(self, con, root: dict, mode: str) -> None:
+        path = root["path"]
+        emit = self.on_event
+        try:
+            _check_safety(path, bool(root["full_fs"]), self.cfg)
+        except ValueError as e:
+            record_run(con, path, mode, f"refused: {e}", 0); emit({"kind": "done", "root": path, "mode": mode, "status": "refused"})
+            return
+        if not os.path.isdir(path):
+            record_run(con, path, mode, "missing", 0); emit({"kind": "done", "root": path, "mode": mode, "status": "missing"})
+            return
+        try:
+            sset = shards.ShardSet.from_settings(con, self.db_path)
+            shard_path = sset.register_root(con, path)
+        except Exception as e:      # e.g. settings locked past the timeout
+            log.warning("scheduled %s index could not start root=%s", mode, path, exc_info=True)
+            emit({"kind": "done", "root": path, "mode": mode, "status": f"error: {e}"})
+            return
+        throttle = Throttle.from_config(self.cfg, os.path.dirname(os.path.abspath(shard_path)),
+                                        last_activity=lambda: self._activity, stop_event=self._halt,
+                                        on_state=lambda s: emit({"kind": "state", "root": path, "mode": mode, "state": s}))
+        self.current = (path, mode)
+        emit({"kind": "start", "root": path, "mode": mode})
+        t0 = time.monotonic(); status = "ok"
+        wcon = sset.connect(shard_path, check_same_thread=False)
+        try:
+            res = indexer.index_root(
+                wcon, path, self.excludes,
+                max_read_bytes=int(self.cfg["scan"].get("max_read_bytes_per_file", 200_000)),
+                progress_cb=lambda ev: emit({"kind": "progress", "root": path, "mode": mode, **ev}),
+                prune_missing=bool(root["prune_missing"]),
+                reindex_days=root["reindex_days"], verify_hash_days=root["verify_hash_days"],
+                content=(mode == "full"), throttle=throttle, stop_event=self._halt)
+            if res.get("cancelled"): status = "cancelled"
+            elif res.get("errors"): status = f"ok ({res['errors']} errors)"
+        except Exception as e:
+            log.warning("scheduled %s index failed root=%s", mode, path, exc_info=True)
+            status, res = f"error: {e}", {}
+        finally:
+            wcon.close(); sset.close()
+            self.current = None
+        secs = time.monotonic() - t0
+        if status != "cancelled":
+            record_run(con, path, mode, status, secs)
+        log.info("scheduled %s index root=%s status=%s secs=%.1f throttled=%.1fs", mode, path, status, secs, throttle.slept)
+        emit({"kind": "done", "root": path, "mode": mode, "status": status, "secs": round(secs, 1),
+              "throttled_secs": round(throttle.slept, 1), **res})
@@ -1,20 +1,17 @@
 # app/searcher.py
-import os, sqlite3, re
+import os, sqlite3, re, logging
 from typing import Iterable, Optional, List
+from . import db, facets
 from .logging_conf import get_logger
 log = get_logger("searcher")
 
+FACET_MATCH_CAP = 50_000    # chunks considered when counting facets for a text query
 
-def _norm_prefix(p: str) -> str:
-    absp = os.path.abspath(p)
-    if os.name == "nt": absp = os.path.normcase(absp)
-    sep = "\\" if os.name == "nt" else "/"
-    return absp if absp.endswith(sep) else absp + sep
 
 def _in_scopes(path: str, prefixes: List[str]) -> bool:
+    # prefixes from db.path_prefix: same spelling as stored paths, case included
     if not prefixes: return True
     norm = os.path.abspath(path)
-    if os.name == "nt": norm = os.path.normcase(norm)
     return any(norm.startswith(pref) for pref in prefixes)
 
 def _normalize_fts_query(q: str) -> Optional[str]:
@@ -34,7 +31,68 @@ def _normalize_fts_query(q: str) -> Optional[str]:
     if any(op in s for op in ops):
         return s
     # Otherwise quote as a phrase so special chars don't break MATCH
-    return f"\"{s.replace('\"', '\"\"')}\""
+    esc = s.replace('"', '""')
+    return f'"{esc}"'
+
+def query_error(q: str) -> Optional[str]:
+    """Why `q` is not a valid MATCH expression, or None.
+
+    Runs the normalized query against an empty fts table declared like the
+    real one, so the only thing that can fail is parsing the query itself.
+    """
+    qn = _normalize_fts_query(q)
+    if qn is None: return None
+    probe = sqlite3.connect(":memory:")
+    try:
+        probe.execute("CREATE VIRTUAL TABLE fts USING fts5(text, tokenize='porter', content='', prefix=2)")
+        probe.execute("SELECT rowid FROM fts WHERE fts MATCH ?", (qn,)).fetchall()
+        return None
+    except sqlite3.OperationalError as e:
+        return str(e)
+    finally:
+        probe.close()
+
+
+def recent(
+    con: sqlite3.Connection,
+    limit: int = 200,
+    *,
+    path_prefixes: Optional[List[str]] = None,
+    min_ts: Optional[int] = None,
+    time_field: str = "modified",
+    after: Optional[tuple] = None,          # cursor returned by the previous page
+    filters: Optional[dict] = None,         # facet filters, see facets.normalize
+) -> tuple[list[tuple], Optional[tuple]]:
+    """Newest files first across *all* of `files` (not only those with text).
+
+    Walks idx_files_recent_{mtime,ctime} backwards. The index leads with the
+    time column, so min_ts and the keyset cursor on (time, path) bound the
+    scan, while scope ranges are checked per index entry (covering: no table
+    lookups) rather than range-scanned. Page N costs the same as page 1.
+    Returns ([(file_id, path, size, ts), ...], next_cursor or None).
+    """
+    col = "mtime" if time_field == "modified" else "ctime_eff"
+    where, params = [f"{col} IS NOT NULL"], []
+    if min_ts is not None:
+        where.append(f"{col} >= ?"); params.append(min_ts)
+    if path_prefixes:
+        ranges = [db.path_range(p) for p in path_prefixes]
+        where.append("(" + " OR ".join(["(path >= ? AND path < ?)"] * len(ranges)) + ")")
+        for lo, hi in ranges: params += [lo, hi]
+    if after is not None:
+        where.append(f"({col}, path) < (?, ?)"); params += list(after)
+    fsql, fparams = facets.where(facets.normalize(filters))
+    if fsql:
+        where.append(fsql); params += fparams
+    sql = f"""SELECT id, path, size, {col}
+              FROM files INDEXED BY idx_files_recent_{col.split('_')[0]}
+              WHERE {" AND ".join(where)}
+              ORDER BY {col} DESC, path DESC
+              LIMIT ?"""
+    params.append(limit)
+    rows = con.execute(sql, params).fetchall()
+    nxt = (rows[-1][3], rows[-1][1]) if len(rows) == limit else None
+    return rows, nxt
 
 
 def fts(
@@ -45,14 +103,19 @@ def fts(
     path_prefixes: Optional[List[str]] = None,
     min_ts: Optional[int] = None,           # epoch seconds
     time_field: str = "modified",           # "modified" or "created"
+    with_score: bool = False,               # append a 5th "score" column (lower is better)
+    filters: Optional[dict] = None,         # facet filters: {"ext": [...], "mime": [...], "size_bucket": [...]}
 ) -> list[tuple]:
     cur = con.cursor()
-    col = "f.mtime" if time_field == "modified" else "COALESCE(f.created_at, f.mtime)"
+    col = "f.mtime" if time_field == "modified" else "f.ctime_eff"
     qn = _normalize_fts_query(q)
-    log.debug(f"fts args q={q!r} top_k={top_k} min_ts={min_ts} field={time_field} scopes={len(path_prefixes or [])}")
+    dbg = log.isEnabledFor(logging.DEBUG)
+    if dbg:
+        log.debug("fts args q=%r top_k=%s min_ts=%s field=%s scopes=%d",
+                  q, top_k, min_ts, time_field, len(path_prefixes or []))
 
     # Build scope SQL
-    prefixes = [_norm_prefix(p) for p in (path_prefixes or [])]
+    prefixes = [db.path_prefix(p) for p in (path_prefixes or [])]
     scope_sql = ""
     scope_params: List[str] = []
     if prefixes:
@@ -60,44 +123,47 @@ def fts(
         scope_params = [p + "%" for p in prefixes]
 
     if qn is None:
-        where = ["c.ord = 0"]
-        params: List[object] = []
-        if min_ts is not None:
-            where.append(f"{col} >= ?"); params.append(min_ts)
-        if scope_sql:
-            where.append(scope_sql); params.extend(scope_params)
-        sql = f"""SELECT c.id
-                  FROM chunks c
-                  JOIN files f ON f.id = c.file_id
-                  WHERE {" AND ".join(where) if where else "1=1"}
-                  ORDER BY {col} DESC
-                  LIMIT ?"""
-        params.append(top_k)
-        log.debug("WHERE=%s params=%s", " AND ".join(where), params)
-        cur.execute(sql, tuple(params))
-        ids = [r[0] for r in cur.fetchall()]
-    else:
-        where = ["fts MATCH ?"]
-        params: List[object] = [qn]
-        if min_ts is not None:
-            where.append(f"{col} >= ?"); params.append(min_ts)
-        if scope_sql:
-            where.append(scope_sql); params.extend(scope_params)
-        sql = f"""SELECT m.chunk_id, bm25(fts) AS score
-                  FROM fts
-                  JOIN fts_map m ON m.rowid = fts.rowid
-                  JOIN chunks c  ON c.id    = m.chunk_id
-                  JOIN files  f  ON f.id    = c.file_id
-                  WHERE {" AND ".join(where)}
-                  ORDER BY score
-                  LIMIT ?"""
-        params.append(top_k)
-        log.debug("WHERE=%s params=%s", " AND ".join(where), params)
-        cur.execute(sql, tuple(params))
-        ids = [r[0] for r in cur.fetchall()]
+        # show-all: every file (text or not), newest first, via the recent-files path
+        files, _ = recent(con, top_k, path_prefixes=path_prefixes, min_ts=min_ts, time_field=time_field,
+                          filters=filters)
+        if not files:
+            if dbg: log.debug("fts show-all files=0")
+            return []
+        ph = ",".join("?" * len(files))
+        first = {fid: (cid, text) for fid, cid, text in cur.execute(
+            f"SELECT file_id, id, text FROM chunks WHERE ord = 0 AND file_id IN ({ph})", [f[0] for f in files])}
+        out = []
+        for fid, path, _size, ts in files:
+            cid, text = first.get(fid, (None, ""))
+            row = (cid, 0 if cid is not None else None, text, path)
+            out.append(row + (-ts,) if with_score else row)
+        if dbg: log.debug("fts show-all files=%d", len(out))
+        return out
+    where = ["fts MATCH ?"]
+    params: List[object] = [qn]
+    if min_ts is not None:
+        where.append(f"{col} >= ?"); params.append(min_ts)
+    if scope_sql:
+        where.append(scope_sql); params.extend(scope_params)
+    fsql, fparams = facets.where(facets.normalize(filters), "f")
+    if fsql:
+        where.append(fsql); params.extend(fparams)
+    sql = f"""SELECT m.chunk_id, bm25(fts) AS score
+              FROM fts
+              JOIN fts_map m ON m.rowid = fts.rowid
+              JOIN chunks c  ON c.id    = m.chunk_id
+              JOIN files  f  ON f.id    = c.file_id
+              WHERE {" AND ".join(where)}
+              ORDER BY score
+              LIMIT ?"""
+    params.append(top_k)
+    if dbg: log.debug("WHERE=%s params=%s", " AND ".join(where), params)
+    cur.execute(sql, tuple(params))
+    hits = cur.fetchall()
 
+    ids = [r[0] for r in hits]
     if not ids:
-        log.debug("fts ids=0; files=0")
+        if dbg: log.debug("fts ids=0; files=0")
         return []
 
     ph = ",".join("?" * len(ids))
@@ -107,16 +173,58 @@ def fts(
     rows = cur.fetchall()
 
     order = {cid: i for i, cid in enumerate(ids)}
+    score = {cid: sc for cid, sc in hits}
     rows.sort(key=lambda r: order.get(r[0], 1e9))
 
     best = {}
     for cid, ord_, text, path in rows:
-        best.setdefault(path, (cid, ord_, text, path))
+        if with_score:
+            best.setdefault(path, (cid, ord_, text, path, score.get(cid)))
+        else:
+            best.setdefault(path, (cid, ord_, text, path))
 
-    log.debug("fts ids=%d; files=%d", len(ids), len(best))
+    if dbg: log.debug("fts ids=%d; files=%d", len(ids), len(best))
     return list(best.values())
 
 
+def facet_cube(
+    con: sqlite3.Connection,
+    q: str,
+    *,
+    path_prefixes: Optional[List[str]] = None,
+    min_ts: Optional[int] = None,
+    time_field: str = "modified",
+    match_cap: int = FACET_MATCH_CAP,
+) -> list[tuple]:
+    """(ext, mime, size_bucket, files) for everything `q` matches under the scope/time filters.
+
+    Facet filters are deliberately not applied here: facets.marginals() does
+    that per field, so one aggregate per shard serves every facet. Show-all
+    is a GROUP BY over the covering idx_files_facets; a text query counts the
+    distinct files behind its first `match_cap` matching chunks.
+    """
+    col = "f.mtime" if time_field == "modified" else "f.ctime_eff"
+    where, params = [], []
+    if min_ts is not None:
+        where.append(f"{col} >= ?"); params.append(min_ts)
+    if path_prefixes:
+        ranges = [db.path_range(p) for p in path_prefixes]
+        where.append("(" + " OR ".join(["(f.path >= ? AND f.path < ?)"] * len(ranges)) + ")")
+        for lo, hi in ranges: params += [lo, hi]
+    qn = _normalize_fts_query(q)
+    if qn is not None:
+        where.insert(0, """f.id IN (SELECT c.file_id FROM fts
+                                    JOIN fts_map m ON m.rowid = fts.rowid
+                                    JOIN chunks c  ON c.id    = m.chunk_id
+                                    WHERE fts MATCH ? LIMIT ?)""")
+        params[:0] = [qn, match_cap]
+    sql = f"""SELECT f.ext, f.mime, f.size_bucket, COUNT(*)
+              FROM files f {"" if qn is not None else "INDEXED BY idx_files_facets"}
+              {("WHERE " + " AND ".join(where)) if where else ""}
+              GROUP BY f.ext, f.mime, f.size_bucket"""
+    return con.execute(sql, params).fetchall()
+
+
 def regex_filter(rows: Iterable[tuple], pattern: str, flags: int = re.IGNORECASE):
     rx = re.compile(pattern, flags)
     return [r for r in rows if rx.search(r[2])]
@@ -0,0 +1,274 @@
+# app/service.py — headless local HTTP/JSON search service
+#
+#   python -m app.service --port 8765
+#   GET /search?q=foo&top_k=50&scope=/home/me/src&min_ts=1700000000&field=modified
+#   GET /search?q=foo&ext=pdf&mime=image/&size=2&facets=1
+#   GET /meta?path=/home/me/src/x.py
+#   GET /similar?path=/home/me/src/x.py&threshold=0.6
+#   GET /stats[?root=/home/me/src]
+#   GET /browse?path=/home/me/src&sort=size[&after=<next from the previous page>]
+#   GET /metrics
+#   GET /health
+
+import argparse, json, threading, time, sqlite3, collections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from . import db, searcher, shards, facets, dirtree
+from .platform_paths import DB_PATH
+from .logging_conf import get_logger
+log = get_logger("service")
+
+
+class Metrics:
+    """Per-endpoint request counts, status codes and latency percentiles over a sliding window."""
+
+    def __init__(self, window: int = 2048):
+        self._lock = threading.Lock()
+        self._lat = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self._count = collections.Counter()
+        self._status = collections.Counter()
+        self._inflight = 0
+        self.started = time.time()
+
+    def begin(self):
+        with self._lock: self._inflight += 1
+
+    def end(self, endpoint: str, status: int, secs: float):
+        with self._lock:
+            self._inflight -= 1
+            self._count[endpoint] += 1
+            self._status[f"{endpoint} {status}"] += 1
+            self._lat[endpoint].append(secs)
+
+    @staticmethod
+    def _pct(sorted_vals, p):
+        if not sorted_vals: return None
+        i = min(len(sorted_vals) - 1, max(0, int(round(p / 100.0 * (len(sorted_vals) - 1)))))
+        return round(sorted_vals[i] * 1000, 2)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = {"uptime_s": round(time.time() - self.started, 1), "inflight": self._inflight,
+                   "status": dict(self._status), "endpoints": {}}
+            for ep, lat in self._lat.items():
+                vals = sorted(lat)
+                out["endpoints"][ep] = {
+                    "count": self._count[ep], "window": len(vals),
+                    "p50_ms": self._pct(vals, 50), "p90_ms": self._pct(vals, 90),
+                    "p99_ms": self._pct(vals, 99), "max_ms": self._pct(vals, 100),
+                }
+            return out
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, msg: str):
+        super().__init__(msg); self.status = status
+
+
+class SearchService:
+    """Query layer behind the HTTP handler: pooled read-only shards + limits + metrics."""
+
+    def __init__(self, db_path: str, *, pool_size: int = 4, max_concurrent: int = 8,
+                 timeout: float = 5.0, queue_wait: float = 1.0, top_k_max: int = 1000):
+        # schema/settings must exist before read-only connections can use them
+        con = db.connect(db_path); db.init(con); db.migrate(con)
+        try:
+            self.shards = shards.ShardSet.from_settings(con, db_path, pool_size=pool_size,
+                                                        workers=max_concurrent, partial_ok=False)
+            self.shards.init_all()
+        finally:
+            con.close()
+        # roots and layout change under us (GUI adds a root, switches shard mode):
+        # re-read them whenever the main DB has seen a commit since the last look
+        self._settings_con = db.connect_ro(db_path)
+        self._settings_ver = self._settings_con.execute("PRAGMA data_version").fetchone()[0]
+        self._settings_lock = threading.Lock()
+        self.timeout = timeout
+        self.queue_wait = queue_wait
+        self.top_k_max = top_k_max
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self.metrics = Metrics()
+
+    def close(self):
+        self.shards.close()
+        self._settings_con.close()
+
+    def _refresh_shards(self) -> None:
+        with self._settings_lock:
+            ver = self._settings_con.execute("PRAGMA data_version").fetchone()[0]
+            if ver == self._settings_ver: return
+            self._settings_ver = ver
+            try:
+                self.shards.reload(self._settings_con)
+            except (ValueError, sqlite3.Error):
+                log.warning("shard settings reload failed; keeping the current layout", exc_info=True)
+
+    # —— endpoints ——
+    def search(self, qs: dict, deadline: float) -> dict:
+        q = (qs.get("q") or [""])[0]
+        top_k = min(self.top_k_max, max(1, int((qs.get("top_k") or ["200"])[0])))
+        scopes = qs.get("scope") or None
+        min_ts = qs.get("min_ts")
+        field = (qs.get("field") or ["modified"])[0]
+        if field not in ("modified", "created"):
+            raise HTTPError(400, "field must be 'modified' or 'created'")
+        try:
+            filters = facets.normalize({"ext": qs.get("ext"), "mime": qs.get("mime"), "size_bucket": qs.get("size")})
+        except ValueError:
+            raise HTTPError(400, "size must be a size bucket number")
+        min_ts = int(min_ts[0]) if min_ts else None
+        try:
+            rows = self.shards.fts(q, top_k=top_k, path_prefixes=scopes, min_ts=min_ts,
+                                   time_field=field, with_score=True, filters=filters, deadline=deadline)
+        except sqlite3.OperationalError:
+            # a malformed MATCH expression is the client's fault, anything else is ours
+            bad = searcher.query_error(q)
+            if bad: raise HTTPError(400, f"bad query: {bad}")
+            raise
+        rx = (qs.get("regex") or [None])[0]
+        if rx:
+            rows = searcher.regex_filter(rows, rx)
+        dups = {}
+        if (qs.get("collapse") or ["0"])[0] in ("1", "true"):
+            rows, dups = self.shards.collapse(rows, deadline=deadline)
+        out = {}
+        if (qs.get("facets") or ["0"])[0] in ("1", "true"):
+            out["facets"] = {f: [{"value": v, "count": n, "label": lbl} for v, n, lbl in vals]
+                             for f, vals in self.shards.facet_counts(q, path_prefixes=scopes, min_ts=min_ts,
+                                                                     time_field=field, filters=filters,
+                                                                     deadline=deadline).items()}
+        return {"q": q, "count": len(rows), **out,
+                "results": [{"chunk_id": cid, "ord": ord_, "path": path, "score": score,
+                             "snippet": text[:300], **({"duplicates": dups[path]} if path in dups else {})}
+                            for cid, ord_, text, path, score in rows]}
+
+    def similar(self, qs: dict, deadline: float) -> dict:
+        path = (qs.get("path") or [""])[0]
+        if not path: raise HTTPError(400, "missing path")
+        threshold = float((qs.get("threshold") or ["0.6"])[0])
+        limit = min(self.top_k_max, max(1, int((qs.get("limit") or ["100"])[0])))
+        rows = self.shards.similar_to(path, threshold, limit, deadline=deadline)
+        return {"path": path, "count": len(rows),
+                "results": [{"path": p, "similarity": round(sim, 3)} for p, sim in rows]}
+
+    def meta(self, qs: dict, deadline: float) -> dict:
+        path = (qs.get("path") or [""])[0]
+        if not path: raise HTTPError(400, "missing path")
+        meta = self.shards.file_meta(path, deadline=deadline)
+        if meta is None: raise HTTPError(404, "not indexed")
+        return {"path": path, **meta}
+
+    def stats(self, qs: dict, deadline: float) -> dict:
+        root = (qs.get("root") or [None])[0]
+        if root:
+            return {"root": root, **self.shards.counts_for_root(root, deadline=deadline)}
+        return self.shards.totals(deadline=deadline)
+
+    def browse(self, qs: dict, deadline: float) -> dict:
+        path = (qs.get("path") or [None])[0]
+        sort = (qs.get("sort") or ["name"])[0]
+        if sort not in dirtree.SORTS:
+            raise HTTPError(400, f"sort must be one of {', '.join(dirtree.SORTS)}")
+        limit = min(self.top_k_max, max(1, int((qs.get("limit") or [str(dirtree.PAGE_DEFAULT)])[0])))
+        after = (qs.get("after") or [None])[0]
+        try:
+            after = tuple(json.loads(after)) if after else None
+        except (ValueError, TypeError):
+            raise HTTPError(400, "after must be the JSON cursor from the previous page")
+        res = self.shards.browse(path, sort=sort, limit=limit, after=after, deadline=deadline)
+        if path is not None and res["dir"] is None and not res["dirs"]:
+            raise HTTPError(404, "not indexed")
+        tot = res["dir"]
+        return {"path": path,
+                **({"size": tot[0], "files": tot[1], "newest": tot[2]} if tot else {}),
+                "dirs": [{"path": p, "size": sz, "files": n, "newest": nw} for p, sz, n, nw in res["dirs"]],
+                "entries": [{"path": p, "size": sz, "mtime": mt} for p, sz, mt in res["files"]],
+                "next": json.dumps(res["next"]) if res["next"] else None}
+
+    ROUTES = {"/search": "search", "/meta": "meta", "/stats": "stats", "/similar": "similar", "/browse": "browse"}
+
+    def handle(self, path: str, qs: dict) -> tuple[int, dict]:
+        if path == "/health":
+            return 200, {"ok": True}
+        if path == "/metrics":
+            return 200, self.metrics.snapshot()
+        name = self.ROUTES.get(path)
+        if name is None:
+            return 404, {"error": "unknown endpoint"}
+        if not self._slots.acquire(timeout=self.queue_wait):
+            return 503, {"error": "busy"}
+        try:
+            deadline = time.monotonic() + self.timeout
+            self._refresh_shards()
+            return 200, getattr(self, name)(qs, deadline)
+        except HTTPError as e:
+            return e.status, {"error": str(e)}
+        except (ValueError, TypeError) as e:
+            return 400, {"error": str(e)}
+        except db.PoolTimeout:
+            return 503, {"error": "busy"}
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                return 504, {"error": f"timeout after {self.timeout}s"}
+            log.warning("query failed path=%s", path, exc_info=True)
+            return 500, {"error": str(e)}
+        finally:
+            self._slots.release()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: SearchService = None   # set by make_server()
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        t0 = time.perf_counter()
+        svc = self.service
+        svc.metrics.begin()
+        u = urlsplit(self.path)
+        try:
+            status, body = svc.handle(u.path, parse_qs(u.query))
+        except Exception as e:
+            log.warning("unhandled error path=%s", u.path, exc_info=True)
+            status, body = 500, {"error": str(e)}
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        svc.metrics.end(u.path, status, time.perf_counter() - t0)
+
+    def log_message(self, fmt, *args):
+        log.debug("http " + fmt, *args)
+
+
+def make_server(db_path: str, host: str = "127.0.0.1", port: int = 8765, **kw) -> ThreadingHTTPServer:
+    svc = SearchService(db_path, **kw)
+    handler = type("Handler", (_Handler,), {"service": svc})
+    srv = ThreadingHTTPServer((host, port), handler)
+    srv.daemon_threads = True
+    srv.service = svc
+    return srv
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="SuperFileManager headless search service")
+    p.add_argument("--db", default=DB_PATH)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--pool-size", type=int, default=4, help="read-only connections per shard")
+    p.add_argument("--max-concurrent", type=int, default=8, help="queries executing at once")
+    p.add_argument("--timeout", type=float, default=5.0, help="per-request query timeout (s)")
+    args = p.parse_args(argv)
+
+    srv = make_server(args.db, args.host, args.port, pool_size=args.pool_size,
+                      max_concurrent=args.max_concurrent, timeout=args.timeout)
+    print(f"serving {args.db} on http://{args.host}:{args.port}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close(); srv.service.close()
+
+if __name__ == "__main__": main()
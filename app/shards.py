@@ -0,0 +1,344 @@
+# app/shards.py — optional per-root / hash-partitioned index shards + federated search
+
+import os, hashlib, threading, contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from . import db, searcher, similar, facets, dirtree
+from .logging_conf import get_logger
+log = get_logger("shards")
+
+# "single"   -> everything in the main state.sqlite (historical layout)
+# "per_root" -> one shard file per indexed root
+# "hash"     -> roots hash-partitioned into a fixed number of shard files
+MODES = ("single", "per_root", "hash")
+SHARD_COUNT_DEFAULT = 4
+
+
+def _fold(path: str) -> str:
+    # shard *choice* only (file names, scope overlap): Windows paths are
+    # case-insensitive, stored paths and root lists keep their case (db.path_key)
+    return os.path.normcase(path)
+
+def _digest(s: str) -> str:
+    return hashlib.sha1(s.encode("utf-8", "surrogatepass")).hexdigest()
+
+def _overlaps(root_prefix: str, scope_prefix: str) -> bool:
+    # scope inside root, or root inside scope
+    return scope_prefix.startswith(root_prefix) or root_prefix.startswith(scope_prefix)
+
+
+class ShardSet:
+    """Maps indexed roots to SQLite shard files and fans searches out across them.
+
+    Settings stay in the main database; shards only hold files/chunks/fts.
+    """
+
+    def __init__(self, db_path: str, mode: str = "single", count: int = SHARD_COUNT_DEFAULT,
+                 roots: Optional[List[str]] = None, workers: Optional[int] = None,
+                 pool_size: int = 0, partial_ok: bool = True):
+        if mode not in MODES: raise ValueError(f"unknown shard mode: {mode}")
+        self.db_path = db_path
+        self.mode = mode
+        self.count = max(1, int(count))
+        self.roots = [db.path_key(r) for r in (roots or [])]
+        self.shard_dir = os.path.join(os.path.dirname(os.path.abspath(db_path)), "shards")
+        self._workers = workers
+        self.pool_size = pool_size          # >0: read-only pooled connections instead of per-thread
+        self.partial_ok = partial_ok        # log + skip a failing shard instead of raising
+        self._pools: dict = {}
+        self._pool: ThreadPoolExecutor | None = None
+        self._tls = threading.local()
+        self._lock = threading.Lock()
+        self._open: list = []
+
+    @classmethod
+    def from_settings(cls, con, db_path: str, **kw) -> "ShardSet":
+        return cls(db_path,
+                   mode=db.get_setting(con, "shard_mode", "single"),
+                   count=db.get_setting(con, "shard_count", SHARD_COUNT_DEFAULT),
+                   roots=db.get_setting(con, "shard_roots", []), **kw)
+
+    def reload(self, con) -> bool:
+        """Re-read mode/count/roots from the main DB settings; True when the layout changed."""
+        mode = db.get_setting(con, "shard_mode", "single")
+        count = max(1, int(db.get_setting(con, "shard_count", SHARD_COUNT_DEFAULT)))
+        roots = [db.path_key(r) for r in db.get_setting(con, "shard_roots", [])]
+        if (mode, count, roots) == (self.mode, self.count, self.roots):
+            return False
+        if mode not in MODES: raise ValueError(f"unknown shard mode: {mode}")
+        # pools are keyed by shard path: entries for shards still in use stay valid
+        with self._lock:
+            self.mode, self.count, self.roots = mode, count, roots
+        log.info("shard settings reloaded mode=%s count=%d roots=%d", mode, count, len(roots))
+        return True
+
+    # —— routing ——
+    def path_for_root(self, root: str) -> str:
+        key = _fold(db.path_key(root))
+        if self.mode == "per_root":
+            return os.path.join(self.shard_dir, f"root-{_digest(key)[:16]}.sqlite")
+        if self.mode == "hash":
+            n = int(_digest(key)[:8], 16) % self.count
+            return os.path.join(self.shard_dir, f"part-{n:02d}.sqlite")
+        return self.db_path
+
+    def register_root(self, con, root: str) -> str:
+        """Remember `root` (persisted in the main DB settings) and return its shard path."""
+        key = db.path_key(root)
+        known = lambda roots: any(_fold(r) == _fold(key) for r in roots or [])
+        if not known(self.roots):
+            # merge into the stored list: another process may have registered roots since we loaded it
+            self.roots = db.update_setting(con, "shard_roots",
+                                           lambda cur: (cur or []) + ([] if known(cur) else [key]), [])
+        return self.path_for_root(key)
+
+    def paths(self) -> List[str]:
+        if self.mode == "single":
+            return [self.db_path]
+        if self.mode == "hash":
+            return [os.path.join(self.shard_dir, f"part-{n:02d}.sqlite") for n in range(self.count)]
+        out = []
+        for r in self.roots:
+            p = self.path_for_root(r)
+            if p not in out: out.append(p)
+        return out
+
+    def paths_for_scopes(self, path_prefixes: Optional[List[str]]) -> List[str]:
+        """Only the shards whose roots can contain files under the given scopes."""
+        if not path_prefixes or self.mode == "single":
+            return self.paths()
+        scopes = [_fold(db.path_prefix(p)) for p in path_prefixes]
+        out = []
+        for r in self.roots:
+            rp = _fold(db.path_prefix(r))
+            if any(_overlaps(rp, sp) for sp in scopes):
+                p = self.path_for_root(r)
+                if p not in out: out.append(p)
+        return out
+
+    # —— connections ——
+    def connect(self, path: str, **kw):
+        """Writer-style connection to one shard with schema + migrations applied."""
+        con = db.connect(path, **kw); db.init(con)
+        db.migrate(con)
+        return con
+
+    def init_all(self) -> None:
+        """Create/migrate every known shard (the main DB is migrated by the caller)."""
+        for p in self.paths():
+            con = self.connect(p); con.close()
+
+    def _existing(self, paths: List[str]) -> List[str]:
+        return [p for p in paths if p == self.db_path or os.path.exists(p)]
+
+    @contextlib.contextmanager
+    def _reading(self, path: str, deadline: float | None = None):
+        if self.pool_size:
+            # read-only pool per shard (headless service)
+            with self._lock:
+                pool = self._pools.get(path)
+                if pool is None:
+                    pool = self._pools[path] = db.ReadPool(path, self.pool_size)
+            with pool.connection(deadline) as con:
+                yield con
+            return
+        # one connection per (worker thread, shard)
+        cons = getattr(self._tls, "cons", None)
+        if cons is None:
+            cons = self._tls.cons = {}
+        con = cons.get(path)
+        if con is None:
+            con = cons[path] = self.connect(path, check_same_thread=False)
+            with self._lock: self._open.append(con)
+        yield con
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                n = self._workers or min(8, max(2, len(self.paths())))
+                self._pool = ThreadPoolExecutor(max_workers=n, thread_name_prefix="shard")
+            return self._pool
+
+    def _map(self, fn, paths: List[str], deadline: float | None = None) -> list:
+        def run(p):
+            with self._reading(p, deadline) as con:
+                return fn(con)
+        futs = [self._executor().submit(run, p) for p in paths]
+        out = []
+        for p, fut in zip(paths, futs):
+            try:
+                out.append(fut.result())
+            except Exception:
+                if not self.partial_ok: raise
+                log.warning("shard query failed path=%s", p, exc_info=True)
+                out.append(None)
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+            for con in self._open:
+                try: con.close()
+                except Exception: pass
+            self._open = []
+            for pool in self._pools.values(): pool.close()
+            self._pools = {}
+
+    # —— federated queries ——
+    def fts(self, q: str, top_k: int = 200, *, path_prefixes=None, min_ts=None,
+            time_field: str = "modified", with_score: bool = False, filters: dict | None = None,
+            deadline: float | None = None) -> list[tuple]:
+        paths = self._existing(self.paths_for_scopes(path_prefixes))
+        if not paths:
+            return []
+
+        def one(con):
+            return searcher.fts(con, q, top_k=top_k, path_prefixes=path_prefixes,
+                                min_ts=min_ts, time_field=time_field, with_score=True, filters=filters)
+
+        best = {}
+        for rows in self._map(one, paths, deadline):
+            for r in rows or ():
+                cur = best.get(r[3])
+                if cur is None or r[4] < cur[4]:
+                    best[r[3]] = r
+        merged = sorted(best.values(), key=lambda r: r[4])[:top_k]
+        log.debug("federated fts shards=%d files=%d", len(paths), len(merged))
+        return merged if with_score else [r[:4] for r in merged]
+
+    def recent(self, limit: int = 200, *, path_prefixes=None, min_ts=None,
+               time_field: str = "modified", after: tuple | None = None, filters: dict | None = None,
+               deadline: float | None = None) -> tuple[list[tuple], tuple | None]:
+        """Newest files across shards; each shard returns one keyset page, merged by (ts, path) desc."""
+        paths = self._existing(self.paths_for_scopes(path_prefixes))
+        if not paths:
+            return [], None
+
+        def one(con):
+            return searcher.recent(con, limit, path_prefixes=path_prefixes, min_ts=min_ts,
+                                   time_field=time_field, after=after, filters=filters)
+
+        pages = [p for p in self._map(one, paths, deadline) if p]
+        rows = sorted((r for page, _ in pages for r in page), key=lambda r: (r[3], r[1]), reverse=True)[:limit]
+        more = len(rows) == limit and (any(nxt for _, nxt in pages) or len(rows) < sum(len(pg) for pg, _ in pages))
+        return rows, ((rows[-1][3], rows[-1][1]) if more else None)
+
+    def facet_counts(self, q: str, *, path_prefixes=None, min_ts=None, time_field: str = "modified",
+                     filters: dict | None = None, limit: int = 20, deadline: float | None = None) -> dict:
+        """{field: [(value, files, label), ...]} for ext / mime / size_bucket, summed over shards."""
+        paths = self._existing(self.paths_for_scopes(path_prefixes))
+        cubes = self._map(lambda con: searcher.facet_cube(con, q, path_prefixes=path_prefixes, min_ts=min_ts,
+                                                          time_field=time_field), paths, deadline) if paths else []
+        return facets.marginals(facets.merge_cubes(cubes), filters, limit)
+
+    def collapse(self, rows: list[tuple], threshold: float = similar.THRESHOLD_DEFAULT,
+                 deadline: float | None = None) -> tuple[list[tuple], dict]:
+        """Drop near-duplicate files from ranked `rows` (path at r[3]); returns (rows, {path: [dups]})."""
+        paths = [r[3] for r in rows]
+        if not paths:
+            return rows, {}
+        sigs = {}
+        for d in self._map(lambda con: similar.sigs_for_paths(con, paths), self._existing(self.paths()), deadline):
+            sigs.update(d or {})
+        kept, dups = similar.group(paths, sigs, threshold)
+        keep = set(kept)
+        return [r for r in rows if r[3] in keep], dups
+
+    def similar_to(self, path: str, threshold: float = similar.THRESHOLD_DEFAULT, limit: int = 100,
+                deadline: float | None = None) -> list[tuple[str, float]]:
+        """Files across all shards whose MinHash estimate vs `path` is >= threshold, most similar first."""
+        sig = self.on_file(path, lambda con: similar.sig_for_path(con, path), deadline)
+        if sig is None:
+            return []
+        out = []
+        for rows in self._map(lambda con: similar.candidates(con, sig, threshold, limit, exclude=path),
+                              self._existing(self.paths()), deadline):
+            out.extend(rows or ())
+        out.sort(key=lambda r: (-r[1], r[0]))
+        return out[:limit]
+
+    def browse(self, path: str | None, *, sort: str = "name", limit: int = dirtree.PAGE_DEFAULT,
+               after: tuple | None = None, deadline: float | None = None) -> dict:
+        """Directory listing served from the index rollups, merged across shards.
+
+        {"dir": (size, files, newest) or None, "dirs": [(path, size, files, newest)],
+         "files": [(path, size, mtime)], "next": files cursor or None}; path=None lists the tops.
+        """
+        paths = self._existing(self.paths() if path is None else self.paths_for_scopes([path]))
+        if path is None:
+            parts = self._map(lambda con: (None, dirtree.tops(con), ([], None)), paths, deadline)
+        else:
+            parts = self._map(lambda con: (dirtree.info(con, path), dirtree.subdirs(con, path),
+                                           dirtree.files(con, path, sort=sort, limit=limit, after=after)),
+                              paths, deadline)
+        total, subdirs, pages = None, {}, []
+        for part in parts:
+            if not part: continue
+            info, subs, page = part
+            if info:
+                t = total or [0, 0, None]
+                t[0] += info[2]; t[1] += info[3]
+                if info[4] is not None and (t[2] is None or info[4] > t[2]): t[2] = info[4]
+                total = t
+            for p, size, n, newest in subs:
+                cur = subdirs.get(p)
+                subdirs[p] = (p, size, n, newest) if cur is None else \
+                    (p, cur[1] + size, cur[2] + n, max((v for v in (cur[3], newest) if v is not None), default=None))
+            pages.append(page)
+        key, rev = dirtree.merge_key(sort)
+        rows = sorted((r for page, _ in pages for r in page), key=key, reverse=rev)[:limit]
+        more = len(rows) == limit and (any(nxt for _, nxt in pages) or len(rows) < sum(len(pg) for pg, _ in pages))
+        nxt = None
+        if more:
+            last = rows[-1]
+            nxt = (last[0],) if sort == "name" else ((last[1] if sort == "size" else last[2]), last[0])
+        return {"dir": tuple(total) if total else None, "dirs": list(subdirs.values()), "files": rows, "next": nxt}
+
+    def rebuild_dirs(self) -> int:
+        """Recompute the directory rollups of every shard (writer connections, one at a time)."""
+        n = 0
+        for p in self._existing(self.paths()):
+            con = self.connect(p)
+            try: n += dirtree.rebuild(con)
+            finally: con.close()
+        return n
+
+    def has_files(self) -> bool:
+        """Whether any shard of this layout holds files; an unreadable shard counts as non-empty."""
+        res = self._map(lambda con: con.execute("SELECT 1 FROM files LIMIT 1").fetchone() is not None,
+                        self._existing(self.paths()))
+        return any(r is not False for r in res)
+
+    def _sum_counts(self, results) -> dict:
+        tot = {"files_total": 0, "files_text": 0, "chunks": 0, "last_indexed_at": None}
+        for d in results:
+            if not d: continue
+            for k in ("files_total", "files_text", "chunks"): tot[k] += d[k]
+            if d["last_indexed_at"] and (tot["last_indexed_at"] or 0) < d["last_indexed_at"]:
+                tot["last_indexed_at"] = d["last_indexed_at"]
+        return tot
+
+    def each(self, fn, paths: Optional[List[str]] = None) -> list:
+        """Run fn(con) on every existing shard (or `paths`) in parallel; one result per shard."""
+        return self._map(fn, self._existing(paths if paths is not None else self.paths()))
+
+    def counts_for_root(self, root: str, deadline: float | None = None) -> dict:
+        paths = self._existing(self.paths_for_scopes([root]))
+        return self._sum_counts(self._map(lambda con: db.counts_for_root(con, root), paths, deadline))
+
+    def totals(self, deadline: float | None = None) -> dict:
+        d = self._sum_counts(self._map(db.totals, self._existing(self.paths()), deadline))
+        d["shards"] = len(self._existing(self.paths()))
+        return d
+
+    def on_file(self, path: str, fn, deadline: float | None = None):
+        """fn(con) on the first shard that could hold `path` returning something truthy."""
+        for p in self._existing(self.paths_for_scopes([os.path.dirname(path)])):
+            out = self._map(fn, [p], deadline)[0]
+            if out: return out
+        return None
+
+    def file_meta(self, path: str, deadline: float | None = None):
+        return self.on_file(path, lambda con: db.file_meta(con, path), deadline)
@@ -0,0 +1,169 @@
+# app/similar.py — near-duplicate detection: MinHash signatures + LSH bands
+#
+# A signature is SLOTS uint32 minima over word shingles of the normalized text
+# (one-permutation hashing: a shingle's crc32 picks its slot and value, empty
+# slots are densified from the next filled one), so it is built in one pass
+# with no per-permutation loop. The fraction of equal slots estimates the
+# Jaccard similarity of two files' shingle sets.
+#
+# sig_bands holds one key per (band, BAND_ROWS slots): two files that share a
+# key are candidates, which turns "find similar" into index lookups instead
+# of a scan over every signature.
+
+import zlib, sqlite3
+from array import array
+from .logging_conf import get_logger
+log = get_logger("similar")
+
+SLOTS      = 64
+BANDS      = 16
+BAND_ROWS  = SLOTS // BANDS     # 16×4: pairs around 0.5 Jaccard start to collide
+SHINGLE    = 4                  # words per shingle
+MIN_SHINGLES = 8                # shorter texts get an empty (unmatched) signature
+THRESHOLD_DEFAULT = 0.6
+
+_SLOT_BITS = SLOTS.bit_length() - 1
+_STRIDE    = 1 << (32 - _SLOT_BITS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_sigs(file_id INTEGER PRIMARY KEY, sig BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS sig_bands(
+  key INTEGER NOT NULL, file_id INTEGER NOT NULL,
+  PRIMARY KEY(key, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sig_bands_file ON sig_bands(file_id);
+"""
+
+
+def signature(text: str) -> array | None:
+    """MinHash signature of `text` (already normalized by extract), or None if too short."""
+    words = text.split()
+    n = len(words) - SHINGLE + 1
+    if n < MIN_SHINGLES:
+        return None
+    mins = [0xFFFFFFFF] * SLOTS
+    mask = SLOTS - 1
+    crc = zlib.crc32
+    for i in range(n):
+        h = crc(" ".join(words[i:i + SHINGLE]).encode("utf-8", "surrogatepass"))
+        s = h & mask; v = h >> _SLOT_BITS
+        if v < mins[s]: mins[s] = v
+    # densify: an empty slot borrows the next filled one, offset so it stays distinct
+    for j in range(SLOTS):
+        if mins[j] == 0xFFFFFFFF:
+            for t in range(1, SLOTS):
+                v = mins[(j + t) % SLOTS]
+                if v != 0xFFFFFFFF and v < _STRIDE:
+                    mins[j] = v + t * _STRIDE; break
+    return array("I", mins)
+
+def band_keys(sig: array) -> list[int]:
+    return [(b << 32) | zlib.crc32(sig[b * BAND_ROWS:(b + 1) * BAND_ROWS].tobytes()) for b in range(BANDS)]
+
+def similarity(a: array, b: array) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / SLOTS
+
+def from_blob(blob: bytes | None) -> array | None:
+    if not blob: return None
+    a = array("I"); a.frombytes(blob)
+    return a if len(a) == SLOTS else None
+
+
+# —— storage ——
+def store(cur: sqlite3.Cursor, fid: int, sig: array | None) -> None:
+    """Replace the signature for `fid`; None stores an empty marker so backfill skips it."""
+    drop(cur, fid)
+    cur.execute("INSERT INTO file_sigs(file_id, sig) VALUES(?,?)", (fid, sig.tobytes() if sig is not None else b""))
+    if sig is not None:
+        cur.executemany("INSERT OR IGNORE INTO sig_bands(key, file_id) VALUES(?,?)",
+                        [(k, fid) for k in band_keys(sig)])
+
+def drop(cur: sqlite3.Cursor, fid: int) -> None:
+    cur.execute("DELETE FROM sig_bands WHERE file_id=?", (fid,))
+    cur.execute("DELETE FROM file_sigs WHERE file_id=?", (fid,))
+
+def drop_many(cur: sqlite3.Cursor, fids: list[int]) -> None:
+    if not fids: return
+    ph = ",".join("?" * len(fids))
+    cur.execute(f"DELETE FROM sig_bands WHERE file_id IN ({ph})", fids)
+    cur.execute(f"DELETE FROM file_sigs WHERE file_id IN ({ph})", fids)
+
+def backfill(con: sqlite3.Connection, path_range: tuple[str, str] | None = None,
+             limit: int | None = None, stop_event=None) -> int:
+    """Compute signatures for files that have chunks but no signature yet."""
+    where, params = "", []
+    if path_range:
+        where = "AND f.path >= ? AND f.path < ?"; params = list(path_range)
+    sql = f"""SELECT f.id FROM files f
+              WHERE EXISTS (SELECT 1 FROM chunks c WHERE c.file_id = f.id)
+                AND NOT EXISTS (SELECT 1 FROM file_sigs s WHERE s.file_id = f.id) {where}"""
+    if limit: sql += f" LIMIT {int(limit)}"
+    fids = [r[0] for r in con.execute(sql, params).fetchall()]
+    cur = con.cursor(); n = 0
+    for fid in fids:
+        if stop_event and stop_event.is_set(): break
+        text = "".join(t for (t,) in cur.execute("SELECT text FROM chunks WHERE file_id=? ORDER BY ord", (fid,)))
+        store(cur, fid, signature(text)); n += 1
+        if n % 500 == 0: con.commit()
+    con.commit()
+    if n: log.debug("backfill signatures=%d", n)
+    return n
+
+
+# —— queries ——
+def sig_for_path(con: sqlite3.Connection, path: str) -> array | None:
+    row = con.execute("SELECT s.sig FROM file_sigs s JOIN files f ON f.id = s.file_id WHERE f.path=?",
+                      (path,)).fetchone()
+    return from_blob(row[0]) if row else None
+
+def sigs_for_paths(con: sqlite3.Connection, paths: list[str]) -> dict:
+    out = {}
+    for i in range(0, len(paths), 500):
+        part = paths[i:i + 500]
+        ph = ",".join("?" * len(part))
+        for path, blob in con.execute(f"""SELECT f.path, s.sig FROM files f JOIN file_sigs s ON s.file_id = f.id
+                                          WHERE f.path IN ({ph})""", part):
+            sig = from_blob(blob)
+            if sig is not None: out[path] = sig
+    return out
+
+def candidates(con: sqlite3.Connection, sig: array, threshold: float = THRESHOLD_DEFAULT,
+               limit: int = 100, exclude: str | None = None) -> list[tuple[str, float]]:
+    """Files sharing at least one LSH band with `sig` whose estimated similarity is >= threshold."""
+    keys = band_keys(sig)
+    ph = ",".join("?" * len(keys))
+    fids = [r[0] for r in con.execute(f"SELECT DISTINCT file_id FROM sig_bands WHERE key IN ({ph})", keys)]
+    out = []
+    for i in range(0, len(fids), 500):
+        part = fids[i:i + 500]
+        ph = ",".join("?" * len(part))
+        for path, blob in con.execute(f"""SELECT f.path, s.sig FROM file_sigs s JOIN files f ON f.id = s.file_id
+                                          WHERE s.file_id IN ({ph})""", part):
+            other = from_blob(blob)
+            if other is None or path == exclude: continue
+            sim = similarity(sig, other)
+            if sim >= threshold: out.append((path, sim))
+    out.sort(key=lambda r: (-r[1], r[0]))
+    return out[:limit]
+
+def group(paths: list[str], sigs: dict, threshold: float = THRESHOLD_DEFAULT) -> tuple[list[str], dict]:
+    """Greedy clustering in rank order: (kept paths, {kept path: [near-duplicate paths]})."""
+    buckets: dict[int, list[str]] = {}
+    kept, dups = [], {}
+    for p in paths:
+        sig = sigs.get(p)
+        if sig is None:
+            kept.append(p); continue
+        keys = band_keys(sig)
+        leader = None
+        for k in keys:
+            for q in buckets.get(k, ()):
+                if similarity(sig, sigs[q]) >= threshold:
+                    leader = q; break
+            if leader: break
+        if leader:
+            dups.setdefault(leader, []).append(p)
+        else:
+            kept.append(p)
+            for k in keys: buckets.setdefault(k, []).append(p)
+    return kept, dups
@@ -0,0 +1,270 @@
+# app/snapshot.py — portable index snapshots: online export + merging import
+#
+# Export copies each shard with the SQLite online backup API (a few pages per
+# step, so the indexer and searches keep running), optionally cuts the copy
+# down to some roots, and leaves one self-contained rollback-journal file:
+# files/chunks/fts/signatures only, no settings, failures or schedules.
+#
+# Import remaps path prefixes (another machine, another OS) and merges file by
+# file: identical blake3 -> keep, newer mtime in the snapshot -> replace,
+# otherwise the local row wins. Imported rows carry no inode, so the next
+# index run on this machine accepts them on size+mtime (adopting the local
+# inode) and only extracts files that really differ.
+
+import os, time, sqlite3
+from . import db, similar, shards, dirtree
+from .logging_conf import get_logger
+log = get_logger("snapshot")
+
+PAGES_PER_STEP = 256          # backup step size (pages); smaller = shorter write-lock holds
+INFO_KEY       = "snapshot"   # settings row describing the snapshot
+COMMIT_EVERY   = 500
+
+_FILE_COLS = ("path", "size", "mtime", "created_at", "mime", "sha1", "status", "last_seen",
+              "blake3", "hash_checked_at", "last_indexed_at", "char_offsets")
+
+
+class Cancelled(Exception):
+    pass
+
+
+def _tables(con) -> set:
+    return {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+def _rm(path: str) -> None:
+    for p in (path, path + "-journal", path + "-wal", path + "-shm"):
+        try: os.remove(p)
+        except FileNotFoundError: pass
+
+def remap_path(path: str, remap) -> str:
+    """Apply the first matching (old_prefix, new_prefix) pair, on path-component boundaries.
+
+    The remainder is converted to this OS's separator when the old prefix is
+    from the other family (C:\\... vs /...).
+    """
+    for old, new in remap or ():
+        o = old.rstrip("\\/")
+        if path == o or (path.startswith(o) and path[len(o):len(o) + 1] in ("\\", "/")):
+            rest = path[len(o):]
+            src_sep = "\\" if ("\\" in old or old[1:2] == ":") else "/"
+            if src_sep != os.sep:
+                rest = rest.replace(src_sep, os.sep)
+            return new.rstrip("\\/") + rest
+    return path
+
+def parse_map(specs) -> list[tuple[str, str]]:
+    """["OLD=NEW", ...] -> [(old, new), ...], longest prefix first."""
+    pairs = []
+    for s in specs or ():
+        old, sep, new = s.partition("=")
+        if not sep or not old or not new:
+            raise ValueError(f"bad path mapping (want OLD=NEW): {s}")
+        pairs.append((old, new))
+    return sorted(pairs, key=lambda p: -len(p[0]))
+
+def info(path: str) -> dict:
+    """The snapshot's own description (roots, created_at, schema) plus counts."""
+    con = db.connect_ro(path)
+    try:
+        out = dict(db.get_setting(con, INFO_KEY, {}) or {})
+        out["schema"] = db.schema_version(con)
+        out["files"] = con.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        out["chunks"] = con.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return out
+    finally:
+        con.close()
+
+
+# —— export ——
+def _backup(src_path: str, dst: sqlite3.Connection, pages: int, sleep: float, report, stop_event) -> None:
+    def step(status, remaining, total):
+        report("copy", total - remaining, total)
+        if stop_event and stop_event.is_set():
+            raise Cancelled("export cancelled")
+        if sleep and remaining:
+            time.sleep(sleep)
+    src = db.connect_ro(src_path)
+    try:
+        src.backup(dst, pages=max(1, int(pages)), progress=step)
+    finally:
+        src.close()
+
+def _derive_roots(con) -> list[str]:
+    lo, hi = con.execute("SELECT MIN(path), MAX(path) FROM files").fetchone()
+    if lo is None: return []
+    try:
+        return [os.path.commonpath([os.path.dirname(lo), os.path.dirname(hi)])]
+    except ValueError:      # different drives
+        return [os.path.dirname(lo), os.path.dirname(hi)]
+
+def _subset(con, roots: list[str]) -> int:
+    """Drop everything outside `roots` and rebuild the (contentless) fts from chunks."""
+    ranges = [db.path_range(r) for r in roots]
+    keep = " OR ".join("(path >= ? AND path < ?)" for _ in ranges)
+    n = con.execute(f"DELETE FROM files WHERE NOT ({keep})", [x for r in ranges for x in r]).rowcount
+    con.execute("DELETE FROM chunks WHERE file_id NOT IN (SELECT id FROM files)")
+    if "file_sigs" in _tables(con):
+        con.execute("DELETE FROM file_sigs WHERE file_id NOT IN (SELECT id FROM files)")
+        con.execute("DELETE FROM sig_bands WHERE file_id NOT IN (SELECT id FROM files)")
+    # a contentless index cannot drop postings without their text: start over
+    con.execute("INSERT INTO fts(fts) VALUES('delete-all')")
+    con.execute("DELETE FROM fts_map")
+    con.execute("INSERT INTO fts(rowid, text) SELECT id, text FROM chunks")
+    con.execute("INSERT INTO fts_map(rowid, chunk_id) SELECT id, id FROM chunks")
+    return n
+
+def export(main_con, sset, dest: str, *, roots: list[str] | None = None, pages: int = PAGES_PER_STEP,
+           sleep: float = 0.0, progress=None, stop_event=None) -> dict:
+    """Write a snapshot of the index (or just `roots`) to `dest`.
+
+    `pages`/`sleep` throttle the copy; progress(phase, done, total) is called
+    per backup step and per merged batch. Raises Cancelled on stop_event.
+    """
+    t0 = time.time()
+    report = progress or (lambda *_a: None)
+    roots = [os.path.abspath(r) for r in roots] if roots else None
+    srcs = sset._existing(sset.paths_for_scopes(roots) if roots else sset.paths())
+    if not srcs:
+        raise ValueError("nothing indexed for the requested roots")
+    tmp = dest + ".part"
+    _rm(tmp)
+    out = sqlite3.connect(tmp)
+    try:
+        _backup(srcs[0], out, pages, sleep, report, stop_event)
+        out.execute("PRAGMA journal_mode=DELETE")
+        db.migrate(out)     # bring an older shard up to this schema before merging into it
+        for extra in srcs[1:]:
+            part = tmp + ".shard"
+            _rm(part)
+            scon = sqlite3.connect(part)
+            try:
+                _backup(extra, scon, pages, sleep, report, stop_event)
+            finally:
+                scon.close()
+            src = sqlite3.connect(part)
+            try:
+                merge(src, lambda _p: out, progress=report, stop_event=stop_event)
+            finally:
+                src.close(); _rm(part)
+            if stop_event and stop_event.is_set():
+                raise Cancelled("export cancelled")
+        report("subset", 0, 1)
+        dropped = _subset(out, roots) if roots else 0
+        for t in ("index_failures", "roots", "settings"):
+            if t in _tables(out): out.execute(f"DELETE FROM {t}")
+        out.commit()
+        meta = {"roots": roots or sset.roots or _derive_roots(out), "created_at": int(time.time()),
+                "schema": db.schema_version(out), "source_os": os.name}
+        db.set_setting(out, INFO_KEY, meta)
+        out.execute("UPDATE files SET inode=NULL")   # meaningless on another filesystem
+        dirtree.rebuild(out)                         # subsetting / merged shards invalidate the rollups
+        report("vacuum", 0, 1)
+        out.execute("VACUUM")
+        files = out.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        chunks = out.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    except BaseException:
+        out.close(); _rm(tmp)
+        raise
+    out.close()
+    os.replace(tmp, dest)
+    res = {"dest": dest, "roots": meta["roots"], "files": files, "chunks": chunks, "dropped": dropped,
+           "bytes": os.path.getsize(dest), "secs": round(time.time() - t0, 2)}
+    log.info("snapshot exported %s", res)
+    return res
+
+
+# —— import ——
+def merge(src, dst_for, *, remap=None, progress=None, stop_event=None) -> dict:
+    """Merge every indexed file of `src` into the connection dst_for(path) returns.
+
+    Per file: missing locally -> add; same blake3 -> leave alone; newer mtime
+    in src -> replace (chunks, fts and signature included); else keep local.
+    """
+    report = progress or (lambda *_a: None)
+    has_sigs = "file_sigs" in _tables(src)
+    char_offsets = db.schema_version(src) < db.BYTE_OFFSETS_VERSION     # flag them, see db._m10_byte_offsets
+    have = {r[1] for r in src.execute("PRAGMA table_info(files)")}
+    cols = ", ".join(c if c in have else "NULL" for c in _FILE_COLS + ("inode",))
+    total = src.execute("SELECT COUNT(*) FROM files WHERE status IS NOT 'error'").fetchone()[0]
+    stats = {"added": 0, "replaced": 0, "same": 0, "kept": 0}
+    dirty: dict = {}
+    done = 0
+    rows = src.execute(f"SELECT id, {cols} FROM files WHERE status IS NOT 'error' ORDER BY path")
+    for sid, *vals in rows:
+        if stop_event and stop_event.is_set():
+            break
+        row = dict(zip(_FILE_COLS + ("inode",), vals))
+        row["path"] = remap_path(row["path"], remap)
+        row["inode"] = None
+        if char_offsets: row["char_offsets"] = 1
+        dst = dst_for(row["path"]); cur = dst.cursor()
+        local = cur.execute("SELECT id, blake3, mtime FROM files WHERE path=?", (row["path"],)).fetchone()
+        if local and local[1] and local[1] == row["blake3"]:
+            stats["same"] += 1
+        elif local and (row["mtime"] or 0) <= (local[2] or 0):
+            stats["kept"] += 1
+        else:
+            if local:
+                fid = local[0]
+                db.delete_chunks(cur, fid); similar.drop(cur, fid)
+                sets = ", ".join(f"{c}=?" for c in row if c != "path")
+                cur.execute(f"UPDATE files SET {sets} WHERE id=?", [v for c, v in row.items() if c != "path"] + [fid])
+                stats["replaced"] += 1
+            else:
+                cur.execute(f"INSERT INTO files({', '.join(row)}) VALUES({', '.join('?' * len(row))})", list(row.values()))
+                fid = cur.lastrowid
+                stats["added"] += 1
+            db.insert_chunks(cur, fid, src.execute(
+                "SELECT ord, text, bytes_from, bytes_to FROM chunks WHERE file_id=? ORDER BY ord", (sid,)).fetchall())
+            sig = src.execute("SELECT sig FROM file_sigs WHERE file_id=?", (sid,)).fetchone() if has_sigs else None
+            if sig is not None:
+                similar.store(cur, fid, similar.from_blob(sig[0]))
+            dirty[id(dst)] = dst
+        done += 1
+        if done % COMMIT_EVERY == 0:
+            for c in dirty.values(): c.commit()
+            dirty.clear()
+            report("merge", done, total)
+    for c in dirty.values(): c.commit()
+    report("merge", done, total)
+    return stats
+
+def install(main_con, sset, src_path: str, *, remap=None, progress=None, stop_event=None) -> dict:
+    """Merge the snapshot at `src_path` into this index, routing files to their shards."""
+    t0 = time.time()
+    src = db.connect_ro(src_path)
+    try:
+        v = db.schema_version(src)
+        if v > db.SCHEMA_VERSION:
+            raise ValueError(f"snapshot schema {v} is newer than this version supports ({db.SCHEMA_VERSION})")
+        if v < 1 or "files" not in _tables(src):
+            raise ValueError("not an index snapshot")
+        meta = db.get_setting(src, INFO_KEY, {}) or {}
+        roots = [remap_path(r, remap) for r in meta.get("roots", [])]
+        for r in roots: sset.register_root(main_con, r)
+        keys = sorted({db.path_key(r) for r in roots}, key=len, reverse=True)
+        cons: dict = {}
+
+        def dst_for(path: str):
+            shard, p = sset.db_path, db.path_key(path)     # same spelling as the root keys
+            for r in keys:
+                if p == r or p.startswith(db.path_prefix(r)):
+                    shard = sset.path_for_root(r); break
+            con = cons.get(shard)
+            if con is None:
+                con = cons[shard] = main_con if shard == sset.db_path else sset.connect(shard)
+            return con
+
+        try:
+            stats = merge(src, dst_for, remap=remap, progress=progress, stop_event=stop_event)
+            for c in cons.values(): dirtree.rebuild(c)
+        finally:
+            for c in cons.values():
+                if c is not main_con: c.close()
+    finally:
+        src.close()
+    res = {"source": src_path, "roots": roots, **stats,
+           "cancelled": bool(stop_event and stop_event.is_set()), "secs": round(time.time() - t0, 2)}
+    db.set_setting(main_con, "snapshot_installed", {k: res[k] for k in ("source", "roots")} | {"at": int(time.time())})
+    log.info("snapshot installed %s", res)
+    return res
@@ -0,0 +1 @@
+# Benchmarks: synthetic corpus generator (corpus.py) + runner (run.py)
@@ -0,0 +1,167 @@
+# bench/corpus.py — deterministic synthetic corpus for benchmarks
+#
+#   python -m bench.corpus /tmp/sfm-corpus --files 5000 --seed 7
+#
+# Same arguments + seed => byte-identical tree (contents, names, mtimes).
+
+import argparse, bisect, json, math, os, random
+
+# fixed "now" so generated mtimes don't depend on the wall clock
+EPOCH_DEFAULT = 1_700_000_000
+
+TEXT_EXTS   = [".txt", ".md", ".py", ".json", ".log", ".csv", ".html"]
+BINARY_EXTS = [".bin", ".png", ".pdf", ".zip", ".dat"]
+
+SPEC_DEFAULT = {
+    "files": 2000,
+    "seed": 1,
+    "median_kb": 8.0,          # lognormal size distribution ...
+    "sigma": 1.4,              # ... spread
+    "max_kb": 4096,
+    "depth": 4,                # max directory nesting below the root
+    "fanout": 6,               # subdirectories per level
+    "dup_fraction": 0.05,      # share of files that are exact copies of earlier files
+    "binary_fraction": 0.2,    # share of non-text files
+    "encodings": {"utf-8": 0.85, "latin-1": 0.05, "utf-16": 0.05, "cp1252": 0.05},
+    "vocab": 20000,
+    "mtime_span_days": 365,
+    "epoch": EPOCH_DEFAULT,
+}
+
+
+def vocabulary(n: int, seed: int) -> list[str]:
+    """`n` distinct pronounceable pseudo-words, deterministic for `seed`."""
+    rnd = random.Random(seed * 7919 + 17)
+    cons, vows = "bcdfghjklmnprstvwz", "aeiou"
+    out, seen = [], set()
+    while len(out) < n:
+        w = "".join(rnd.choice(cons) + rnd.choice(vows) for _ in range(rnd.randint(2, 4)))
+        if w not in seen:
+            seen.add(w); out.append(w)
+    return out
+
+
+class _Zipf:
+    """Zipf(s≈1.1) sampler over a vocabulary so term frequencies look like real text."""
+
+    def __init__(self, words: list[str], rnd: random.Random, s: float = 1.1):
+        self.words = words
+        self.rnd = rnd
+        acc, self.cdf = 0.0, []
+        for i in range(len(words)):
+            acc += 1.0 / ((i + 1) ** s)
+            self.cdf.append(acc)
+        self.total = acc
+
+    def word(self) -> str:
+        return self.words[bisect.bisect_left(self.cdf, self.rnd.random() * self.total)]
+
+
+def _size(rnd: random.Random, spec: dict) -> int:
+    kb = rnd.lognormvariate(math.log(spec["median_kb"]), spec["sigma"])
+    return max(16, int(min(spec["max_kb"], kb) * 1024))
+
+def _pick(rnd: random.Random, weights: dict) -> str:
+    r, acc = rnd.random() * sum(weights.values()), 0.0
+    for k, w in weights.items():
+        acc += w
+        if r <= acc: return k
+    return next(iter(weights))
+
+def _text(z: _Zipf, rnd: random.Random, nbytes: int, ext: str) -> str:
+    words, n = [], 0
+    while n < nbytes:
+        w = z.word(); words.append(w); n += len(w) + 1
+        if rnd.random() < 0.08: words.append("\n"); n += 1
+    body = " ".join(words)
+    if ext == ".html":
+        return f"<html><body><p>{body}</p></body></html>"
+    if ext == ".json":
+        return json.dumps({"text": body})
+    if ext == ".csv":
+        return body.replace(" ", ",")
+    return body
+
+def _dirs(rnd: random.Random, spec: dict) -> list[str]:
+    out = [""]
+    frontier = [""]
+    for level in range(spec["depth"]):
+        nxt = []
+        for d in frontier:
+            for i in range(rnd.randint(1, spec["fanout"])):
+                nd = os.path.join(d, f"d{level}_{i}")
+                out.append(nd); nxt.append(nd)
+        frontier = nxt
+    return out
+
+
+def manifest_path(dest: str) -> str:
+    # next to the tree, not inside it, so it never gets indexed
+    return os.path.abspath(dest).rstrip("\\/") + ".manifest.json"
+
+def generate(dest: str, **overrides) -> dict:
+    """Write a synthetic tree under `dest` and return its manifest (also saved to manifest_path())."""
+    spec = dict(SPEC_DEFAULT, **overrides)
+    rnd = random.Random(spec["seed"])
+    z = _Zipf(vocabulary(spec["vocab"], spec["seed"]), random.Random(spec["seed"] + 1))
+    dirs = _dirs(rnd, spec)
+    os.makedirs(dest, exist_ok=True)
+
+    written: list[str] = []
+    stats = {"files": 0, "bytes": 0, "text": 0, "binary": 0, "dups": 0, "by_encoding": {}}
+    span = spec["mtime_span_days"] * 86400
+    for i in range(spec["files"]):
+        d = rnd.choice(dirs)
+        os.makedirs(os.path.join(dest, d), exist_ok=True)
+        if written and rnd.random() < spec["dup_fraction"]:
+            src = rnd.choice(written)
+            ext = os.path.splitext(src)[1]
+            with open(src, "rb") as f: data = f.read()
+            stats["dups"] += 1
+        elif rnd.random() < spec["binary_fraction"]:
+            ext = rnd.choice(BINARY_EXTS)
+            data = rnd.randbytes(_size(rnd, spec))
+            stats["binary"] += 1
+        else:
+            ext = rnd.choice(TEXT_EXTS)
+            enc = _pick(rnd, spec["encodings"])
+            data = _text(z, rnd, _size(rnd, spec), ext).encode(enc, errors="replace")
+            stats["text"] += 1
+            stats["by_encoding"][enc] = stats["by_encoding"].get(enc, 0) + 1
+        fp = os.path.join(dest, d, f"f{i:06d}{ext}")
+        with open(fp, "wb") as f: f.write(data)
+        ts = spec["epoch"] - int(rnd.random() * span)
+        os.utime(fp, (ts, ts))
+        written.append(fp)
+        stats["files"] += 1; stats["bytes"] += len(data)
+
+    manifest = {"spec": spec, "stats": stats, "dirs": len(dirs),
+                "words": z.words[:50] + z.words[len(z.words) // 2: len(z.words) // 2 + 50]}
+    with open(manifest_path(dest), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def large_file(path: str, mb: int, seed: int = 1) -> str:
+    """Incompressible file of `mb` MiB for hashing benchmarks (written in 1 MiB blocks)."""
+    rnd = random.Random(seed)
+    if os.path.exists(path) and os.path.getsize(path) == mb << 20:
+        return path
+    with open(path, "wb") as f:
+        for _ in range(mb):
+            f.write(rnd.randbytes(1 << 20))
+    return path
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="generate a deterministic synthetic corpus")
+    p.add_argument("dest")
+    for k, v in SPEC_DEFAULT.items():
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            p.add_argument("--" + k.replace("_", "-"), type=type(v), default=v)
+    args = p.parse_args(argv)
+    over = {k: getattr(args, k) for k in SPEC_DEFAULT if hasattr(args, k)}
+    m = generate(args.dest, **over)
+    print(json.dumps(m["stats"]))
+
+if __name__ == "__main__": main()
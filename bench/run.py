@@ -0,0 +1,321 @@
+# bench/run.py — reproducible benchmarks, results as JSON
+#
+#   python -m bench.run --out bench_results/$(git rev-parse --short HEAD).json
+#   python -m bench.run --compare old.json new.json
+#
+# The corpus is regenerated from (--files, --seed) into --work unless it is
+# already there, so two commits benchmarked with the same args see the same bytes.
+
+import argparse, json, os, platform, shutil, sqlite3, statistics, subprocess, sys, tempfile, threading, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import db, extract, fileio, indexer, searcher
+from bench import corpus
+
+
+def _pcts(vals: list[float]) -> dict:
+    vals = sorted(vals)
+    if not vals: return {}
+    def p(q): return round(vals[min(len(vals) - 1, int(round(q * (len(vals) - 1))))] * 1000, 3)
+    return {"n": len(vals), "p50_ms": p(0.5), "p90_ms": p(0.9), "p99_ms": p(0.99),
+            "max_ms": p(1.0), "mean_ms": round(statistics.fmean(vals) * 1000, 3)}
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def _tree_bytes(root: str) -> tuple[int, int]:
+    n = b = 0
+    for r, _d, fs in os.walk(root):
+        for fn in fs:
+            n += 1; b += os.path.getsize(os.path.join(r, fn))
+    return n, b
+
+
+# —— benchmarks ——
+
+def bench_index(root: str, db_path: str, touch_fraction: float = 0.05) -> dict:
+    for ext in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + ext): os.remove(db_path + ext)
+    con = db.connect(db_path); db.init(con); db.migrate(con)
+    n, b = _tree_bytes(root)
+    out = {}
+
+    t = time.perf_counter()
+    res = indexer.index_root(con, root, [])
+    secs = time.perf_counter() - t
+    out["cold"] = {"secs": round(secs, 3), "files_per_s": round(n / secs, 1),
+                   "mb_per_s": round(b / secs / 1e6, 2), **res}
+
+    t = time.perf_counter()
+    res = indexer.index_root(con, root, [])
+    secs = time.perf_counter() - t
+    out["incremental_noop"] = {"secs": round(secs, 3), "files_per_s": round(n / secs, 1), **res}
+
+    # touch a deterministic slice of files (content unchanged, mtime bumped)
+    paths = sorted(os.path.join(r, f) for r, _d, fs in os.walk(root) for f in fs)
+    step = max(1, int(1 / touch_fraction)) if touch_fraction > 0 else 0
+    touched = paths[::step] if step else []
+    for fp in touched:
+        st = os.stat(fp); os.utime(fp, (st.st_atime, st.st_mtime + 1))
+    t = time.perf_counter()
+    res = indexer.index_root(con, root, [])
+    secs = time.perf_counter() - t
+    for fp in touched:
+        st = os.stat(fp); os.utime(fp, (st.st_atime, st.st_mtime - 1))
+    out["incremental_touched"] = {"secs": round(secs, 3), "touched": len(touched), **res}
+
+    out["db_bytes"] = os.path.getsize(db_path)
+    con.close()
+
+    # first index again, metadata pass first and content by priority
+    pdb = db_path + ".prio"
+    for ext in ("", "-wal", "-shm"):
+        if os.path.exists(pdb + ext): os.remove(pdb + ext)
+    con = db.connect(pdb); db.init(con); db.migrate(con)
+    t = time.perf_counter()
+    res = indexer.index_root(con, root, [], prioritized=True)
+    secs = time.perf_counter() - t
+    out["cold_prioritized"] = {"secs": round(secs, 3), "files_per_s": round(n / secs, 1), **res}
+    con.close()
+    for ext in ("", "-wal", "-shm"):
+        if os.path.exists(pdb + ext): os.remove(pdb + ext)
+    return out
+
+def bench_hash(path: str, reps: int = 3) -> dict:
+    size = os.path.getsize(path)
+    out = {"file_mb": round(size / 1e6, 1)}
+    for name, kw in (("full", {"sample": False}),
+                     ("sampled", {"sample": True, "large_mb": 16})):
+        best = None
+        for _ in range(reps):
+            t = time.perf_counter()
+            indexer._blake3_file(path, size, **kw)
+            s = time.perf_counter() - t
+            best = s if best is None else min(best, s)
+        out[name] = {"secs": round(best, 4), "mb_per_s": round(size / best / 1e6, 1)}
+    return out
+
+# read-per-block + second open for extraction: the I/O pattern before app.fileio, kept as a baseline
+def _io_legacy(path: str, size: int, keep: int, sample: bool, large_mb: int) -> None:
+    from blake3 import blake3
+    MB = 1024 * 1024
+    h = blake3()
+    with open(path, "rb") as f:
+        if size <= large_mb * MB or not sample:
+            for buf in iter(lambda: f.read(1 << 20), b""): h.update(buf)
+        else:
+            h.update(f.read(indexer.SAMPLE_HEAD_MB_DEFAULT * MB))
+            end, step = max(0, size - indexer.SAMPLE_TAIL_MB_DEFAULT * MB), max(1, int(size * indexer.SAMPLE_STRIDE_DEFAULT))
+            for pos in range(indexer.SAMPLE_HEAD_MB_DEFAULT * MB, end, step):
+                f.seek(pos); h.update(f.read(1 << 20))
+            f.seek(end); h.update(f.read(indexer.SAMPLE_TAIL_MB_DEFAULT * MB))
+    h.hexdigest()
+    with open(path, "rb") as f: f.read(keep)
+
+def _rss() -> int | None:
+    """Current resident set of this process in bytes (None without /proc)."""
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _rss_peak_during(fn, every: float = 0.002) -> int | None:
+    """Highest RSS sampled while fn() runs, above the RSS just before it.
+
+    ru_maxrss cannot do this: its high-water mark is usually set by the
+    imports, long before the pass under test.
+    """
+    base = _rss()
+    if base is None:
+        fn(); return None
+    peak, done = [base], threading.Event()
+    def sample():
+        while not done.wait(every): peak[0] = max(peak[0], _rss() or 0)
+    t = threading.Thread(target=sample, daemon=True); t.start()
+    try: fn()
+    finally:
+        done.set(); t.join()
+    return max(peak[0], _rss() or 0) - base
+
+def _io_child(mode: str, paths: list[str], sample: bool, reps: int, keep: int = 200_000,
+              large_mb: int = 16) -> dict:
+    """One mode in a fresh interpreter.
+
+    peak_alloc_mb is the tracemalloc peak of one extra pass (the per-read
+    bytes objects); grow_rss_mb is the sampled RSS peak of another pass
+    above the RSS before it, which also sees mapped pages (Linux only).
+    """
+    import tracemalloc
+    sizes = [os.path.getsize(p) for p in paths]
+    def one_pass():
+        for p, sz in zip(paths, sizes):
+            if mode == "legacy": _io_legacy(p, sz, keep, sample, large_mb)
+            else: indexer._blake3_file(p, sz, sample=sample, large_mb=large_mb, keep=keep)
+    fileio._hasher(False)       # native module import out of the numbers
+    best = None
+    for _ in range(reps):
+        t = time.perf_counter()
+        one_pass()
+        s = time.perf_counter() - t
+        best = s if best is None else min(best, s)
+    tracemalloc.start(); one_pass()
+    peak = tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+    out = {"secs": round(best, 4), "mb_per_s": round(sum(sizes) / best / 1e6, 1),
+           "peak_alloc_mb": round(peak / 1e6, 2)}
+    grow = _rss_peak_during(one_pass)
+    if grow is not None:
+        out["grow_rss_mb"] = round(grow / 1e6, 1)
+    return out
+
+def bench_io(big: str, root: str, reps: int = 3) -> dict:
+    """Hash + extraction read, old pattern vs shared single read, each case and mode in its own process."""
+    small = sorted(os.path.join(r, f) for r, _d, fs in os.walk(root) for f in fs if extract.is_textable(f))
+    cases = {"large_full": ([big], False), "large_sampled": ([big], True), "corpus": (small, True)}
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = {}
+    for cname, (paths, sample) in cases.items():
+        for mode in ("legacy", "shared"):
+            code = ("import json, sys; from bench import run; "
+                    f"print(json.dumps(run._io_child({mode!r}, json.load(sys.stdin), {sample!r}, {reps})))")
+            res = subprocess.run([sys.executable, "-c", code], input=json.dumps(paths), capture_output=True,
+                                 text=True, cwd=here)
+            if res.returncode:
+                out[f"{cname}/{mode}"] = {"error": res.stderr.strip().splitlines()[-1:]}
+                continue
+            out[f"{cname}/{mode}"] = json.loads(res.stdout)
+    return out
+
+def bench_extract(root: str, max_bytes: int = 200_000) -> dict:
+    paths = sorted(os.path.join(r, f) for r, _d, fs in os.walk(root) for f in fs
+                   if extract.is_textable(f))
+    nbytes = nchars = 0
+    t = time.perf_counter()
+    for fp in paths:
+        nbytes += min(max_bytes, os.path.getsize(fp))
+        s = extract.read_text(fp, max_bytes)
+        nchars += len(s or "")
+    secs = time.perf_counter() - t
+    return {"files": len(paths), "secs": round(secs, 3), "files_per_s": round(len(paths) / secs, 1),
+            "mb_per_s": round(nbytes / secs / 1e6, 2), "chars": nchars}
+
+def _queries(words: list[str]) -> dict:
+    common, rare = words[:10], words[50:60]
+    return {
+        "show_all":   ["*"],
+        "common":     common,
+        "rare":       rare,
+        "phrase":     [f'"{a} {b}"' for a, b in zip(common, common[1:])],
+        "prefix":     [w[:3] + "*" for w in rare],
+        "or":         [f"{a} OR {b}" for a, b in zip(rare, common)],
+    }
+
+def bench_search(db_path: str, root: str, words: list[str], reps: int = 5, top_k: int = 200) -> dict:
+    con = db.connect(db_path)
+    subdirs = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+    deep = root     # first subdirectory by name at every level, down to a leaf
+    while True:
+        ds = sorted(d for d in os.listdir(deep) if os.path.isdir(os.path.join(deep, d)))
+        if not ds: break
+        deep = os.path.join(deep, ds[0])
+    scopes = {"none": None, "top_dir": [os.path.join(root, subdirs[0])] if subdirs else None,
+              "deep_dir": [deep], "many_dirs": [os.path.join(root, d) for d in subdirs]}
+    out = {}
+    for qname, qs in _queries(words).items():
+        for sname, sc in scopes.items():
+            lat, hits = [], 0
+            for _ in range(reps):
+                for q in qs:
+                    t = time.perf_counter()
+                    rows = searcher.fts(con, q, top_k=top_k, path_prefixes=sc)
+                    lat.append(time.perf_counter() - t)
+                    hits += len(rows)
+            out[f"{qname}/{sname}"] = {**_pcts(lat), "avg_hits": round(hits / max(1, len(lat)), 1)}
+    con.close()
+    return out
+
+
+def run(args) -> dict:
+    work = args.work or os.path.join(tempfile.gettempdir(), "sfm-bench")
+    root = os.path.join(work, f"corpus-{args.files}-{args.seed}")
+    if not os.path.exists(corpus.manifest_path(root)):
+        shutil.rmtree(root, ignore_errors=True)
+        corpus.generate(root, files=args.files, seed=args.seed)
+    with open(corpus.manifest_path(root)) as f:
+        manifest = json.load(f)
+
+    # one index per corpus: --only search must never time a DB built from other args
+    db_path = os.path.join(work, f"bench-{args.files}-{args.seed}.sqlite")
+    results = {}
+    only = set(args.only.split(",")) if args.only else None
+    def want(name): return only is None or name in only
+
+    if want("index"):
+        results["index"] = bench_index(root, db_path)
+    if want("hash"):
+        big = corpus.large_file(os.path.join(work, f"large-{args.large_mb}.bin"), args.large_mb, args.seed)
+        results["hash"] = bench_hash(big)
+    if want("io"):
+        big = corpus.large_file(os.path.join(work, f"large-{args.large_mb}.bin"), args.large_mb, args.seed)
+        results["io"] = bench_io(big, root)
+    if want("extract"):
+        results["extract"] = bench_extract(root)
+    if want("search"):
+        if not os.path.exists(db_path):
+            results.setdefault("index", bench_index(root, db_path))
+        results["search"] = bench_search(db_path, root, manifest["words"], reps=args.reps)
+
+    return {
+        "meta": {"git": _git_rev(), "label": args.label, "ts": int(time.time()),
+                 "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                 "platform": platform.platform(), "cpus": os.cpu_count(),
+                 "corpus": manifest["spec"], "corpus_stats": manifest["stats"]},
+        "results": results,
+    }
+
+
+def _flatten(d: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict): out.update(_flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool): out[key] = v
+    return out
+
+def compare(a_path: str, b_path: str) -> None:
+    with open(a_path) as f: a = _flatten(json.load(f)["results"])
+    with open(b_path) as f: b = _flatten(json.load(f)["results"])
+    for k in sorted(set(a) & set(b)):
+        if not k.endswith(("secs", "_ms", "_per_s", "db_bytes", "_rss_mb", "_alloc_mb")): continue
+        va, vb = a[k], b[k]
+        delta = "" if not va else f"{(vb - va) / va * 100:+.1f}%"
+        print(f"{k:<48} {va:>12} {vb:>12} {delta:>9}")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="SuperFileManager benchmarks")
+    p.add_argument("--files", type=int, default=2000)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--large-mb", type=int, default=256, help="size of the hashing test file")
+    p.add_argument("--reps", type=int, default=5)
+    p.add_argument("--work", help="scratch directory (default: $TMP/sfm-bench)")
+    p.add_argument("--only", help="comma list of: index,hash,io,extract,search")
+    p.add_argument("--label")
+    p.add_argument("--out", help="write JSON here (default: stdout)")
+    p.add_argument("--compare", nargs=2, metavar=("A", "B"), help="diff two result files")
+    args = p.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare); return
+    res = run(args)
+    data = json.dumps(res, indent=1)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f: f.write(data)
+    else:
+        print(data)
+
+if __name__ == "__main__": main()
@@ -0,0 +1,26 @@
+# scripts/failures.py — inspect / reset the index failure backoff table
+#   python scripts/failures.py list [--root DIR] [--due]
+#   python scripts/failures.py retry [--path PATH]
+import argparse, time
+from app import db, failures, shards
+from app.platform_paths import DB_PATH
+
+p = argparse.ArgumentParser()
+sub = p.add_subparsers(dest="cmd", required=True)
+pl = sub.add_parser("list"); pl.add_argument("--root"); pl.add_argument("--due", action="store_true")
+pr = sub.add_parser("retry"); pr.add_argument("--path", help="file or directory (default: everything)")
+args = p.parse_args()
+
+main = db.connect(DB_PATH); db.init(main); db.migrate(main)
+sset = shards.ShardSet.from_settings(main, DB_PATH)
+if args.cmd == "list":
+    now = int(time.time())
+    for rows in sset.each(lambda con: failures.list_failures(con, args.root, due_only=args.due)):
+        for f in rows or ():
+            wait = max(0, f["next_retry_at"] - now)
+            kind = "DIR " if f["is_dir"] else "FILE"
+            print(f"{kind} {f['path']}  {f['err_class']} x{f['attempts']}  retry in {wait//3600}h{wait%3600//60:02d}m  {f['err_msg']}")
+else:
+    n = sum(k or 0 for k in sset.each(lambda con: failures.force_retry(con, args.path)))
+    print(f"{n} failure(s) will be retried on the next index run")
+sset.close()
@@ -1,15 +1,20 @@
 # scripts/index_once.py
 import argparse, os
-from app import db, indexer
-from app.main import DB_PATH, EXCLUDES
+from app import db, indexer, shards
+from app.main import DB_PATH, excludes
 
 p = argparse.ArgumentParser()
 p.add_argument("--root", required=True)
 p.add_argument("--prune-missing", action="store_true")
+p.add_argument("--prioritized", action="store_true", help="metadata pass first, then recent/in-scope content")
 args = p.parse_args()
 
-con = db.connect(DB_PATH, check_same_thread=False); db.init(con)
-res = indexer.index_root(con, os.path.abspath(args.root), EXCLUDES,
+main = db.connect(DB_PATH); db.init(main); db.migrate(main)
+sset = shards.ShardSet.from_settings(main, DB_PATH)
+con = sset.connect(sset.register_root(main, args.root), check_same_thread=False)
+res = indexer.index_root(con, os.path.abspath(args.root), excludes(),
                          progress_cb=lambda e: print(e),
-                         batch=200, prune_missing=args.prune_missing)
+                         batch=200, prune_missing=args.prune_missing,
+                         prioritized=args.prioritized,
+                         priority_scopes=db.get_setting(main, "search_scopes", []))
 print("DONE", res)
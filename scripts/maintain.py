@@ -0,0 +1,42 @@
+# scripts/maintain.py — database maintenance for the main DB and every shard
+#   python scripts/maintain.py report [--no-objects]
+#   python scripts/maintain.py auto [--force] [--budget SEC]
+#   python scripts/maintain.py optimize | checkpoint
+#   python scripts/maintain.py vacuum [--budget SEC] [--full]
+import argparse, json
+from app import db, maintenance, shards
+from app.platform_paths import DB_PATH
+
+p = argparse.ArgumentParser()
+p.add_argument("--json", action="store_true", help="machine-readable output")
+sub = p.add_subparsers(dest="cmd", required=True)
+pr = sub.add_parser("report"); pr.add_argument("--no-objects", action="store_true", help="skip the dbstat scan")
+pa = sub.add_parser("auto"); pa.add_argument("--force", action="store_true"); pa.add_argument("--budget", type=float, default=maintenance.VACUUM_BUDGET_SEC)
+sub.add_parser("optimize"); sub.add_parser("checkpoint")
+pv = sub.add_parser("vacuum"); pv.add_argument("--budget", type=float, default=30.0)
+pv.add_argument("--full", action="store_true", help="rebuild the file (blocks other writers)")
+args = p.parse_args()
+
+main = db.connect(DB_PATH); db.init(main); db.migrate(main)
+sset = shards.ShardSet.from_settings(main, DB_PATH)
+paths = [DB_PATH] + [s for s in sset._existing(sset.paths()) if s != DB_PATH]
+for path in paths:
+    con = main if path == DB_PATH else sset.connect(path)
+    if args.cmd == "report":
+        out = maintenance.health(con, objects=not args.no_objects)
+    elif args.cmd == "auto":
+        out = maintenance.auto(con, budget_sec=args.budget, force=args.force)
+    elif args.cmd == "optimize":
+        out = maintenance.optimize(con)
+    elif args.cmd == "checkpoint":
+        out = maintenance.checkpoint(con, "TRUNCATE")
+    else:
+        out = maintenance.full_vacuum(con) if args.full else maintenance.incremental_vacuum(con, args.budget)
+    if args.json:
+        print(json.dumps({"db": path, args.cmd: out}))
+    elif args.cmd == "report":
+        print(maintenance.format_report(out))
+    else:
+        print(path, out)
+    if con is not main: con.close()
+sset.close()
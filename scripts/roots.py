@@ -0,0 +1,61 @@
+# scripts/roots.py — manage scheduled index roots and run the scheduler headless
+#   python scripts/roots.py list
+#   python scripts/roots.py add DIR [--quick-every MIN] [--full-every MIN] [--prune] [--full-fs]
+#   python scripts/roots.py remove DIR
+#   python scripts/roots.py run [--once] [--root DIR --mode quick|full]
+import argparse, time
+from app import db, scheduler, config
+from app.platform_paths import DB_PATH
+
+p = argparse.ArgumentParser()
+sub = p.add_subparsers(dest="cmd", required=True)
+sub.add_parser("list")
+pa = sub.add_parser("add"); pa.add_argument("path")
+pa.add_argument("--quick-every", type=int, help="minutes between metadata refreshes (0 = never)")
+pa.add_argument("--full-every", type=int, help="minutes between content runs (0 = never)")
+pa.add_argument("--prune", action="store_true", help="drop files that disappeared")
+pa.add_argument("--disable", action="store_true")
+pa.add_argument("--full-fs", action="store_true", help="required to schedule a filesystem root")
+pr = sub.add_parser("remove"); pr.add_argument("path")
+pn = sub.add_parser("run")
+pn.add_argument("--once", action="store_true", help="run what is due (or --root) and exit")
+pn.add_argument("--root"); pn.add_argument("--mode", choices=scheduler.MODES, default="quick")
+args = p.parse_args()
+
+con = db.connect(DB_PATH); db.init(con); db.migrate(con)
+cfg = config.load()
+if args.cmd == "list":
+    ts = lambda t: time.strftime("%Y-%m-%d %H:%M", time.localtime(t)) if t else "never"
+    for r in scheduler.list_roots(con):
+        print(f"{'on ' if r['enabled'] else 'off'} {r['path']}  quick/{r['quick_every_min']}m ({ts(r['last_quick_at'])})  "
+              f"full/{r['full_every_min']}m ({ts(r['last_full_at'])})  {r['last_status'] or ''}")
+elif args.cmd == "add":
+    knobs = {k: v for k, v in (("quick_every_min", args.quick_every), ("full_every_min", args.full_every)) if v is not None}
+    if args.prune: knobs["prune_missing"] = 1
+    if args.disable: knobs["enabled"] = 0
+    if args.full_fs: knobs["full_fs"] = 1
+    try:
+        print(scheduler.add_root(con, args.path, cfg=cfg, **knobs))
+    except ValueError as e:
+        raise SystemExit(str(e))
+elif args.cmd == "remove":
+    print("removed" if scheduler.remove_root(con, args.path) else "not registered")
+else:
+    def show(ev):
+        if ev["kind"] == "progress" and not ev.get("done"): return
+        print({k: v for k, v in ev.items() if k != "kind"} if ev["kind"] != "state" else ev.get("state") or "resumed")
+    s = scheduler.Scheduler(DB_PATH, cfg=cfg, on_event=show)
+    if args.root:
+        s.run_now(args.root, args.mode)
+    if args.once:
+        job = s._next(con)
+        while job:
+            s._run_one(con, *job)
+            job = s._next(con) if not args.root else None
+    else:
+        s.start()
+        try:
+            while s.is_alive(): s.join(1.0)
+        except KeyboardInterrupt:
+            s.stop()
+con.close()
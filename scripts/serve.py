@@ -0,0 +1,4 @@
+# scripts/serve.py — run the headless search service (see app/service.py)
+from app import service
+
+service.main()
@@ -0,0 +1,41 @@
+# scripts/snapshot.py — export / inspect / install portable index snapshots
+#   python scripts/snapshot.py export DEST [--root DIR ...] [--pages N] [--sleep SEC]
+#   python scripts/snapshot.py info SRC
+#   python scripts/snapshot.py import SRC [--map OLD=NEW ...]
+import argparse, json, sys
+from app import db, shards, snapshot
+from app.platform_paths import DB_PATH
+
+p = argparse.ArgumentParser()
+sub = p.add_subparsers(dest="cmd", required=True)
+pe = sub.add_parser("export"); pe.add_argument("dest")
+pe.add_argument("--root", action="append", help="only files under this root (repeatable)")
+pe.add_argument("--pages", type=int, default=snapshot.PAGES_PER_STEP, help="pages copied per backup step")
+pe.add_argument("--sleep", type=float, default=0.0, help="seconds to pause between backup steps")
+pn = sub.add_parser("info"); pn.add_argument("src")
+pi = sub.add_parser("import"); pi.add_argument("src")
+pi.add_argument("--map", action="append", default=[], metavar="OLD=NEW", help="rewrite a path prefix (repeatable)")
+args = p.parse_args()
+
+def show(phase, done, total):
+    sys.stderr.write(f"\r{phase}: {done}/{total}   "); sys.stderr.flush()
+
+if args.cmd == "info":
+    print(json.dumps(snapshot.info(args.src), indent=2)); raise SystemExit(0)
+
+con = db.connect(DB_PATH); db.init(con); db.migrate(con)
+sset = shards.ShardSet.from_settings(con, DB_PATH)
+try:
+    if args.cmd == "export":
+        out = snapshot.export(con, sset, args.dest, roots=args.root, pages=args.pages, sleep=args.sleep, progress=show)
+    else:
+        out = snapshot.install(con, sset, args.src, remap=snapshot.parse_map(args.map), progress=show)
+except ValueError as e:
+    raise SystemExit(str(e))
+finally:
+    sset.close()
+sys.stderr.write("\n")
+print(json.dumps(out))
+if args.cmd == "import" and out["roots"]:
+    print("next: run an index (or scripts/roots.py run --once) over", ", ".join(out["roots"]), "to pick up local changes")
+con.close()
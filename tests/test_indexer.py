@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app import db, dirtree, extract, failures, indexer
+
+
+@pytest.fixture
+def con(tmp_path):
+    con = db.connect(str(tmp_path / "state.sqlite")); db.init(con); db.migrate(con)
+    yield con
+    con.close()
+
+
+@pytest.fixture
+def root(tmp_path):
+    """root/{a,b}/f{i}.txt, each file holding one word no other file has."""
+    root = tmp_path / "root"
+    for sub in ("a", "b"):
+        (root / sub).mkdir(parents=True)
+        for i in range(5):
+            (root / sub / f"f{i}.txt").write_text(f"common words tok{sub}{i}\n" * 3)
+    return root
+
+
+def _hits(con, word):
+    return con.execute("SELECT COUNT(*) FROM fts WHERE fts MATCH ?", (word,)).fetchone()[0]
+
+def _assert_consistent(con):
+    """Every chunk has one fts_map row and one posting; nothing points at a missing row."""
+    assert con.execute("SELECT COUNT(*) FROM chunks WHERE file_id NOT IN (SELECT id FROM files)").fetchone()[0] == 0
+    assert con.execute("SELECT COUNT(*) FROM fts_map WHERE chunk_id NOT IN (SELECT id FROM chunks)").fetchone()[0] == 0
+    (chunks,) = con.execute("SELECT COUNT(*) FROM chunks").fetchone()
+    assert con.execute("SELECT COUNT(*) FROM fts_map").fetchone()[0] == chunks
+    assert _hits(con, "common") == chunks
+
+def _paths(con):
+    return {p for (p,) in con.execute("SELECT path FROM files")}
+
+
+def test_prune_removes_deleted_files_with_their_chunks(con, root):
+    indexer.index_root(con, str(root), [])
+    assert len(_paths(con)) == 10 and _hits(con, "toka1") == 1
+    _assert_consistent(con)
+
+    os.remove(root / "a" / "f1.txt"); os.remove(root / "b" / "f3.txt")
+    res = indexer.index_root(con, str(root), [], prune_missing=True)
+    assert res["pruned"] == 2
+    assert str(root / "a" / "f1.txt") not in _paths(con) and len(_paths(con)) == 8
+    assert _hits(con, "toka1") == 0 and _hits(con, "tokb3") == 0 and _hits(con, "toka2") == 1
+    _assert_consistent(con)
+
+
+def test_prune_in_small_batches_stays_consistent(con, root, monkeypatch):
+    indexer.index_root(con, str(root), [])
+    for i in range(5): os.remove(root / "a" / f"f{i}.txt")
+    sweep = indexer._sweep      # several committed batches, the last one partial
+    monkeypatch.setattr(indexer, "_sweep", lambda *a, **kw: sweep(*a, **{**kw, "batch": 2}))
+    assert indexer.index_root(con, str(root), [], prune_missing=True)["pruned"] == 5
+    assert all("/a/" not in p.replace(os.sep, "/") for p in _paths(con))
+    _assert_consistent(con)
+
+
+def test_prune_keeps_files_outside_the_root(con, root, tmp_path):
+    other = tmp_path / "root2"; other.mkdir()
+    (other / "x.txt").write_text("common words tokother")
+    indexer.index_root(con, str(other), [])
+    indexer.index_root(con, str(root), [])
+    os.remove(root / "a" / "f0.txt")
+    indexer.index_root(con, str(root), [], prune_missing=True)
+    assert str(other / "x.txt") in _paths(con) and _hits(con, "tokother") == 1
+
+
+def test_cancelled_run_never_sweeps(con, root):
+    indexer.index_root(con, str(root), [])
+    before = _paths(con)
+    os.remove(root / "a" / "f0.txt"); os.remove(root / "b" / "f0.txt")
+
+    stop = threading.Event()
+    def progress(ev):
+        if ev["files_seen"] >= 2: stop.set()
+    res = indexer.index_root(con, str(root), [], prune_missing=True, batch=2,
+                             progress_cb=progress, stop_event=stop)
+    assert res["cancelled"] and res["pruned"] == 0
+    # deleted and unvisited rows alike survive: unvisited is not missing
+    assert _paths(con) == before and _hits(con, "toka0") == 1
+    _assert_consistent(con)
+
+    res = indexer.index_root(con, str(root), [], prune_missing=True)
+    assert res["pruned"] == 2 and len(_paths(con)) == 8
+
+
+def test_dirtree_rollups_follow_the_sweep(con, root):
+    indexer.index_root(con, str(root), [])
+    size_a = sum(os.path.getsize(root / "a" / f"f{i}.txt") for i in range(5))
+    _id, _p, size, files, _newest = dirtree.info(con, str(root))
+    assert files == 10 and dirtree.info(con, str(root / "a"))[3] == 5
+
+    gone = root / "a" / "f2.txt"; gone_size = os.path.getsize(gone)
+    os.remove(gone)
+    indexer.index_root(con, str(root), [], prune_missing=True)
+    assert dirtree.info(con, str(root / "a"))[2:4] == (size_a - gone_size, 4)
+    assert dirtree.info(con, str(root))[2:4] == (size - gone_size, 9)
+    assert dirtree.info(con, str(root / "b"))[3] == 5
+
+
+# —— negative cache ——
+HOUR = 3600
+
+
+def test_backoff_doubles_from_an_hour_and_caps_at_30_days():
+    assert [failures.backoff(n) for n in range(1, 6)] == [HOUR, 2 * HOUR, 4 * HOUR, 8 * HOUR, 16 * HOUR]
+    assert failures.backoff(10) == 512 * HOUR
+    assert failures.backoff(11) == failures.backoff(500) == 30 * 86400
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def broken(monkeypatch):
+    """Paths whose text extraction raises."""
+    bad = set()
+    def guard(fn):
+        def wrapped(path, *a, **kw):
+            if path in bad: raise OSError(f"cannot read {path}")
+            return fn(path, *a, **kw)
+        return wrapped
+    monkeypatch.setattr(extract, "text_spans", guard(extract.text_spans))
+    monkeypatch.setattr(extract, "read_text_spans", guard(extract.read_text_spans))
+    return bad
+
+
+def _failure(con, path):
+    rows = failures.list_failures(con)
+    return next((r for r in rows if r["path"] == path), None)
+
+
+def test_failing_file_is_skipped_until_its_retry_time(con, root, clock, broken):
+    bad = str(root / "a" / "f1.txt"); broken.add(bad)
+    res = indexer.index_root(con, str(root), [], reindex_days=0)
+    assert res["errors"] == 1 and res["skipped"] == 0
+    f = _failure(con, bad)
+    assert f["attempts"] == 1 and f["err_class"] == "OSError" and f["next_retry_at"] == clock[0] + HOUR
+
+    clock[0] += HOUR - 1        # still backing off: not touched at all
+    res = indexer.index_root(con, str(root), [], reindex_days=0)
+    assert res["skipped"] == 1 and res["errors"] == 0 and _failure(con, bad)["attempts"] == 1
+
+    clock[0] += 1               # due: retried, fails again, waits twice as long
+    res = indexer.index_root(con, str(root), [], reindex_days=0)
+    assert res["skipped"] == 0 and res["errors"] == 1
+    f = _failure(con, bad)
+    assert f["attempts"] == 2 and f["next_retry_at"] == clock[0] + 2 * HOUR
+
+    broken.clear(); clock[0] += 2 * HOUR
+    res = indexer.index_root(con, str(root), [], reindex_days=0)
+    assert res["errors"] == 0 and _failure(con, bad) is None and _hits(con, "toka1") == 1
+
+
+def test_skipped_file_survives_the_prune_sweep(con, root, clock, broken):
+    bad = str(root / "b" / "f0.txt"); broken.add(bad)
+    indexer.index_root(con, str(root), [])
+    clock[0] += 60
+    res = indexer.index_root(con, str(root), [], prune_missing=True)
+    assert res["skipped"] == 1 and res["pruned"] == 0 and bad in _paths(con)
+
+
+def test_force_retry_makes_failures_due_now(con, root, clock, broken):
+    bad = [str(root / "a" / "f1.txt"), str(root / "b" / "f2.txt")]
+    broken.update(bad)
+    indexer.index_root(con, str(root), [], reindex_days=0)
+    assert {f["path"] for f in failures.list_failures(con, due_only=True)} == set()
+
+    assert failures.force_retry(con, str(root / "a")) == 1
+    assert [f["path"] for f in failures.list_failures(con, due_only=True)] == [bad[0]]
+    broken.clear()
+    res = indexer.index_root(con, str(root), [], reindex_days=0)
+    assert res["skipped"] == 1 and _failure(con, bad[0]) is None and _failure(con, bad[1])
+
+    assert failures.force_retry(con) == 1
+    res = indexer.index_root(con, str(root), [], reindex_days=0)
+    assert res["skipped"] == 0 and failures.list_failures(con) == []
+
+
+# —— chunks from before byte offsets (migration 10) ——
+def test_refresh_offsets_rewrites_only_flagged_files(con, tmp_path):
+    p = tmp_path / "u.txt"; p.write_text("common héllo wörld " * 50, encoding="utf-8")
+    indexer.index_root(con, str(tmp_path), [])
+    assert indexer.refresh_offsets(con, str(p)) is False
+
+    (fid,) = con.execute("SELECT id FROM files WHERE path=?", (str(p),)).fetchone()
+    con.execute("UPDATE chunks SET bytes_from=0, bytes_to=1 WHERE file_id=?", (fid,))
+    con.execute("UPDATE files SET char_offsets=1 WHERE id=?", (fid,)); con.commit()
+    assert indexer.refresh_offsets(con, str(p)) is True
+    (flag,) = con.execute("SELECT char_offsets FROM files WHERE id=?", (fid,)).fetchone()
+    (hi,) = con.execute("SELECT MAX(bytes_to) FROM chunks WHERE file_id=?", (fid,)).fetchone()
+    assert flag is None and hi == p.stat().st_size
+    _assert_consistent(con)
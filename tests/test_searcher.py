@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from app import db, indexer, searcher
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """Two directories of small files, three mtimes with several files on each (ties)."""
+    root = tmp_path / "root"
+    for sub in ("Docs", "other"):
+        (root / sub).mkdir(parents=True)
+        for i in range(7):
+            p = root / sub / f"f{i}.txt"
+            p.write_text(f"{sub} file {i}")
+            t = 1_700_000_000 + (i % 3) * 60
+            os.utime(p, (t, t))
+    con = db.connect(str(tmp_path / "state.sqlite")); db.init(con); db.migrate(con)
+    indexer.index_root(con, str(root), [], content=False)
+    yield con, root
+    con.close()
+
+
+def _pages(con, limit, **kw):
+    rows, after, pages = [], None, 0
+    while True:
+        page, after = searcher.recent(con, limit, after=after, **kw)
+        rows += page; pages += 1
+        if after is None:
+            return rows, pages
+        assert pages < 100
+
+
+def test_recent_keyset_pages_have_no_gaps_or_overlap(tree):
+    con, _root = tree
+    full, _ = searcher.recent(con, 1000)
+    assert len(full) == 14
+    for limit in (1, 2, 3, 5):
+        rows, pages = _pages(con, limit)
+        assert [r[0] for r in rows] == [r[0] for r in full]
+        assert pages >= len(full) // limit
+
+
+def test_recent_order_breaks_mtime_ties_by_path(tree):
+    con, _root = tree
+    rows, _ = searcher.recent(con, 1000)
+    keys = [(ts, path) for _fid, path, _size, ts in rows]
+    assert keys == sorted(keys, reverse=True)
+    assert len({ts for ts, _p in keys}) == 3
+
+
+def test_recent_scoped_pages_match_stored_case(tree):
+    con, root = tree
+    scope = [str(root / "Docs")]
+    rows, _ = _pages(con, 2, path_prefixes=scope)
+    assert len(rows) == 7
+    assert all(path.startswith(str(root / "Docs") + os.sep) for _fid, path, _s, _t in rows)
+    # the sibling "other" is outside the range even though it sorts next to it
+    assert not any("other" in path for _fid, path, _s, _t in rows)
+
+
+def test_show_all_and_facets_honour_scope(tree):
+    con, root = tree
+    scope = [str(root / "Docs")]
+    assert len(searcher.fts(con, "*", top_k=100, path_prefixes=scope)) == 7
+    cube = searcher.facet_cube(con, "", path_prefixes=scope)
+    assert sum(n for *_k, n in cube) == 7
+
+
+def test_query_error_only_blames_the_match_expression():
+    assert searcher.query_error("plain words") is None
+    assert searcher.query_error("*") is None
+    assert searcher.query_error("text:foo AND bar") is None
+    assert "unterminated" in searcher.query_error('"abc')
+    assert "no such column" in searcher.query_error("nope:foo AND bar")
+    assert "syntax error" in searcher.query_error("(x AND")